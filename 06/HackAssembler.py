@@ -108,37 +108,44 @@ RE_COMMENT = re.compile(r'//.*')
 def parse(asmfname):
     """
     Parse the asm file. Generates a single instuction at a time.
+    """
+    with open(asmfname) as asmfile:
+        yield from parse_lines(asmfile)
+
+
+def parse_lines(lines):
+    """
+    Parse lines of assembly. Generates a single instuction at a time.
 
-    Advance through the file one line at a time ignoring comments.
+    Advance through the lines one at a time ignoring comments.
     Uses a generator to yield an Instruction object when an instruction
     is found
     """
     instrno = -1   # The current instruction num. starts at 0
-    with open(asmfname) as asmfile:
-        for lineno, line in enumerate(asmfile, 1):
-            # strip comments and whitespace
-            instrtxt = RE_COMMENT.sub('', line).strip()
-            if instrtxt == "":
-                continue
-
-            # Determine if this text represents an A, C, or L instruction.
-            # A: starts with @
-            # L: labels, (label)
-            # C: everything else: {dest}=comp{;jmp}
-            if instrtxt.startswith('@'):
-                instrtype = InstrType.A
-            elif instrtxt.startswith('('):
-                instrtype = InstrType.L
-            else:
-                instrtype = InstrType.C
-
-            # labels do not increment instrno
-            if instrtype is not InstrType.L:
-                instrno += 1
-
-            # create instr and return
-            instr = Instruction(instrtxt, instrtype, instrno, lineno)
-            yield instr
+    for lineno, line in enumerate(lines, 1):
+        # strip comments and whitespace
+        instrtxt = RE_COMMENT.sub('', line).strip()
+        if instrtxt == "":
+            continue
+
+        # Determine if this text represents an A, C, or L instruction.
+        # A: starts with @
+        # L: labels, (label)
+        # C: everything else: {dest}=comp{;jmp}
+        if instrtxt.startswith('@'):
+            instrtype = InstrType.A
+        elif instrtxt.startswith('('):
+            instrtype = InstrType.L
+        else:
+            instrtype = InstrType.C
+
+        # labels do not increment instrno
+        if instrtype is not InstrType.L:
+            instrno += 1
+
+        # create instr and return
+        instr = Instruction(instrtxt, instrtype, instrno, lineno)
+        yield instr
 
 
 def create_symbtbl():
@@ -172,10 +179,6 @@ def create_symbtbl():
     })
 
 
-# Symbol Table
-symbtbl = create_symbtbl()
-
-
 # maps a destination register to a bit idx
 # dest part of the instruction contains 3 bits.
 # Each bit represents a dest:
@@ -208,6 +211,11 @@ COMPMAP = {
     "A-D": "0000111", "M-D": "1000111",
     "D&A": "0000000", "D&M": "1000000",
     "D|A": "0010101", "D|M": "1010101",
+
+    # commutative spellings, also accepted by the course's CPU emulator
+    "A+D": "0000010", "M+D": "1000010",
+    "A&D": "0000000", "M&D": "1000000",
+    "A|D": "0010101", "M|D": "1010101",
 }
 
 # maps a jmp (ie JEQ, JMP) -> binary
@@ -268,7 +276,7 @@ def cinstr2bin(instr):
             jmp2bits(jmptok, lineno))
 
 
-def ainstr2bin(instr):
+def ainstr2bin(instr, symbtbl):
     """
     Translate an A instr translate to binary
 
@@ -294,12 +302,12 @@ def ainstr2bin(instr):
     return '0' + format(val, '015b')
 
 
-def instr2bin(instr):
+def instr2bin(instr, symbtbl):
     """
     Translates an instruction into binary.
     """
     if instr.is_ainstr():
-        return ainstr2bin(instr)
+        return ainstr2bin(instr, symbtbl)
     elif instr.is_cinstr():
         return cinstr2bin(instr)
     else:
@@ -307,24 +315,50 @@ def instr2bin(instr):
                 f"pseudo-instr cannot be translated to bin {instr}")
 
 
-def main():
-    if len(sys.argv) < 3:
-        sys.exit("USAGE: HackAssembler.py input.asm output.hack")
+def assemble(asmfname):
+    """
+    Assemble the asm file. Generates one binary instruction at a time.
 
-    asmfname = sys.argv[1]   # input: asm filename
-    hackfname = sys.argv[2]  # output: hack filename
+    Each call uses a fresh symbol table, so several programs can be
+    assembled by the same process.
+    """
+    return assemble_passes(lambda: parse(asmfname))
+
+
+def assemble_lines(lines):
+    """
+    Assemble a list of lines of assembly, held in memory.
+    Generates one binary instruction at a time.
+    """
+    return assemble_passes(lambda: parse_lines(lines))
+
+
+def assemble_passes(instrs):
+    """
+    instrs: called for each pass, returns a generator of the Instructions
+    """
+    symbtbl = create_symbtbl()
 
     # first pass: put labels in symbol table
-    labels = (instr for instr in parse(asmfname) if instr.is_linstr())
+    labels = (instr for instr in instrs() if instr.is_linstr())
     for label in labels:
         symbtbl[label.symbol()] = label.instrno + 1
 
     # second pass: translate to binary
-    binary = (instr2bin(instr) for instr in parse(asmfname)
-              if not instr.is_linstr())
+    for instr in instrs():
+        if not instr.is_linstr():
+            yield instr2bin(instr, symbtbl)
+
+
+def main():
+    if len(sys.argv) < 3:
+        sys.exit("USAGE: HackAssembler.py input.asm output.hack")
+
+    asmfname = sys.argv[1]   # input: asm filename
+    hackfname = sys.argv[2]  # output: hack filename
 
     with open(hackfname, 'w') as hackfile:
-        for bininstr in binary:
+        for bininstr in assemble(asmfname):
             print(bininstr, file=hackfile)
 
 
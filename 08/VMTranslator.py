@@ -150,21 +150,28 @@ def parse_cmdtxt(cmdtxt, cmdno=-1, lineno=-1):
 def parse(vmfname):
     """
     Parse the vm file. Generates a single command at a time.
+    """
+    with open(vmfname) as vmfile:
+        yield from parse_lines(vmfile)
+
+
+def parse_lines(lines):
+    """
+    Parse lines of vm code. Generates a single command at a time.
 
-    Advance through the file one line at a time ignoring comments.
+    Advance through the lines one at a time ignoring comments.
     Uses a generator to yield a Command object when a command
     is found
     """
     cmdno = -1   # The current cmd num. starts at 0
-    with open(vmfname) as vmfile:
-        for lineno, line in enumerate(vmfile, 1):
-            # strip comments and whitespace
-            cmdtxt = RE_COMMENT.sub('', line).strip()
-            if cmdtxt == "":
-                continue
-            cmdno += 1
-            cmd = parse_cmdtxt(cmdtxt, cmdno, lineno)
-            yield cmd
+    for lineno, line in enumerate(lines, 1):
+        # strip comments and whitespace
+        cmdtxt = RE_COMMENT.sub('', line).strip()
+        if cmdtxt == "":
+            continue
+        cmdno += 1
+        cmd = parse_cmdtxt(cmdtxt, cmdno, lineno)
+        yield cmd
 
 
 def is_num(s):
@@ -655,6 +662,15 @@ def is_vmfile(f):
     return f.suffix == '.vm'
 
 
+def translate_file(vmfile):
+    """
+    the hack assembly of a .vm file. Carries on from the global state,
+    and leaves it as the next file expects
+    """
+    state['curr_filespace'] = vmfile.stem
+    return ''.join(translate_cmd(cmd) for cmd in parse(vmfile))
+
+
 def main():
     if len(sys.argv) < 2:
         sys.exit("USAGE: VMTranslator.py input.vm")
@@ -673,9 +689,7 @@ def main():
     with open(asmpath, 'w') as asmfile:
         asmfile.write(bootstrap())
         for vmfile in vmfiles:
-            state['curr_filespace'] = vmfile.stem
-            for cmd in parse(vmfile):
-                asmfile.write(translate_cmd(cmd))
+            asmfile.write(translate_file(vmfile))
         asmfile.write(infloop())
 
 
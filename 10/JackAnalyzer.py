@@ -1,40 +1,259 @@
 #!/usr/bin/python3
+"""
+Nand2Tetris Jack Analyzer.
 
+Classes are analyzed in two parallel phases. First every class is
+parsed, and its signature taken (see class_table). The signatures are
+merged into the program's class table, and then every class is checked
+against it and its XML written. Each phase takes as long as its largest
+class, not the sum of them all.
+
+Only signatures travel between the processes: a parse tree costs more
+to pickle and unpickle than to parse again, so phase 2 re-parses a class
+unless it runs in the process that parsed it (always, with -j 1). The
+class table goes to each phase 2 process once, when it starts.
+
+Builds are incremental. Parse trees and signatures are cached on disk
+(in the repo's .cache, see tools/cache.py), keyed by the hash of the
+source and of the analyzer itself, and the least recently used dropped
+beyond --cache-size. Each output directory remembers what its classes
+were built from: a class is checked and written again only if its
+source changed, its XML is missing, or the public signature of a class
+it calls changed.
+
+--verify writes nothing: it compares each class's parse tree and tokens
+with the reference Name.xml and NameT.xml beside it, streaming both (see
+xml_compare), and reports the first difference in each.
+
+input: a .jack file, or a directory of them
+output: Name.mine.xml, the parse tree of each class
+
+USAGE:
+./JackAnalyzer.py [-j JOBS] [-v] [--verify] [--no-cache] [--cache-size MB]
+                  input
+"""
+
+import os
 import sys
+import hashlib
+import argparse
+from itertools import chain
 from pathlib import Path
-from tokenizer import Tokenizer
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor
+from tokenizer import Tokenizer, token_to_xml
 from compilation_engine import CompilationEngine, JackError
+from parse_tree import write_xml, iter_xml, leaves
+from class_table import signature, merge, check_class, public
+from xml_compare import first_difference, report
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / 'tools'))
+import cache  # noqa: E402
+
+HERE = Path(__file__).resolve().parent
+
+# bump when what a cached entry means changes
+VERSION = 1
+
+# the analyzer's own source: cached trees are only valid for the code
+# that built them
+ANALYZER = hashlib.sha256(''.join(
+    cache.file_hash(HERE / module) for module in (
+        'tokenizer.py', 'compilation_engine.py', 'parse_tree.py',
+        'class_table.py', 'symbol_table.py', 'JackAnalyzer.py')
+).encode()).hexdigest()
+
+
+# the parse trees of this process, by file
+trees = {}
+
+# the program's class table, for phase 2
+classes = {}
+
+
+def cache_key(digest):
+    return f'{digest}:{ANALYZER}'
+
+
+def parse(fpath, digest, use_cache):
+    """the parse tree of a .jack file, from the cache if it is there"""
+    tree = trees.pop(fpath, None)
+    entry = tree is None and use_cache and \
+        cache.lookup('jack-trees', cache_key(digest), VERSION)
+    if entry:
+        return entry['tree']
+    if tree is None:
+        with open(fpath, 'r') as jackfile:
+            tokenizer = Tokenizer(jackfile.read())
+        tree = CompilationEngine(tokenizer).start()
+    return tree
+
+
+def parse_file(fpath, digest, use_cache):
+    """phase 1: .jack file -> its ClassSignature"""
+    entry = use_cache and \
+        cache.lookup('jack-signatures', cache_key(digest), VERSION)
+    if entry:
+        return entry['signature']
+    tree = trees[fpath] = parse(fpath, digest, False)
+    sig = signature(tree)
+    if use_cache:
+        cache.store('jack-trees', cache_key(digest), VERSION, {}, tree=tree)
+        cache.store('jack-signatures', cache_key(digest), VERSION, {},
+                    signature=sig)
+    return sig
+
+
+def set_classes(table):
+    global classes
+    classes = table
+
+
+def check_file(fpath, digest, xmlpath, use_cache):
+    """
+    phase 2: check a class against the class table, and write its XML.
+    returns the names of the classes it uses
+    """
+    tree = parse(fpath, digest, use_cache)
+    used = check_class(tree, classes)
+    with open(xmlpath, 'w') as xmlfile:
+        write_xml(tree, xmlfile)
+    return used
+
+
+def verify_file(fpath, digest, use_cache):
+    """
+    phase 2 of --verify: check a class against the class table, and
+    compare its XML with the reference files beside it. returns the
+    differences found, reported
+    """
+    tree = parse(fpath, digest, use_cache)
+    check_class(tree, classes)
+    token_lines = chain(['<tokens>'], map(token_to_xml, leaves(tree)),
+                        ['</tokens>'])
+    reports = []
+    for refpath, lines in ((fpath.with_suffix('.xml'), iter_xml(tree)),
+                           (fpath.with_name(fpath.stem + 'T.xml'),
+                            token_lines)):
+        if not refpath.exists():
+            continue
+        with open(refpath, 'r') as reffile:
+            diff = first_difference(lines, reffile)
+        if diff:
+            reports.append(report(fpath, refpath.name, diff))
+    return reports
+
+
+def up_to_date(built, digest, xmlpath):
+    """
+    built: what a class's XML was last built from, (source hash,
+    {class it uses: its public signature then, None if not defined})
+    """
+    if not built or built[0] != digest or not xmlpath.exists():
+        return False
+    return all((public(classes[name]) if name in classes else None) == sig
+               for name, sig in built[1].items())
+
+
+def pool_of(jobs, **kwargs):
+    """a process pool of jobs workers; none (None) for one job"""
+    if jobs > 1:
+        return ProcessPoolExecutor(jobs, **kwargs)
+    return nullcontext()
+
+
+def run_phase(pool, fn, jobs):
+    """
+    jobs: {fpath: args of fn}, run in the pool if there is one.
+    returns {fpath: result}. Exits on the first JackError
+    """
+    if pool:
+        futures = {fpath: pool.submit(fn, *args)
+                   for fpath, args in jobs.items()}
+    results = {}
+    for fpath, args in jobs.items():
+        try:
+            results[fpath] = futures[fpath].result() if pool else fn(*args)
+        except JackError as e:
+            sys.exit(f'{fpath}: {e}')
+    return results
 
 
 def main():
-    if len(sys.argv) < 2:
-        sys.exit("USAGE: tokenizer.py input")
+    parser = argparse.ArgumentParser(description='Analyze Jack programs.')
+    parser.add_argument('input', help='.jack file or directory')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(),
+                        help='number of classes to analyze in parallel')
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help='report how many classes were rebuilt')
+    parser.add_argument('--verify', action='store_true',
+                        help='compare with the reference Name.xml and '
+                        'NameT.xml instead of writing')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='parse and write every class')
+    parser.add_argument('--cache-size', type=float, default=256,
+                        help='MB of parse trees to keep cached')
+    args = parser.parse_args()
+    use_cache = not args.no_cache
 
-    path = Path(sys.argv[1])   # input: source path
+    path = Path(args.input)   # input: source path
     if path.is_dir():
         jackfiles = [f for f in path.iterdir() if f.suffix == '.jack']
         outdir = path
     else:
         jackfiles = [path]
         outdir = path.parent
+    digests = {fpath: cache.file_hash(fpath) for fpath in jackfiles}
+    xmlpaths = {fpath: outdir.joinpath(fpath.stem + '.mine.xml')
+                for fpath in jackfiles}
 
-    for fpath in jackfiles:
-        name = fpath.stem
-
-        with open(fpath, 'r') as jackfile:
-            tokenizer = Tokenizer(jackfile.read())
-
-        xmlpath = outdir.joinpath(name + '.mine.xml')
-        with open(xmlpath, 'w') as xmlfile:
-            compiler = CompilationEngine(tokenizer, xmlfile)
-            compiler.start()
-
-
-if __name__ == '__main__':
+    with pool_of(min(args.jobs, len(jackfiles))) as pool:
+        signatures = run_phase(pool, parse_file, {
+            fpath: (fpath, digests[fpath], use_cache)
+            for fpath in jackfiles})
     try:
-        main()
+        set_classes(merge(signatures.values()))
     except JackError as e:
         sys.exit(e)
 
+    if args.verify:
+        with pool_of(min(args.jobs, len(jackfiles)), initializer=set_classes,
+                     initargs=(classes,)) as pool:
+            reports = run_phase(pool, verify_file, {
+                fpath: (fpath, digests[fpath], use_cache)
+                for fpath in jackfiles})
+        failed = [r for fpath in jackfiles for r in reports[fpath]]
+        for r in failed:
+            print(r)
+        if failed:
+            sys.exit(1)
+        if args.verbose:
+            print(f'{len(jackfiles)} classes, no differences')
+        return
+
+    build_key = str(outdir.resolve())
+    entry = use_cache and cache.lookup('jack-builds', build_key, VERSION)
+    builds = entry['builds'] if entry else {}
+    todo = [fpath for fpath in jackfiles
+            if not up_to_date(builds.get(fpath.name), digests[fpath],
+                              xmlpaths[fpath])]
+    with pool_of(min(args.jobs, len(todo)), initializer=set_classes,
+                 initargs=(classes,)) as pool:
+        used = run_phase(pool, check_file, {
+            fpath: (fpath, digests[fpath], xmlpaths[fpath], use_cache)
+            for fpath in todo})
 
+    if use_cache:
+        for fpath, names in used.items():
+            builds[fpath.name] = (digests[fpath], {
+                name: public(classes[name]) if name in classes else None
+                for name in names})
+        cache.store('jack-builds', build_key, VERSION, {}, builds=builds)
+        for kind in ('jack-trees', 'jack-signatures'):
+            cache.evict(kind, args.cache_size * 2**20)
+    if args.verbose:
+        print(f'{len(todo)} of {len(jackfiles)} classes rebuilt')
 
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,252 @@
+#!/usr/bin/python3
+"""
+Nand2Tetris build driver: Jack source to a ROM image, in one process.
+
+The stages hand their results to each other in memory, with no files
+in between:
+    tokenize:   Jack source -> tokens            (tokenizer)
+    parse:      tokens -> parse tree             (compilation_engine)
+    compile:    parse tree -> VM commands        (code_generator)
+    translate:  VM commands -> hack assembly     (08/VMTranslator.py)
+    assemble:   hack assembly -> ROM words       (06/HackAssembler.py)
+
+--stream runs the stages concurrently: the classes go through tokenize,
+parse and compile in -j worker processes (two or more; with one the
+stages run one after another), and each is translated as soon as it
+(and the classes before it) are done. The assembler needs all of the
+program for its labels, so it runs last. The output is the same either
+way.
+
+--timings prints a report of the stages as JSON, or --timings-file
+writes it to FILE: each stage's wall time, the most memory Python held
+while it ran (traced with tracemalloc, which slows the build down, so
+compare stages with each other rather than with builds without
+--timings), and how many items it made. Stages that run once per class
+are summed over the classes. In --stream the front end's times are the
+workers', its peaks the largest of one class, and the time translate
+spent waiting for them is not counted.
+
+input: a .jack file, or a directory of them
+output: Name.hack, the ROM image of the program
+        --asm: also Name.asm
+
+USAGE:
+./JackBuild.py [-O] [--intern-strings] [--asm] [--stream] [-j JOBS]
+               [--timings] [--timings-file FILE] input
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+from pathlib import Path
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from tokenizer import Tokenizer
+from compilation_engine import CompilationEngine, JackError
+from code_generator import compile_class, link_strings
+from vm_writer import translate_classes
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / '06'))
+from HackAssembler import assemble_lines, AssemblyError  # noqa: E402
+
+# stage -> what its items are
+STAGES = {
+    'tokenize': 'tokens',
+    'parse': 'classes',
+    'compile': 'VM commands',
+    'translate': 'asm lines',
+    'assemble': 'ROM words',
+}
+
+
+class Timings:
+    """
+    The timings of the stages, each [seconds, peak bytes, items].
+    trace: whether to trace memory
+    """
+    def __init__(self, trace=False):
+        self.trace = trace
+        self.stages = {stage: [0.0, 0, 0] for stage in STAGES}
+
+    @contextmanager
+    def stage(self, stage):
+        if self.trace:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        yield
+        timing = self.stages[stage]
+        timing[0] += time.perf_counter() - start
+        if self.trace:
+            timing[1] = max(timing[1], tracemalloc.get_traced_memory()[1])
+
+    def count(self, stage, items):
+        self.stages[stage][2] += items
+
+    def merge(self, other):
+        """add the timings of another process"""
+        for stage, (seconds, peak, items) in other.stages.items():
+            timing = self.stages[stage]
+            timing[0] += seconds
+            timing[1] = max(timing[1], peak)
+            timing[2] += items
+
+    def to_json(self, total):
+        return {
+            'stages': [{'stage': stage, 'seconds': round(seconds, 6),
+                        'peak_bytes': peak, 'items': items,
+                        'unit': STAGES[stage]}
+                       for stage, (seconds, peak, items)
+                       in self.stages.items()],
+            'total_seconds': round(total, 6),
+        }
+
+
+class BuildError(Exception):
+    """an error in the program, reported with the file it is in"""
+
+
+def front_end(fpath, optimize, intern_strings, trace):
+    """
+    tokenize, parse and compile a .jack file ->
+    (class name, [Command], rewrites, Timings)
+    """
+    timings = Timings(trace)
+    with open(fpath, 'r') as jackfile:
+        source = jackfile.read()
+    try:
+        with timings.stage('tokenize'):
+            tokenizer = Tokenizer(source)
+        timings.count('tokenize', len(tokenizer))
+        with timings.stage('parse'):
+            tree = CompilationEngine(tokenizer).start()
+        timings.count('parse', 1)
+        with timings.stage('compile'):
+            name, commands, rewrites = compile_class(tree, optimize,
+                                                     intern_strings)
+    except JackError as e:
+        raise BuildError(f'{fpath}: {e}') from None
+    timings.count('compile', len(commands))
+    return name, commands, rewrites, timings
+
+
+def streaming(args):
+    return args.stream and args.jobs > 1
+
+
+def front_ends(jackfiles, args):
+    """front_end each file, generated in order"""
+    jobs = [(fpath, args.optimize, args.intern_strings, args.timings)
+            for fpath in jackfiles]
+    if streaming(args):
+        with ProcessPoolExecutor(args.jobs) as pool:
+            yield from pool.map(front_end, *zip(*jobs))
+    else:
+        for job in jobs:
+            yield front_end(*job)
+
+
+def build(jackfiles, args, timings):
+    """
+    build the program of jackfiles -> (hack assembly, [ROM word])
+    raises BuildError and AssemblyError
+    """
+    fronts = front_ends(jackfiles, args)
+    if not streaming(args):
+        fronts = list(fronts)
+        if args.intern_strings and not link_strings(
+                [(name, commands) for name, commands, _, _ in fronts]):
+            raise BuildError('--intern-strings: no Main.main to build the '
+                             'strings in')
+    waiting = 0.0   # for the front ends, while translating
+
+    def classes():
+        nonlocal waiting
+        fronts_left = iter(fronts)
+        while True:
+            start = time.perf_counter()
+            front = next(fronts_left, None)
+            waiting += time.perf_counter() - start
+            if front is None:
+                return
+            name, commands, _, front_timings = front
+            timings.merge(front_timings)
+            yield name, commands
+
+    with timings.stage('translate'):
+        asm = ''.join(translate_classes(classes()))
+        lines = asm.splitlines()
+    timings.stages['translate'][0] -= waiting
+    timings.count('translate', len(lines))
+
+    with timings.stage('assemble'):
+        words = list(assemble_lines(lines))
+    timings.count('assemble', len(words))
+    return asm, words
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Build Jack programs to a ROM image.')
+    parser.add_argument('input', help='.jack file or directory')
+    parser.add_argument('-O', '--optimize', action='store_true',
+                        help='fold constants and strength-reduce '
+                        'multiplications')
+    parser.add_argument('--intern-strings', action='store_true',
+                        help='build each string constant once, in a '
+                        'static')
+    parser.add_argument('--asm', action='store_true',
+                        help='also write the hack assembly')
+    parser.add_argument('--stream', action='store_true',
+                        help='run the stages concurrently')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(),
+                        help='worker processes for --stream')
+    parser.add_argument('--timings', action='store_true',
+                        help='print the timings of the stages as JSON')
+    parser.add_argument('--timings-file', metavar='FILE',
+                        help='write the timings to FILE instead')
+    args = parser.parse_args()
+    args.timings = args.timings or args.timings_file is not None
+    if args.stream and args.intern_strings:
+        parser.error('--stream: --intern-strings needs every class before '
+                     'Main.main can be translated')
+
+    path = Path(args.input)   # input: source path
+    if path.is_dir():
+        jackfiles = sorted(f for f in path.iterdir() if f.suffix == '.jack')
+        outdir = path
+    else:
+        jackfiles = [path]
+        outdir = path.parent
+
+    timings = Timings(trace=args.timings)
+    start = time.perf_counter()
+    try:
+        asm, words = build(jackfiles, args, timings)
+    except (BuildError, AssemblyError) as e:
+        sys.exit(e)
+    total = time.perf_counter() - start
+
+    if args.asm:
+        with open(outdir.joinpath(path.stem + '.asm'), 'w') as asmfile:
+            asmfile.write(asm)
+    with open(outdir.joinpath(path.stem + '.hack'), 'w') as hackfile:
+        hackfile.write('\n'.join(words))
+        hackfile.write('\n')
+
+    if args.timings:
+        report = {'input': str(path), 'stream': args.stream,
+                  **timings.to_json(total)}
+        if args.timings_file is None:
+            print(json.dumps(report, indent=2))
+        else:
+            with open(args.timings_file, 'w') as timingsfile:
+                json.dump(report, timingsfile, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/python3
+"""
+Nand2Tetris Jack Compiler.
+
+Compiles every class to VM commands, and translates them straight to
+hack assembly with the VM translator (08/VMTranslator.py), in memory.
+
+input: a .jack file, or a directory of them
+output: Name.asm, one program for all the classes, with the bootstrap
+        --vm: also the Class.vm file of each class
+        --optimize: folds constants and turns multiplications by
+        constants into additions (see code_generator), and reports the
+        rewrites made in each class
+        --intern-strings: builds each string constant once, when
+        Main.main starts, instead of every time it is used
+
+USAGE:
+./JackCompiler.py [--vm] [--optimize] [--intern-strings] input
+"""
+
+import sys
+import argparse
+from pathlib import Path
+from tokenizer import Tokenizer
+from compilation_engine import CompilationEngine, JackError
+from code_generator import compile_class, link_strings
+from vm_writer import translate, vm_text
+
+
+def compile_file(fpath, optimize=False, intern_strings=False):
+    """.jack file -> (class name, [Command], rewrites)"""
+    with open(fpath, 'r') as jackfile:
+        tokenizer = Tokenizer(jackfile.read())
+    return compile_class(CompilationEngine(tokenizer).start(), optimize,
+                         intern_strings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compile Jack programs.')
+    parser.add_argument('input', help='.jack file or directory')
+    parser.add_argument('--vm', action='store_true',
+                        help='also write the .vm file of each class')
+    parser.add_argument('-O', '--optimize', action='store_true',
+                        help='fold constants and strength-reduce '
+                        'multiplications, and report the rewrites')
+    parser.add_argument('--intern-strings', action='store_true',
+                        help='build each string constant once, in a '
+                        'static')
+    args = parser.parse_args()
+
+    path = Path(args.input)   # input: source path
+    if path.is_dir():
+        jackfiles = sorted(f for f in path.iterdir() if f.suffix == '.jack')
+        outdir = path
+    else:
+        jackfiles = [path]
+        outdir = path.parent
+
+    classes = []
+    for fpath in jackfiles:
+        try:
+            classes.append(compile_file(fpath, args.optimize,
+                                        args.intern_strings))
+        except JackError as e:
+            sys.exit(f'{fpath}: {e}')
+    if args.intern_strings and not link_strings(
+            [(name, commands) for name, commands, _ in classes]):
+        sys.exit('--intern-strings: no Main.main to build the strings in')
+    if args.vm:
+        for name, commands, _ in classes:
+            with open(outdir.joinpath(name + '.vm'), 'w') as vmfile:
+                vmfile.write(vm_text(commands))
+    if args.optimize or args.intern_strings:
+        for name, commands, rewrites in classes:
+            summary = ', '.join(f'{n} {rewrite}'
+                                for rewrite, n in sorted(rewrites.items()))
+            print(f'{name}: {len(commands)} VM commands; '
+                  f'{summary or "no rewrites"}')
+
+    asmpath = outdir.joinpath(path.stem + '.asm')
+    with open(asmpath, 'w') as asmfile:
+        asmfile.write(translate([(name, commands)
+                                 for name, commands, _ in classes]))
+
+
+if __name__ == '__main__':
+    main()
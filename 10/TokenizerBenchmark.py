@@ -0,0 +1,80 @@
+#!/usr/bin/python3
+"""
+Nand2Tetris Jack tokenizer benchmark. Generates Jack classes of a few
+megabytes, most of it documentation comments, and times the tokenizer
+on each. The scan is linear: the throughput should stay flat as the
+sources grow.
+
+input: sizes of the generated sources, in MB
+output: tokens, lines and throughput per size
+
+USAGE:
+./TokenizerBenchmark.py [--doc-lines N] [--repeat R] [MB ...]
+"""
+
+import time
+import argparse
+from tokenizer import tokenize
+
+DOC_LINE = ' * Lorem ipsum dolor sit <amet>, & "consectetur" *adipiscing*.\n'
+
+METHOD = '''\
+    /** Updates the state of item {n}.
+{doc}     *
+     * @param x the new position, // not a line comment
+     * @return the previous value
+     */
+    method int update{n}(int x, boolean flag) {{
+        var int old;  // the value before the update
+        let old = values[{n}];
+        if (flag & (x > {n})) {{
+            let values[{n}] = x * 2 - old;
+        }}
+        do Output.printString("item {n}: updated");  /* trace */
+        return old;
+    }}
+
+'''
+
+
+def generate(size, doc_lines=20):
+    """a Jack class of about size characters, heavy on doc comments"""
+    doc = ''.join('    ' + DOC_LINE for _ in range(doc_lines))
+    parts = ['/**\n * Generated for benchmarking.\n */\nclass Big {\n'
+             '    field Array values;\n\n']
+    length = len(parts[0])
+    n = 0
+    while length < size:
+        method = METHOD.format(n=n % 32768, doc=doc)
+        parts.append(method)
+        length += len(method)
+        n += 1
+    parts.append('}\n')
+    return ''.join(parts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the tokenizer.')
+    parser.add_argument('sizes', nargs='*', type=float, default=[1, 2, 4, 8],
+                        help='source sizes in MB')
+    parser.add_argument('--doc-lines', type=int, default=20,
+                        help='documentation lines per method')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='runs per size; the fastest is reported')
+    args = parser.parse_args()
+
+    for mb in args.sizes:
+        source = generate(int(mb * 2**20), args.doc_lines)
+        best = float('inf')
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            tokens = tokenize(source)
+            best = min(best, time.perf_counter() - start)
+        print(f'{len(source) / 2**20:6.2f} MB: {len(tokens)} tokens, '
+              f'{tokens[-1].line} lines in {best:.3f}s '
+              f'({len(source) / 2**20 / best:.1f} MB/s, '
+              f'{len(tokens) / best / 1000:.0f}K tokens/s)')
+
+
+if __name__ == '__main__':
+    main()
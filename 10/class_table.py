@@ -0,0 +1,155 @@
+"""
+The global class table of a Jack program: the signature of every class
+(fields, statics, and the kind and arity of each subroutine), taken
+from the parse trees. With it each class can be checked on its own
+against all the others: calls to the program's classes must name an
+existing subroutine of the right kind, with the right number of
+arguments. Calls to classes outside the program (the OS) are not
+checked.
+"""
+
+from collections import namedtuple
+from tokenizer import JackError, IDENTIFIER
+from parse_tree import Node
+from symbol_table import SymbolTable, ARG, VAR
+
+ClassSignature = namedtuple('ClassSignature',
+                            'name fields statics subroutines')
+# kind: 'constructor', 'function' or 'method'
+Subroutine = namedtuple('Subroutine', 'kind type nparams line')
+
+
+def signature(tree):
+    """parse tree of a class -> its ClassSignature"""
+    fields = {}
+    statics = {}
+    for dec in tree.nodes('classVarDec'):
+        kind, type, *names = dec.tokens()
+        scope = fields if kind.value == 'field' else statics
+        for name in names[::2]:
+            scope[name.value] = type.value
+    subroutines = {}
+    for dec in tree.nodes('subroutineDec'):
+        kind, type, name = dec.children[:3]
+        if name.value in subroutines:
+            raise JackError(f"subroutine '{name.value}' is already defined",
+                            name.line)
+        nparams = (len(dec.node('parameterList').tokens()) + 1) // 3
+        subroutines[name.value] = Subroutine(kind.value, type.value,
+                                             nparams, name.line)
+    return ClassSignature(tree.children[1].value, fields, statics,
+                          subroutines)
+
+
+def public(sig):
+    """
+    what other classes see of a class: its subroutines' kind, type and
+    arity. A class needs checking again only when the public signature
+    of a class it uses changes
+    """
+    return {name: (sub.kind, sub.type, sub.nparams)
+            for name, sub in sig.subroutines.items()}
+
+
+def merge(signatures):
+    """[ClassSignature] -> the class table {class name: ClassSignature}"""
+    classes = {}
+    for sig in signatures:
+        if sig.name in classes:
+            raise JackError(f"class '{sig.name}' is defined twice", 1)
+        classes[sig.name] = sig
+    return classes
+
+
+class ClassChecker:
+    """
+    Checks the subroutine calls of one class against the class table.
+    used: the names of the classes it calls, in the table or not
+    """
+    def __init__(self, tree, classes):
+        self.tree = tree
+        self.classes = classes
+        self.sig = classes[tree.children[1].value]
+        self.symbols = SymbolTable()
+        self.kind = None    # of the subroutine being checked
+        self.used = set()
+
+    def check(self):
+        for dec in self.tree.nodes('classVarDec'):
+            kind, type, *names = dec.tokens()
+            for name in names[::2]:
+                self.symbols.define(name.value, type.value, kind.value)
+        for dec in self.tree.nodes('subroutineDec'):
+            self.kind = dec.children[0].value
+            self.symbols.start_subroutine()
+            params = dec.node('parameterList').tokens()
+            for i in range(0, len(params), 3):
+                self.symbols.define(params[i + 1].value, params[i].value, ARG)
+            body = dec.node('subroutineBody')
+            for vardec in body.nodes('varDec'):
+                _, type, *names = vardec.tokens()
+                for var in names[::2]:
+                    self.symbols.define(var.value, type.value, VAR)
+            self.visit(body)
+
+    def visit(self, node):
+        children = node.children
+        if node.kind == 'doStatement':
+            self.check_call(children[1:-1])
+        elif node.kind == 'term' and len(children) > 1 and \
+                children[0].type == IDENTIFIER and \
+                children[1].value in ('(', '.'):
+            self.check_call(children)
+        for child in children:
+            if type(child) is Node:
+                self.visit(child)
+
+    def check_call(self, children):
+        """
+        subroutineName '(' expressionList ')' |
+        (className|varName)'.'subroutineName '(' expressionList ')'
+        """
+        nargs = len(children[-2].nodes('expression'))
+        if children[1].value == '.':
+            target, name = children[0].value, children[2]
+            symbol = self.symbols.lookup(target)
+            if symbol:
+                classname, method = symbol.type, True
+            else:
+                classname, method = target, False
+        else:
+            name = children[0]
+            classname, method = self.sig.name, None
+            if self.kind == 'function' and name.value in self.sig.subroutines \
+                    and self.sig.subroutines[name.value].kind == 'method':
+                raise JackError(f"method '{name.value}' called from a "
+                                "function", name.line)
+
+        self.used.add(classname)
+        sig = self.classes.get(classname)
+        if sig is None:
+            return  # not one of the program's classes
+        sub = sig.subroutines.get(name.value)
+        if sub is None:
+            raise JackError(f"class '{classname}' has no subroutine "
+                            f"'{name.value}'", name.line)
+        if method is True and sub.kind != 'method':
+            raise JackError(f"'{classname}.{name.value}' is a {sub.kind}, "
+                            "not a method", name.line)
+        if method is False and sub.kind == 'method':
+            raise JackError(f"method '{classname}.{name.value}' called "
+                            "without an object", name.line)
+        if nargs != sub.nparams:
+            raise JackError(f"'{classname}.{name.value}' takes "
+                            f"{sub.nparams} arguments, {nargs} given",
+                            name.line)
+
+
+def check_class(tree, classes):
+    """
+    check a class against the class table. raises JackError.
+    returns the names of the classes it uses
+    """
+    checker = ClassChecker(tree, classes)
+    checker.check()
+    return checker.used
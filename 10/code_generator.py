@@ -0,0 +1,557 @@
+"""
+Jack code generation: compiles the parse tree of a class (see
+parse_tree, CompilationEngine) to VM commands (see vm_writer).
+
+With optimize, expressions are rewritten as they are compiled:
+    constant subexpressions are folded, with the 16-bit arithmetic of
+    the Hack machine (2 + 3 * 4 is 20: Jack evaluates left to right).
+    < and > are folded only when x - y does not overflow: the VM
+    compares by the sign of x - y, wrapped, and folding must agree
+    multiplications by a constant become additions instead of a call to
+    Math.multiply: x * 8 doubles x three times; x * 10 is the add chain
+    (2x * 2 + x) * 2
+    x * 0, x * 1, x / 1 and x / -1 need no call
+
+With intern_strings, each distinct string constant of a class is built
+once, by the class's generated Class.$strings function, into a static of
+its own; its uses push that static. Main.main calls the $strings
+functions first (see link_strings). Interned strings are shared: the
+program must not change or dispose of its string constants.
+
+The rewrites of each class are counted in CodeGenerator.rewrites.
+"""
+
+from collections import Counter
+from tokenizer import JackError, INT_CONST, STRING_CONST, KEYWORD, SYMBOL
+from parse_tree import Node
+from symbol_table import SymbolTable, SEGMENTS, STATIC, FIELD, ARG, VAR
+from vm_writer import VMWriter
+
+binary_ops = {
+    '+': ('add',),
+    '-': ('sub',),
+    '&': ('and',),
+    '|': ('or',),
+    '<': ('lt',),
+    '>': ('gt',),
+    '=': ('eq',),
+    '*': ('call', 'Math.multiply'),
+    '/': ('call', 'Math.divide'),
+}
+unary_ops = {
+    '-': 'neg',
+    '~': 'not',
+}
+
+# the function building a class's interned strings: $ keeps it apart
+# from the Jack subroutines
+STRINGS_INIT = '$strings'
+
+# the longest add chain (doublings + additions) a multiplication by a
+# constant is rewritten to. Longer ones call Math.multiply
+MAX_ADD_CHAIN = 8
+# the power of two multiplications are rewritten for any exponent: at
+# most 15 doublings, still far cheaper than Math.multiply
+
+
+def word(value):
+    """value as a 16-bit signed word"""
+    value &= 0xFFFF
+    return value - 0x10000 if value & 0x8000 else value
+
+
+def fold(op, x, y):
+    """x op y on constants, or None if it can't be done at compile time"""
+    if op == '+':
+        return word(x + y)
+    elif op == '-':
+        return word(x - y)
+    elif op == '*':
+        return word(x * y)
+    elif op == '/':
+        if y == 0:
+            return None     # left to Math.divide to report
+        quotient = abs(x) // abs(y)     # Math.divide truncates
+        return word(-quotient if (x < 0) != (y < 0) else quotient)
+    elif op == '&':
+        return x & y
+    elif op == '|':
+        return x | y
+    elif op in ('<', '>'):
+        if not -0x8000 <= x - y <= 0x7FFF:
+            return None     # lt and gt test the sign of a wrapped x - y
+        return -1 if (x < y if op == '<' else x > y) else 0
+    elif op == '=':
+        return -1 if x == y else 0
+
+
+def constant(term):
+    """the value of a constant term, or None"""
+    children = term.children
+    first = children[0]
+    if first.type == INT_CONST:
+        return int(first.value)
+    elif first.type == KEYWORD and first.value in ('true', 'false', 'null'):
+        return -1 if first.value == 'true' else 0
+    elif first.type == SYMBOL and first.value in unary_ops:
+        value = constant(children[1])
+        if value is None:
+            return None
+        return word(-value) if first.value == '-' else ~value
+    elif first.type == SYMBOL and first.value == '(':
+        expression = children[1].children
+        value = constant(expression[0])
+        for i in range(1, len(expression), 2):
+            right = constant(expression[i + 1])
+            if value is None or right is None:
+                return None
+            value = fold(expression[i].value, value, right)
+        return value
+    return None
+
+
+def operations(term):
+    """the number of binary operations in a term"""
+    n = 0
+    for child in term.children:
+        if type(child) is Node:
+            n += operations(child)
+        elif child.type == SYMBOL and child.value in binary_ops and \
+                child is not term.children[0]:
+            n += 1
+    return n
+
+
+def add_chain(n):
+    """
+    the double-and-add steps computing x * n from x, most significant
+    bit first: 'double' or 'add' (add x). n > 1
+    """
+    steps = []
+    for bit in bin(n)[3:]:
+        steps.append('double')
+        if bit == '1':
+            steps.append('add')
+    return steps
+
+
+class CodeGenerator:
+    """
+    Compiles one class. compile() returns its VM commands.
+    """
+    def __init__(self, tree, optimize=False, intern_strings=False):
+        self.tree = tree
+        self.optimize = optimize
+        self.intern_strings = intern_strings
+        self.strings = {}   # interned string -> its static
+        self.classname = None
+        self.symbols = SymbolTable()
+        self.vm = VMWriter()
+        self.labelno = 0
+        self.rewrites = Counter()
+
+    def error(self, msg, token):
+        raise JackError(msg, token.line)
+
+    def new_label(self, name):
+        self.labelno += 1
+        return f'{name}{self.labelno}'
+
+    def compile(self):
+        """
+        'class' className '{' classVarDec* subroutineDec* '}'
+        """
+        tree = self.tree
+        self.classname = tree.children[1].value
+        for dec in tree.nodes('classVarDec'):
+            self.compileClassVarDec(dec)
+        for dec in tree.nodes('subroutineDec'):
+            self.compileSubroutineDec(dec)
+        if self.strings:
+            self.compileStringsInit()
+        return self.vm.commands
+
+    def compileStringsInit(self):
+        """
+        function Class.$strings: builds the interned strings
+        """
+        self.vm.lineno = -1
+        self.vm.function(f'{self.classname}.{STRINGS_INIT}', 0)
+        for s, index in self.strings.items():
+            self.compileNewString(s)
+            self.vm.pop('static', index)
+        self.vm.push('constant', 0)
+        self.vm.return_()
+
+    def define(self, token, type, kind):
+        if not self.symbols.define(token.value, type, kind):
+            self.error(f"'{token.value}' is already defined", token)
+
+    def compileClassVarDec(self, dec):
+        """
+        ('static'|'field') type varName (',' varName)* ';'
+        """
+        kind, type, *names = dec.tokens()
+        for name in names[::2]:
+            self.define(name, type.value, kind.value)
+
+    def compileSubroutineDec(self, dec):
+        """
+        ('constructor'|'function'|'method') ('void'|type) subroutineName
+        '(' parameterList ')' subroutineBody
+        """
+        kind, _, name = dec.children[:3]
+        self.symbols.start_subroutine()
+        if kind.value == 'method':
+            self.symbols.define('this', self.classname, ARG)
+        params = dec.node('parameterList').tokens()
+        for i in range(0, len(params), 3):
+            self.define(params[i + 1], params[i].value, ARG)
+
+        body = dec.node('subroutineBody')
+        for vardec in body.nodes('varDec'):
+            _, type, *names = vardec.tokens()
+            for var in names[::2]:
+                self.define(var, type.value, VAR)
+
+        self.vm.lineno = name.line
+        self.vm.function(f'{self.classname}.{name.value}',
+                         self.symbols.var_count(VAR))
+        if kind.value == 'constructor':
+            self.vm.push('constant', self.symbols.var_count(FIELD))
+            self.vm.call('Memory.alloc', 1)
+            self.vm.pop('pointer', 0)
+        elif kind.value == 'method':
+            self.vm.push('argument', 0)
+            self.vm.pop('pointer', 0)
+        self.compileStatements(body.node('statements'))
+
+    def compileStatements(self, statements):
+        for statement in statements.children:
+            self.vm.lineno = statement.line
+            getattr(self, STATEMENTS[statement.kind])(statement)
+
+    def variable(self, token):
+        """the segment and index of a variable"""
+        symbol = self.symbols.lookup(token.value)
+        if symbol is None:
+            self.error(f"'{token.value}' is not defined", token)
+        return SEGMENTS[symbol.kind], symbol.index
+
+    def compileLet(self, statement):
+        """
+        'let' varName ('[' expression ']')? '=' expression ';'
+        """
+        name = statement.children[1]
+        segment, index = self.variable(name)
+        expressions = statement.nodes('expression')
+        if len(expressions) == 2:
+            self.vm.push(segment, index)
+            self.compileExpression(expressions[0])
+            self.vm.arithmetic('add')
+            self.compileExpression(expressions[1])
+            self.vm.pop('temp', 0)
+            self.vm.pop('pointer', 1)
+            self.vm.push('temp', 0)
+            self.vm.pop('that', 0)
+        else:
+            self.compileExpression(expressions[0])
+            self.vm.pop(segment, index)
+
+    def compileIf(self, statement):
+        """
+        'if' '(' expression ')' '{' statements '}'
+        ('else' '{' statements '}' )?
+        """
+        cond = statement.node('expression')
+        branches = statement.nodes('statements')
+        else_label = self.new_label('IF_ELSE')
+        end_label = self.new_label('IF_END')
+        self.compileExpression(cond)
+        self.vm.arithmetic('not')
+        self.vm.if_goto(else_label)
+        self.compileStatements(branches[0])
+        if len(branches) == 2:
+            self.vm.goto(end_label)
+            self.vm.label(else_label)
+            self.compileStatements(branches[1])
+            self.vm.label(end_label)
+        else:
+            self.vm.label(else_label)
+
+    def compileWhile(self, statement):
+        """
+        'while' '(' expression ')' '{' statements '}'
+        """
+        loop_label = self.new_label('WHILE_EXP')
+        end_label = self.new_label('WHILE_END')
+        self.vm.label(loop_label)
+        self.compileExpression(statement.node('expression'))
+        self.vm.arithmetic('not')
+        self.vm.if_goto(end_label)
+        self.compileStatements(statement.node('statements'))
+        self.vm.goto(loop_label)
+        self.vm.label(end_label)
+
+    def compileDo(self, statement):
+        """
+        'do' subroutineCall ';'
+        """
+        self.compileSubroutineCall(statement.children[1:-1])
+        self.vm.pop('temp', 0)
+
+    def compileReturn(self, statement):
+        """
+        'return' (expression)? ';'
+        """
+        expression = statement.node('expression')
+        if expression:
+            self.compileExpression(expression)
+        else:
+            self.vm.push('constant', 0)
+        self.vm.return_()
+
+    def compileExpression(self, expression):
+        """
+        term (op term)*
+        """
+        if self.optimize:
+            return self.compileOptimizedExpression(expression)
+        children = expression.children
+        self.compileTerm(children[0])
+        for i in range(1, len(children), 2):
+            self.compileTerm(children[i + 1])
+            self.compileOp(children[i].value)
+
+    def compileOp(self, op):
+        op = binary_ops[op]
+        if op[0] == 'call':
+            self.vm.call(op[1], 2)
+        else:
+            self.vm.arithmetic(op[0])
+
+    def compileOptimizedExpression(self, expression):
+        """
+        term (op term)*, folding constants and rewriting multiplications
+        by constants. value is the expression so far while it is constant
+        """
+        children = expression.children
+        value = self.constant(children[0])
+        if value is None:
+            self.compileTerm(children[0])
+        for i in range(1, len(children), 2):
+            op, term = children[i].value, children[i + 1]
+            right = self.constant(term)
+            if value is not None:
+                if right is not None and fold(op, value, right) is not None:
+                    value = fold(op, value, right)
+                    self.rewrites['folded'] += 1
+                    continue
+                if op == '*':
+                    # c * x is x * c: the constant has no side effects
+                    self.compileTerm(term)
+                    self.multiply(value)
+                    value = None
+                    continue
+                self.push_constant(value)
+                value = None
+            if op == '*' and right is not None:
+                self.multiply(right)
+            elif op == '/' and right in (1, -1):
+                self.rewrites['divide by 1'] += 1
+                if right == -1:
+                    self.vm.arithmetic('neg')
+            else:
+                if right is None:
+                    self.compileTerm(term)
+                else:
+                    self.push_constant(right)
+                self.compileOp(op)
+        if value is not None:
+            self.push_constant(value)
+
+    def constant(self, term):
+        """
+        the value of a constant term, or None. The binary operations it
+        took are counted as folded
+        """
+        value = constant(term)
+        if value is not None and operations(term):
+            self.rewrites['folded'] += operations(term)
+        return value
+
+    def push_constant(self, value):
+        """push any 16-bit value: VM constants are 0..32767"""
+        if value == -32768:
+            self.vm.push('constant', 32767)
+            self.vm.arithmetic('not')
+        elif value < 0:
+            self.vm.push('constant', -value)
+            self.vm.arithmetic('neg')
+        else:
+            self.vm.push('constant', value)
+
+    def double(self, segment_index):
+        """the value on the stack doubled"""
+        self.vm.pop('temp', segment_index)
+        self.vm.push('temp', segment_index)
+        self.vm.push('temp', segment_index)
+        self.vm.arithmetic('add')
+
+    def multiply(self, c):
+        """multiply the value on the stack by the constant c"""
+        n = abs(c)
+        if n == 0:
+            self.rewrites['multiply by 0'] += 1
+            self.vm.pop('temp', 1)  # evaluated for its side effects
+            self.vm.push('constant', 0)
+            return
+        if n == 1:
+            self.rewrites['multiply by 1'] += 1
+        elif n & (n - 1) == 0:
+            self.rewrites['multiply by power of two'] += 1
+            for _ in range(n.bit_length() - 1):
+                self.double(1)
+        elif len(add_chain(n)) <= MAX_ADD_CHAIN:
+            self.rewrites['multiply by add chain'] += 1
+            # x in temp 1, the product so far on the stack
+            self.vm.pop('temp', 1)
+            self.vm.push('temp', 1)
+            for step in add_chain(n):
+                if step == 'double':
+                    self.double(2)
+                else:
+                    self.vm.push('temp', 1)
+                    self.vm.arithmetic('add')
+        else:
+            self.push_constant(c)
+            self.vm.call('Math.multiply', 2)
+            return
+        if c < 0:
+            self.vm.arithmetic('neg')
+
+    def compileTerm(self, term):
+        """
+        integerConst | stringConst | keywordConst | varName |
+        varName '[' expression ']' | '(' expression ')' | unaryOp term |
+        subroutineCall
+        """
+        children = term.children
+        first = children[0]
+        if first.type == INT_CONST:
+            self.vm.push('constant', first.value)
+        elif first.type == STRING_CONST:
+            self.compileString(first.value)
+        elif first.type == KEYWORD:
+            self.compileKeywordConstant(first)
+        elif first.value == '(':
+            self.compileExpression(children[1])
+        elif first.value in unary_ops:
+            self.compileTerm(children[1])
+            self.vm.arithmetic(unary_ops[first.value])
+        elif len(children) == 1:
+            self.vm.push(*self.variable(first))
+        elif children[1].value == '[':
+            self.vm.push(*self.variable(first))
+            self.compileExpression(children[2])
+            self.vm.arithmetic('add')
+            self.vm.pop('pointer', 1)
+            self.vm.push('that', 0)
+        else:
+            self.compileSubroutineCall(children)
+
+    def compileString(self, s):
+        if not self.intern_strings:
+            return self.compileNewString(s)
+        if s not in self.strings:
+            self.strings[s] = self.symbols.var_count(STATIC) + \
+                len(self.strings)
+        self.rewrites['interned string'] += 1
+        self.vm.push('static', self.strings[s])
+
+    def compileNewString(self, s):
+        self.vm.push('constant', len(s))
+        self.vm.call('String.new', 1)
+        for c in s:
+            self.vm.push('constant', ord(c))
+            self.vm.call('String.appendChar', 2)
+
+    def compileKeywordConstant(self, keyword):
+        if keyword.value == 'true':
+            self.vm.push('constant', 0)
+            self.vm.arithmetic('not')
+        elif keyword.value in ('false', 'null'):
+            self.vm.push('constant', 0)
+        elif keyword.value == 'this':
+            self.vm.push('pointer', 0)
+        else:
+            self.error(f"unexpected keyword '{keyword.value}'", keyword)
+
+    def compileSubroutineCall(self, children):
+        """
+        subroutineName '(' expressionList ')' |
+        (className|varName)'.'subroutineName '(' expressionList ')'
+        """
+        nargs = 0
+        if children[1].value == '.':
+            target, name = children[0], children[2].value
+            symbol = self.symbols.lookup(target.value)
+            if symbol:
+                # method call on an object
+                self.vm.push(SEGMENTS[symbol.kind], symbol.index)
+                fullname = f'{symbol.type}.{name}'
+                nargs = 1
+            else:
+                fullname = f'{target.value}.{name}'
+        else:
+            # method call on this
+            self.vm.push('pointer', 0)
+            fullname = f'{self.classname}.{children[0].value}'
+            nargs = 1
+        for expression in children[-2].nodes('expression'):
+            self.compileExpression(expression)
+            nargs += 1
+        self.vm.call(fullname, nargs)
+
+
+STATEMENTS = {
+    'letStatement': 'compileLet',
+    'ifStatement': 'compileIf',
+    'whileStatement': 'compileWhile',
+    'doStatement': 'compileDo',
+    'returnStatement': 'compileReturn',
+}
+
+
+def compile_class(tree, optimize=False, intern_strings=False):
+    """
+    parse tree of a class -> (class name, [Command], Counter of the
+    rewrites made)
+    """
+    generator = CodeGenerator(tree, optimize, intern_strings)
+    commands = generator.compile()
+    return generator.classname, commands, generator.rewrites
+
+
+def link_strings(classes):
+    """
+    make Main.main start by building the interned strings of every class.
+    classes: [(class name, [Command])], changed in place.
+    returns False if there is no Main.main to do it
+    """
+    inits = [f'{name}.{STRINGS_INIT}' for name, commands in classes
+             if any(cmd.is_function() and
+                    cmd.arg1 == f'{name}.{STRINGS_INIT}'
+                    for cmd in commands)]
+    if not inits:
+        return True
+    vm = VMWriter()
+    for init in inits:
+        vm.call(init, 0)
+        vm.pop('temp', 0)
+    for name, commands in classes:
+        for i, cmd in enumerate(commands):
+            if cmd.is_function() and cmd.arg1 == 'Main.main':
+                commands[i + 1:i + 1] = vm.commands
+                return True
+    return False
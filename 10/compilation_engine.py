@@ -1,8 +1,9 @@
 #!/usr/bin/python3
 
 from tokenizer import (
-    IDENTIFIER, INT_CONST, STRING_CONST, KEYWORD
+    IDENTIFIER, INT_CONST, STRING_CONST, KEYWORD, JackError
 )
+from parse_tree import Node
 
 types = set(['int', 'char', 'boolean'])
 subroutine_start = set(['constructor', 'function', 'method'])
@@ -12,24 +13,16 @@ ops = set(['+',  '-', '*', '/', '&', '|', '<', '>', '='])
 unary_op = set(['-', '~'])
 
 
-class JackError(Exception):
+class CompilationEngine:
     """
-    Represents an error in the JACK code.
+    Parses a class from a Tokenizer into a parse tree (see parse_tree):
+    start() returns its root Node.
     """
-    def __init__(self, msg, lineno):
-        super().__init__(msg)
-        self.lineno = lineno
-
-    def __str__(self):
-        return f'Error: line {self.lineno}: {super().__str__()}'
-
-
-class CompilationEngine:
-    def __init__(self, tokenizer, outfile):
+    def __init__(self, tokenizer):
         self.tokenizer = tokenizer
-        self.outfile = outfile
         self.it = iter(self.tokenizer)
-        self.indent = 0
+        self.tree = None
+        self.stack = []     # the Nodes being parsed, innermost last
 
     def curr(self):
         """returns the current token being processed"""
@@ -43,8 +36,8 @@ class CompilationEngine:
 
     def processNext(self):
         """process next token. Do not check for anything"""
-        print(self.tokenizer.curr_to_xml(self.indent), file=self.outfile)
-        return next(self.it)
+        self.stack[-1].children.append(self.tokenizer.token)
+        return next(self.it, None)
 
     def processVoidType(self):
         """process a void or a type token"""
@@ -81,21 +74,24 @@ class CompilationEngine:
                     self.tokenizer.lineno)
         return self.processNext()
 
-    def printStartNonTerm(self, s):
+    def startNonTerm(self, s):
         """start of non-terminal"""
-        print(f"{'  '*self.indent}<{s}>", file=self.outfile)
-        self.indent += 1
+        node = Node(s)
+        if self.stack:
+            self.stack[-1].children.append(node)
+        else:
+            self.tree = node
+        self.stack.append(node)
 
-    def printEndNonTerm(self, s):
-        """start of non-terminal"""
-        self.indent -= 1
-        print(f"{'  '*self.indent}</{s}>", file=self.outfile)
+    def endNonTerm(self, s):
+        """end of non-terminal"""
+        self.stack.pop()
 
     def compileClass(self):
         """
         'class' classname '{' classVarDec* subroutineDec* '}'
         """
-        self.printStartNonTerm("class")
+        self.startNonTerm("class")
         self.process("class")
         self.processIdentifier()  # className
         self.process("{")
@@ -103,16 +99,14 @@ class CompilationEngine:
             self.compileClassVarDec()
         while self.curr() in subroutine_start:
             self.compileSubRoutineDec()
-        try:
-            self.process("}")
-        except StopIteration:
-            self.printEndNonTerm("class")
+        self.process("}")
+        self.endNonTerm("class")
 
     def compileClassVarDec(self):
         """
         ('static'|'field') type varName (',' varName)* ';'
         """
-        self.printStartNonTerm("classVarDec")
+        self.startNonTerm("classVarDec")
         self.processNext()  # static | field
         self.processType()
         self.processIdentifier()  # varName
@@ -120,14 +114,14 @@ class CompilationEngine:
             self.process(',')
             self.processIdentifier()  # varName
         self.process(';')
-        self.printEndNonTerm("classVarDec")
+        self.endNonTerm("classVarDec")
 
     def compileSubRoutineDec(self):
         """
         ('constructor'|'function'|'method') ('void'|type) subroutineName
         '(' parameterList ')' subroutineBody
         """
-        self.printStartNonTerm("subroutineDec")
+        self.startNonTerm("subroutineDec")
         if self.curr() in subroutine_start:
             self.process(self.curr())
         self.processVoidType()
@@ -136,13 +130,13 @@ class CompilationEngine:
         self.compileParamList()
         self.process(')')
         self.compileSubroutineBody()
-        self.printEndNonTerm("subroutineDec")
+        self.endNonTerm("subroutineDec")
 
     def compileParamList(self):
         """
         ((type varName) ("," type varName)*)?
         """
-        self.printStartNonTerm("parameterList")
+        self.startNonTerm("parameterList")
         if self.curr() != ')':
             self.processType()
             self.processIdentifier()
@@ -150,25 +144,25 @@ class CompilationEngine:
                 self.process(',')
                 self.processType()
                 self.processIdentifier()  # varName
-        self.printEndNonTerm("parameterList")
+        self.endNonTerm("parameterList")
 
     def compileSubroutineBody(self):
         """
         '{' varDec* statements '}'
         """
-        self.printStartNonTerm("subroutineBody")
+        self.startNonTerm("subroutineBody")
         self.process('{')
         while self.curr() == 'var':
             self.compileVarDec()
         self.compileStatements()
         self.process('}')
-        self.printEndNonTerm("subroutineBody")
+        self.endNonTerm("subroutineBody")
 
     def compileVarDec(self):
         """
         'var' type varName (','varName)*) ';'
         """
-        self.printStartNonTerm("varDec")
+        self.startNonTerm("varDec")
         self.process('var')
         self.processType()
         self.processIdentifier()  # varName
@@ -176,13 +170,13 @@ class CompilationEngine:
             self.process(",")
             self.processIdentifier()  # varName
         self.process(';')
-        self.printEndNonTerm("varDec")
+        self.endNonTerm("varDec")
 
     def compileStatements(self):
         """
         statement*
         """
-        self.printStartNonTerm("statements")
+        self.startNonTerm("statements")
         while self.curr() in statement_start:
             if self.curr() == 'let':
                 self.compileLet()
@@ -194,13 +188,13 @@ class CompilationEngine:
                 self.compileDo()
             elif self.curr() == 'return':
                 self.compileReturn()
-        self.printEndNonTerm("statements")
+        self.endNonTerm("statements")
 
     def compileLet(self):
         """
         'let' varName ('[' expression ']')? '=' expression ';'
         """
-        self.printStartNonTerm("letStatement")
+        self.startNonTerm("letStatement")
         self.process('let')
         self.processVarName()
         if self.curr() == '[':
@@ -210,14 +204,14 @@ class CompilationEngine:
         self.process('=')
         self.compileExpression()
         self.process(';')
-        self.printEndNonTerm("letStatement")
+        self.endNonTerm("letStatement")
 
     def compileIf(self):
         """
         'if' '(' expression ')' '{' statements '}'
         ('else' '{' statements '}' )?
         """
-        self.printStartNonTerm("ifStatement")
+        self.startNonTerm("ifStatement")
         self.process('if')
         self.process('(')
         self.compileExpression()
@@ -230,13 +224,13 @@ class CompilationEngine:
             self.process('{')
             self.compileStatements()
             self.process('}')
-        self.printEndNonTerm("ifStatement")
+        self.endNonTerm("ifStatement")
 
     def compileWhile(self):
         """
         'while' '(' expression ')' '{' statements '}'
         """
-        self.printStartNonTerm("whileStatement")
+        self.startNonTerm("whileStatement")
         self.process("while")
         self.process("(")
         self.compileExpression()
@@ -244,39 +238,39 @@ class CompilationEngine:
         self.process("{")
         self.compileStatements()
         self.process("}")
-        self.printEndNonTerm("whileStatement")
+        self.endNonTerm("whileStatement")
 
     def compileDo(self):
         """
         'do' subroutineCall ';'
         """
-        self.printStartNonTerm("doStatement")
+        self.startNonTerm("doStatement")
         self.process('do')
         self.compileSubroutineCall()
         self.process(';')
-        self.printEndNonTerm("doStatement")
+        self.endNonTerm("doStatement")
 
     def compileReturn(self):
         """
         'return' (expression)? ';'
         """
-        self.printStartNonTerm("returnStatement")
+        self.startNonTerm("returnStatement")
         self.process('return')
         if self.curr() != ';':
             self.compileExpression()
         self.process(';')
-        self.printEndNonTerm("returnStatement")
+        self.endNonTerm("returnStatement")
 
     def compileExpression(self):
         """
         term (op term)*
         """
-        self.printStartNonTerm("expression")
+        self.startNonTerm("expression")
         self.compileTerm()
         while self.curr() in ops:
             self.processNext()  # op
             self.compileTerm()
-        self.printEndNonTerm("expression")
+        self.endNonTerm("expression")
 
     def compileTerm(self):
         """
@@ -288,7 +282,7 @@ class CompilationEngine:
         curr_toktype = self.tokenizer.token_type()
         peek = self.tokenizer.peek
 
-        self.printStartNonTerm("term")
+        self.startNonTerm("term")
         if curr_toktype in (INT_CONST, STRING_CONST, KEYWORD):
             self.processNext()
         elif curr == '(':
@@ -314,7 +308,7 @@ class CompilationEngine:
         else:
             self.processIdentifier()
 
-        self.printEndNonTerm("term")
+        self.endNonTerm("term")
 
     def compileSubroutineCall(self):
         """
@@ -339,7 +333,7 @@ class CompilationEngine:
         """
         """
         count = 0
-        self.printStartNonTerm("expressionList")
+        self.startNonTerm("expressionList")
         if self.curr() != ')':
             self.compileExpression()
             count += 1
@@ -347,12 +341,11 @@ class CompilationEngine:
             self.process(',')
             self.compileExpression()
             count += 1
-        self.printEndNonTerm("expressionList")
+        self.endNonTerm("expressionList")
         return count
 
     def start(self):
-        try:
-            next(self.it)
-            self.compileClass()
-        except StopIteration:
-            pass
+        """parse the class. returns the root of its parse tree"""
+        next(self.it, None)
+        self.compileClass()
+        return self.tree
@@ -0,0 +1,93 @@
+"""
+The parse tree CompilationEngine builds. A Node is a non-terminal of the
+Jack grammar; its children are Nodes and the Tokens (see tokenizer) it
+was parsed from, in source order. The tree keeps every token, so the
+analyzer's XML is one walk over it, and later stages (code generation,
+analysis) reuse it in memory instead of re-parsing text.
+"""
+
+from tokenizer import token_to_xml
+
+
+class Node:
+    """
+    kind: the non-terminal, as the XML tag names it ('class',
+          'letStatement', 'expression', ...)
+    children: [Node | Token]
+    """
+    __slots__ = ('kind', 'children')
+
+    def __init__(self, kind, children=None):
+        self.kind = kind
+        self.children = [] if children is None else children
+
+    def __repr__(self):
+        return f'Node({self.kind!r}, {self.children!r})'
+
+    @property
+    def line(self):
+        """the line of the node's first token"""
+        for child in self.children:
+            line = child.line
+            if line is not None:
+                return line
+        return None
+
+    def nodes(self, kind=None):
+        """the child Nodes, of one kind if given"""
+        return [child for child in self.children if type(child) is Node and
+                (kind is None or child.kind == kind)]
+
+    def node(self, kind):
+        """the first child Node of a kind, or None"""
+        for child in self.children:
+            if type(child) is Node and child.kind == kind:
+                return child
+        return None
+
+    def tokens(self):
+        """the child Tokens"""
+        return [child for child in self.children if type(child) is not Node]
+
+
+def xml_lines(node, lines, depth=0):
+    """append the XML of the tree at node to lines"""
+    indent = '  ' * depth
+    inner = indent + '  '
+    lines.append(f'{indent}<{node.kind}>')
+    for child in node.children:
+        if type(child) is Node:
+            xml_lines(child, lines, depth + 1)
+        else:
+            lines.append(token_to_xml(child, inner))
+    lines.append(f'{indent}</{node.kind}>')
+    return lines
+
+
+def iter_xml(node, depth=0):
+    """the lines of the XML of the tree at node, one at a time"""
+    indent = '  ' * depth
+    inner = indent + '  '
+    yield f'{indent}<{node.kind}>'
+    for child in node.children:
+        if type(child) is Node:
+            yield from iter_xml(child, depth + 1)
+        else:
+            yield token_to_xml(child, inner)
+    yield f'{indent}</{node.kind}>'
+
+
+def leaves(node):
+    """the Tokens of the tree at node, in source order"""
+    for child in node.children:
+        if type(child) is Node:
+            yield from leaves(child)
+        else:
+            yield child
+
+
+def write_xml(tree, outfile):
+    """write the analyzer's XML of a parse tree"""
+    lines = xml_lines(tree, [])
+    lines.append('')
+    outfile.write('\n'.join(lines))
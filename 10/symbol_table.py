@@ -0,0 +1,54 @@
+"""
+Jack symbol tables. A class scope holds the statics and fields, a
+subroutine scope the arguments and locals; names are looked up in the
+subroutine scope first.
+"""
+
+from collections import namedtuple
+
+STATIC = 'static'
+FIELD = 'field'
+ARG = 'arg'
+VAR = 'var'
+
+# the VM segment each kind of variable lives in
+SEGMENTS = {
+    STATIC: 'static',
+    FIELD: 'this',
+    ARG: 'argument',
+    VAR: 'local',
+}
+
+Symbol = namedtuple('Symbol', 'name type kind index')
+
+
+class SymbolTable:
+    def __init__(self):
+        self.class_scope = {}
+        self.subroutine_scope = {}
+        self.counts = dict.fromkeys(SEGMENTS, 0)
+
+    def start_subroutine(self):
+        """a new subroutine scope: forget the arguments and locals"""
+        self.subroutine_scope = {}
+        self.counts[ARG] = self.counts[VAR] = 0
+
+    def define(self, name, type, kind):
+        """
+        define a new variable of a kind. returns False if the name is
+        already defined in its scope
+        """
+        scope = self.class_scope if kind in (STATIC, FIELD) else \
+            self.subroutine_scope
+        if name in scope:
+            return False
+        scope[name] = Symbol(name, type, kind, self.counts[kind])
+        self.counts[kind] += 1
+        return True
+
+    def var_count(self, kind):
+        return self.counts[kind]
+
+    def lookup(self, name):
+        """the Symbol of a name, or None if it is not a variable"""
+        return self.subroutine_scope.get(name) or self.class_scope.get(name)
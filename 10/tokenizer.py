@@ -1,8 +1,11 @@
 #!/usr/bin/python3
 
+import re
 import sys
+import string
+from collections import namedtuple
+from itertools import accumulate, compress, count, repeat
 from pathlib import Path
-import re
 
 
 KEYWORD = 'keyword'
@@ -25,71 +28,195 @@ symbols = set([
 ])
 
 
+class JackError(Exception):
+    """
+    Represents an error in the JACK code.
+    """
+    def __init__(self, msg, lineno):
+        super().__init__(msg)
+        self.lineno = lineno
+
+    def __str__(self):
+        return f'Error: line {self.lineno}: {super().__str__()}'
+
+    def __reduce__(self):
+        # to come back from a worker process
+        return type(self), (self.args[0], self.lineno)
+
+
+# A token of the source. value is the token's text; for string
+# constants, without the quotes
+Token = namedtuple('Token', 'type value line')
+
+# One pattern for the whole language: findall splits the source into
+# its words, which are the tokens, the line ends and the comments. The
+# horizontal whitespace before a word is skipped inside the match, and
+# the word is the one group. Comments are matched unrolled,
+# /* [^*]* \*+ ([^/*] [^*]* \*+)* /, so every character is looked at
+# once whatever the comment's size: a block comment that cannot be
+# closed fails straight away and is left to the /\* alternative. A lone
+# / is left to \S, after the comments. Strings end on the same line
+RE_TOKEN = re.compile(r'''
+    [ \t]*
+    (
+        [A-Za-z_]\w* | [{}()\[\].,;+\-*&|<>=~] | \n | [0-9]+ | "[^"\n]*"
+      | //[^\n]* | /\*[^*]*\*+(?:[^/*][^*]*\*+)*/ | /\* | \S
+    )
+''', re.VERBOSE)
+
+# the kinds of words that are not tokens
+NEWLINE = 'newline'
+COMMENT = 'comment'
+
+# scan error -> its message, formatted with the word
+SCAN_ERRORS = {
+    'open comment': 'unterminated comment',
+    'open string': 'unterminated string constant',
+    'error': 'unexpected character {!r}',
+    'too large': '{} too large',
+}
+
+# word -> its kind, for the words that are their own kind
+KINDS = {
+    **dict.fromkeys(keywords, KEYWORD),
+    **dict.fromkeys(symbols, SYMBOL),
+    '\n': NEWLINE,
+    '/*': 'open comment',
+    '"': 'open string',
+}
+
+# first character -> kind, for the others
+FIRST = {
+    **dict.fromkeys(string.ascii_letters + '_', IDENTIFIER),
+    **dict.fromkeys(string.digits, INT_CONST),
+    '"': STRING_CONST,
+    '/': COMMENT,
+}
+
+TOKEN_TYPES = {KEYWORD, SYMBOL, STRING_CONST, INT_CONST, IDENTIFIER}
+
+
+def kind(word):
+    """a word of the source -> its token type, or what else it is"""
+    found = KINDS.get(word) or FIRST.get(word[0], 'error')
+    if found == INT_CONST and int(word) > 32767:
+        return 'too large'
+    return found
+
+
+def scan_error(words, vocabulary):
+    """the JackError of the first word that is a scan error"""
+    i = next(i for i, word in enumerate(words)
+             if vocabulary[word] in SCAN_ERRORS)
+    line = 1 + sum(map(str.count, words[:i], repeat('\n')))
+    return JackError(SCAN_ERRORS[vocabulary[words[i]]].format(words[i]), line)
+
+
+def tokenize(content):
+    """jack source -> [Token]"""
+    return Tokenizer(content).tokens
+
+
+XML_ESCAPES = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;',
+                             '"': '&quot;'})
+
+
+def token_to_xml(token, indent=''):
+    value = token.value.translate(XML_ESCAPES)
+    return f'{indent}<{token.type}> {value} </{token.type}>'
+
+
 class Tokenizer:
+    """
+    Steps through the tokens of a jack source, held as their types and
+    texts. While iterating, curr and peek are the source text of the
+    current and next tokens: string constants keep their quotes, so
+    they are never taken for the symbol or keyword they spell. They are
+    None past the end. token is the current Token: the Tokens, and
+    their lines, are built the first time one is asked for.
+    """
     def __init__(self, content):
-        content = re.sub(r'//.*', '', content)
-        content = re.sub(r'/\*(.|\n)*?\*/', '', content)
-        content = re.sub(r'/\*(.|\n)*?\*/', '', content, re.MULTILINE)
-        # print(content)
-
-        regex = r'".+"|\n|\w+|[{}()\[\]\.,;\+\-\*/&\|<>=~]'
-        self.lineno = 1
-        self.words = re.findall(regex, content)
-        self.curr = self.peek = None
-
-    def _token_type(self, tok):
-        if tok in keywords:
-            return KEYWORD
-        elif tok in symbols:
-            return SYMBOL
-        elif tok[0] == '"' and tok[-1] == '"':
-            return STRING_CONST
-        elif re.match(r'^\d+$', tok):
-            if int(tok) > 32767:
-                raise Exception(f'{tok} too large')
-            return INT_CONST
-        else:
-            return IDENTIFIER
+        words = RE_TOKEN.findall(content)
+        # sources use few distinct words: each is classified once, and
+        # the words are looked up in one pass
+        vocabulary = {word: kind(word) for word in set(words)}
+        if not SCAN_ERRORS.keys().isdisjoint(vocabulary.values()):
+            raise scan_error(words, vocabulary)
+        tokens = {word for word, found in vocabulary.items()
+                  if found in TOKEN_TYPES}
+        keep = list(map(tokens.__contains__, words))
+        self.texts = list(compress(words, keep))
+        self.types = list(map(vocabulary.__getitem__, self.texts))
+        self._words, self._keep = words, keep   # for the tokens' lines
+        self._tokens = None
+        self.i = self.type = self.curr = self.peek = None
+
+    def __len__(self):
+        return len(self.texts)
+
+    @property
+    def tokens(self):
+        """[Token], built the first time they are asked for"""
+        if self._tokens is None:
+            words = self._words
+            newlines = {word: word.count('\n') for word in set(words)}
+            starts = accumulate(map(newlines.__getitem__, words), initial=1)
+            lines = compress(starts, self._keep)
+            values = self.texts
+            if STRING_CONST in self.types:
+                values = [text[1:-1] if type == STRING_CONST else text
+                          for type, text in zip(self.types, values)]
+            self._tokens = list(map(tuple.__new__, repeat(Token),
+                                    zip(self.types, values, lines)))
+            self._words = self._keep = None
+        return self._tokens
+
+    @property
+    def token(self):
+        """the current Token"""
+        if self.i is None:
+            return None
+        return self.tokens[self.i]
+
+    @property
+    def lineno(self):
+        if self.i is not None:
+            return self.token.line
+        return self.tokens[-1].line if self.texts else 1
 
     def token_type(self):
-        return self._token_type(self.curr)
+        return self.type
 
     def peek_token_type(self):
-        return self._token_type(self.peek)
+        i = self.i + 1
+        return self.types[i] if i < len(self.types) else None
 
     def __iter__(self):
-        if not self.words:
-            return
-        self.curr = self.words[0]
-        for word in self.words[1:]:
-            if word == '\n':
-                self.lineno += 1
-                continue
-            self.peek = word
-            if self.curr.strip():
-                yield self.curr
-            self.curr = self.peek
-
-        if self.curr.strip():
-            yield self.curr
+        texts = self.texts
+        peeks = iter(texts)
+        next(peeks, None)
+        for i, type, text in zip(count(), self.types, texts):
+            self.i = i
+            self.type = type
+            self.curr = text
+            self.peek = next(peeks, None)
+            yield text
+        self.i = self.type = self.curr = None
 
     def curr_to_xml(self, indent=0):
-        token = self.curr
-        toktype = self.token_type()
-        if toktype == STRING_CONST:
-            token = token.replace('"', '')
-        token = re.sub(r'&', '&amp;', token)
-        token = re.sub(r'<', '&lt;', token)
-        token = re.sub(r'>', '&gt;', token)
-        token = re.sub(r'"', '&quot', token)
-        return f'{"  "*indent}<{toktype}> {token} </{toktype}>'
+        return token_to_xml(self.token, '  ' * indent)
 
-    def to_xml_tree(self, outfile):
-        outfile.write('<tokens>\n')
+    def xml_lines(self):
+        """the lines of the tokens' XML, one at a time"""
+        yield '<tokens>'
         for _ in self:
-            outfile.write(self.curr_to_xml())
-            outfile.write("\n")
-        outfile.write('</tokens>\n')
+            yield self.curr_to_xml()
+        yield '</tokens>'
+
+    def to_xml_tree(self, outfile):
+        for line in self.xml_lines():
+            outfile.write(line)
+            outfile.write('\n')
 
 
 def main():
@@ -114,5 +241,8 @@ def main():
 
 
 if __name__ == '__main__':
-    main()
+    try:
+        main()
+    except JackError as e:
+        sys.exit(e)
 
@@ -0,0 +1,88 @@
+"""
+VM command output for the Jack compiler. Commands are built directly as
+the VM translator's Command objects (see 08/VMTranslator.py), so
+compiled code goes to its translation functions with no .vm text to
+write and parse back.
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / '08'))
+import VMTranslator  # noqa: E402
+from VMTranslator import Command, CmdType  # noqa: E402
+
+
+class VMWriter:
+    """
+    Collects the VM commands of a class in commands. lineno is the Jack
+    line the next commands are compiled from.
+    """
+    def __init__(self):
+        self.commands = []
+        self.lineno = -1
+
+    def command(self, txt, cmdtype, cmdtok, arg1=None, arg2=None):
+        self.commands.append(Command(txt, cmdtype, cmdtok, arg1, arg2,
+                                     len(self.commands), self.lineno))
+
+    def push(self, segment, index):
+        self.command(f'push {segment} {index}', CmdType.PUSH, 'push',
+                     segment, str(index))
+
+    def pop(self, segment, index):
+        self.command(f'pop {segment} {index}', CmdType.POP, 'pop',
+                     segment, str(index))
+
+    def arithmetic(self, op):
+        """add, sub, neg, eq, gt, lt, and, or, not"""
+        self.command(op, CmdType.ARITHMETIC, op)
+
+    def label(self, label):
+        self.command(f'label {label}', CmdType.BRANCH, 'label', label)
+
+    def goto(self, label):
+        self.command(f'goto {label}', CmdType.BRANCH, 'goto', label)
+
+    def if_goto(self, label):
+        self.command(f'if-goto {label}', CmdType.BRANCH, 'if-goto', label)
+
+    def call(self, name, nargs):
+        self.command(f'call {name} {nargs}', CmdType.CALL, 'call',
+                     name, str(nargs))
+
+    def function(self, name, nlocals):
+        self.command(f'function {name} {nlocals}', CmdType.FUNCTION,
+                     'function', name, str(nlocals))
+
+    def return_(self):
+        self.command('return', CmdType.RETURN, 'return')
+
+
+def vm_text(commands):
+    """the .vm file of commands"""
+    return ''.join(cmd.txt + '\n' for cmd in commands)
+
+
+def translate(classes):
+    """
+    classes: [(class name, [Command])]
+    returns: the hack assembly of the whole program, with the bootstrap
+    """
+    return ''.join(translate_classes(classes))
+
+
+def translate_classes(classes):
+    """
+    classes: iterable of (class name, [Command]), translated as they come.
+    Generates the hack assembly of the program a piece at a time: the
+    bootstrap, each class, the final loop
+    """
+    state = VMTranslator.state
+    state['curr_function'] = 'bootstrap'
+    state['return_counter'] = 0
+    yield VMTranslator.bootstrap()
+    for name, commands in classes:
+        state['curr_filespace'] = name
+        yield ''.join(map(VMTranslator.translate_cmd, commands))
+    yield VMTranslator.infloop()
@@ -0,0 +1,52 @@
+"""
+Compares the analyzer's XML with the course's reference files, the way
+TextComparer does but as a stream: both sides are read a line at a time,
+neither is held whole, and the comparison stops at the first difference.
+
+Whitespace is normalized: blank lines are skipped, and runs of spaces,
+tabs and line ends (the reference files end lines with CRLF) are one
+space.
+"""
+
+from collections import deque, namedtuple
+
+# line: of the reference file. context: the lines before it, which agree
+Difference = namedtuple('Difference', 'line expected actual context')
+
+END = '<end of file>'
+
+
+def normalized(lines):
+    """lines -> (line number, normalized line), skipping blank ones"""
+    for lineno, line in enumerate(lines, 1):
+        line = ' '.join(line.split())
+        if line:
+            yield lineno, line
+
+
+def first_difference(lines, reffile, context=3):
+    """
+    lines: the XML, a line at a time. reffile: the reference, an open
+    file. returns the first Difference, or None if they are the same
+    """
+    before = deque(maxlen=context)
+    actual = normalized(lines)
+    lineno = 0
+    for lineno, expected in normalized(reffile):
+        line = next(actual, (None, END))[1]
+        if line != expected:
+            return Difference(lineno, expected, line, list(before))
+        before.append(expected)
+    line = next(actual, None)
+    if line is not None:
+        return Difference(lineno + 1, END, line[1], list(before))
+    return None
+
+
+def report(name, refname, diff):
+    """a Difference -> what to tell the user"""
+    lines = [f'{name}: differs from {refname} at line {diff.line}']
+    lines.extend(f'    {line}' for line in diff.context)
+    lines.append(f'  expected: {diff.expected}')
+    lines.append(f'  got:      {diff.actual}')
+    return '\n'.join(lines)
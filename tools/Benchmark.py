@@ -0,0 +1,227 @@
+#!/usr/bin/python3
+"""
+Nand2Tetris toolchain benchmarks: the throughput of the Jack tokenizer,
+the CompilationEngine, the VM translator and the hack assembler, on
+synthetic inputs of the given sizes (see workloads.py).
+
+    tokenizer_docs: jack_docs -> tokens
+    tokenizer_code: jack_square -> tokens
+    parser:         jack_nested, tokenized beforehand -> parse tree
+    vm_translator:  vm_random -> hack assembly
+    assembler:      asm_pong -> ROM words
+
+Each benchmark runs --repeat times per size, and the fastest run is
+reported, in MB of input and items per second. The report is JSON: kept
+as a baseline, it is what 'compare' measures later runs against.
+'compare' fails if the throughput of any benchmark at any size dropped
+by more than --threshold percent.
+
+benchmark_baseline.json is the tree's baseline, run with --repeat 5.
+Throughput depends on the machine: on another one, make a baseline
+there, at the commit the change starts from, before comparing.
+
+input: sizes of the inputs, in MB
+output: the report, as JSON
+
+USAGE:
+./Benchmark.py run [-o REPORT.json] [--repeat R] [--only BENCH,..] [MB ...]
+./Benchmark.py compare [--threshold PCT] BASELINE.json REPORT.json
+./Benchmark.py generate WORKLOAD MB FILE
+"""
+
+import sys
+import json
+import time
+import platform
+import argparse
+from pathlib import Path
+from workloads import GENERATORS
+
+REPO = Path(__file__).resolve().parent.parent
+
+for week in ('06', '08', '10'):
+    sys.path.insert(0, str(REPO / week))
+import HackAssembler  # noqa: E402
+import VMTranslator  # noqa: E402
+from tokenizer import Tokenizer, tokenize  # noqa: E402
+from compilation_engine import CompilationEngine  # noqa: E402
+
+VM_STATE = dict(VMTranslator.state)
+
+
+def prepare_tokenizer(source):
+    return source
+
+
+def run_tokenizer(source):
+    return len(tokenize(source))
+
+
+def prepare_parser(source):
+    return Tokenizer(source)
+
+
+def run_parser(tokenizer):
+    CompilationEngine(tokenizer).start()
+    return len(tokenizer)
+
+
+def prepare_vm_translator(source):
+    return source.splitlines()
+
+
+def run_vm_translator(lines):
+    VMTranslator.state.update(VM_STATE)
+    ncommands = 0
+    for cmd in VMTranslator.parse_lines(lines):
+        VMTranslator.translate_cmd(cmd)
+        ncommands += 1
+    return ncommands
+
+
+def prepare_assembler(source):
+    return source.splitlines()
+
+
+def run_assembler(lines):
+    return sum(1 for _ in HackAssembler.assemble_lines(lines))
+
+
+# benchmark -> (workload, prepare the input, run -> items, unit)
+BENCHMARKS = {
+    'tokenizer_docs': ('jack_docs', prepare_tokenizer, run_tokenizer,
+                       'tokens'),
+    'tokenizer_code': ('jack_square', prepare_tokenizer, run_tokenizer,
+                       'tokens'),
+    'parser': ('jack_nested', prepare_parser, run_parser, 'tokens'),
+    'vm_translator': ('vm_random', prepare_vm_translator, run_vm_translator,
+                      'VM commands'),
+    'assembler': ('asm_pong', prepare_assembler, run_assembler,
+                  'ROM words'),
+}
+
+
+def size_name(mb):
+    return f'{mb:g}MB'
+
+
+def benchmark(name, mb, repeat):
+    """run a benchmark on an input of mb MB -> its results, as JSON"""
+    workload, prepare, run, unit = BENCHMARKS[name]
+    source = GENERATORS[workload](int(mb * 2**20))
+    data = prepare(source)
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        items = run(data)
+        best = min(best, time.perf_counter() - start)
+    return {
+        'bytes': len(source),
+        'seconds': round(best, 6),
+        'mb_per_s': round(len(source) / 2**20 / best, 3),
+        'items': items,
+        'items_per_s': round(items / best),
+        'unit': unit,
+    }
+
+
+def run_benchmarks(args):
+    names = args.only.split(',') if args.only else list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            sys.exit(f'unknown benchmark: {name}')
+    report = {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'repeat': args.repeat,
+        'results': {},
+    }
+    for name in names:
+        results = report['results'][name] = {}
+        for mb in args.sizes:
+            result = results[size_name(mb)] = benchmark(name, mb, args.repeat)
+            print(f'{name:14} {size_name(mb):>8}: '
+                  f'{result["mb_per_s"]:8.2f} MB/s '
+                  f'{result["items_per_s"]:>10} {result["unit"]}/s',
+                  file=sys.stderr)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+def changes(baseline, report):
+    """
+    [(benchmark, size, MB/s before, MB/s after, change %)] of every
+    benchmark and size in both reports
+    """
+    found = []
+    for name, results in report['results'].items():
+        before_results = baseline['results'].get(name, {})
+        for size, result in results.items():
+            before = before_results.get(size)
+            if before is None:
+                continue
+            change = (result['mb_per_s'] / before['mb_per_s'] - 1) * 100
+            found.append((name, size, before['mb_per_s'],
+                          result['mb_per_s'], change))
+    return found
+
+
+def compare(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.report) as f:
+        report = json.load(f)
+    failed = False
+    for name, size, before, after, change in changes(baseline, report):
+        regressed = change < -args.threshold
+        failed |= regressed
+        print(f'{"REGRESSED" if regressed else "ok":9} {name:14} '
+              f'{size:>8}: {before:8.2f} -> {after:8.2f} MB/s '
+              f'({change:+.1f}%)')
+    if failed:
+        sys.exit(f'throughput dropped by more than {args.threshold:g}%')
+
+
+def generate(args):
+    with open(args.file, 'w') as f:
+        f.write(GENERATORS[args.workload](int(args.mb * 2**20)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the toolchain.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help='run the benchmarks')
+    run.add_argument('sizes', nargs='*', type=float, default=[0.25, 1],
+                     help='input sizes in MB')
+    run.add_argument('-o', '--output', help='write the report here')
+    run.add_argument('--repeat', type=int, default=3,
+                     help='runs per size; the fastest is reported')
+    run.add_argument('--only', help='benchmarks to run, comma separated: '
+                     + ', '.join(BENCHMARKS))
+    run.set_defaults(fn=run_benchmarks)
+
+    cmp = commands.add_parser('compare',
+                              help='fail if throughput dropped')
+    cmp.add_argument('baseline', help='an earlier report')
+    cmp.add_argument('report', help='the report to check')
+    cmp.add_argument('--threshold', type=float, default=10,
+                     help='the drop in percent that fails')
+    cmp.set_defaults(fn=compare)
+
+    gen = commands.add_parser('generate', help='write a workload to a file')
+    gen.add_argument('workload', choices=GENERATORS)
+    gen.add_argument('mb', type=float, help='size in MB')
+    gen.add_argument('file')
+    gen.set_defaults(fn=generate)
+
+    args = parser.parse_args()
+    args.fn(args)
+
+
+if __name__ == '__main__':
+    main()
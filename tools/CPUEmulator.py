@@ -0,0 +1,123 @@
+#!/usr/bin/python3
+"""
+Nand2Tetris CPU Emulator. Runs a Hack program headless.
+
+input: hack binary (.hack) or hack assembly (.asm)
+output: the registers after running, and the emulation speed
+
+USAGE:
+./CPUEmulator.py prog.hack [--cycles N] [--interpret | --batch N]
+./CPUEmulator.py prog.hack --frames N [--frame-cycles C]
+                 [--export DIR --format png|pbm|txt] [--show]
+
+--keys script.txt supplies timed keyboard input (see keyboard.py)
+"""
+
+import sys
+import time
+import argparse
+from pathlib import Path
+from emulator import Computer, EmulatorError, load_rom
+from keyboard import Keyboard
+
+
+def run_batch(args):
+    from batch_emulator import BatchComputer
+
+    batch = BatchComputer(load_rom(args.program), args.batch)
+    start = time.perf_counter()
+    batch.run(args.cycles)
+    elapsed = time.perf_counter() - start
+
+    total = batch.time * batch.n
+    print(f'{batch.n} machines x {batch.time} cycles in {elapsed:.3f}s '
+          f'({total / elapsed / 1e6:.2f} M machine-cycles/s)')
+
+
+def make_advance(args):
+    """returns a function(computer, cycles) that runs the computer"""
+    if args.keys:
+        return Keyboard.load(args.keys).run
+    return lambda computer, cycles: computer.run(cycles)
+
+
+def run_frames(args):
+    """
+    run the program a frame at a time, exporting the screen after each
+    """
+    from screen import Screen
+
+    computer = Computer.load(args.program, track_screen=True)
+    advance = make_advance(args)
+    screen = Screen()
+    if args.export:
+        Path(args.export).mkdir(parents=True, exist_ok=True)
+
+    start = time.perf_counter()
+    for frame in range(args.frames):
+        advance(computer, args.frame_cycles)
+        rows = screen.update(computer.ram, computer.dirty)
+        if args.export:
+            fname = f'frame{frame:05}.{args.format}'
+            screen.save(str(Path(args.export) / fname))
+        if args.verbose:
+            print(f'frame {frame}: {len(rows)} rows changed')
+    elapsed = time.perf_counter() - start
+
+    if args.show:
+        print(screen.to_text())
+    print(f'{args.frames} frames, {computer.time} cycles in {elapsed:.3f}s '
+          f'({computer.skipped} fast-forwarded)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a Hack program.')
+    parser.add_argument('program', help='.hack or .asm file')
+    parser.add_argument('--cycles', type=int, default=1000000,
+                        help='number of instructions to execute')
+    parser.add_argument('--interpret', action='store_true',
+                        help='decode one instruction at a time '
+                             'instead of running translated blocks')
+    parser.add_argument('--batch', type=int, metavar='N',
+                        help='run N machines in lockstep (needs numpy)')
+    parser.add_argument('--frames', type=int,
+                        help='run N frames, tracking the screen (needs numpy)')
+    parser.add_argument('--frame-cycles', type=int, default=100000,
+                        help='instructions per frame')
+    parser.add_argument('--export', metavar='DIR',
+                        help='save every frame in DIR')
+    parser.add_argument('--format', choices=('png', 'pbm', 'txt'),
+                        default='png', help='format of exported frames')
+    parser.add_argument('--show', action='store_true',
+                        help='render the last frame in the terminal')
+    parser.add_argument('--keys', metavar='SCRIPT',
+                        help='keyboard script: lines of "cycle key"')
+    parser.add_argument('-v', '--verbose', action='store_true')
+    args = parser.parse_args()
+
+    if args.frames:
+        run_frames(args)
+        return
+    if args.batch:
+        run_batch(args)
+        return
+
+    computer = Computer.load(args.program)
+    start = time.perf_counter()
+    if args.interpret:
+        computer.run_interpreted(args.cycles)
+    else:
+        make_advance(args)(computer, args.cycles)
+    elapsed = time.perf_counter() - start
+
+    print(f'A={computer.a} D={computer.d} PC={computer.pc}')
+    print(f'{computer.time} cycles in {elapsed:.3f}s '
+          f'({computer.time / elapsed / 1e6:.2f} MIPS, '
+          f'{computer.skipped} fast-forwarded)')
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except EmulatorError as e:
+        sys.exit(e)
@@ -0,0 +1,80 @@
+#!/usr/bin/python3
+"""
+Nand2Tetris chip cost report: Nand count, DFF count, logic depth and
+fan-out hot spots of every chip, as JSON (see chip_stats.py).
+
+input: directories of .hdl chips (default: the project directories)
+output: JSON, and the chips that got bigger or deeper than in a
+        baseline report
+
+USAGE:
+./ChipStats.py [-o REPORT.json] [--baseline BASELINE.json] [dir ...]
+"""
+
+import sys
+import json
+import argparse
+from pathlib import Path
+from hdl import ChipLibrary, HdlError, PROJECT_DIRS
+from chip_stats import Analyzer
+
+# a chip regressed if any of these grew
+TRACKED = ('nands', 'dffs', 'depth')
+
+
+def analyze(dirs):
+    """{chip name: stats json} of every .hdl in dirs"""
+    analyzer = Analyzer(ChipLibrary([*dirs, *PROJECT_DIRS]))
+    report = {}
+    for d in dirs:
+        for hdlpath in sorted(Path(d).glob('*.hdl')):
+            try:
+                report[hdlpath.stem] = \
+                    analyzer.template(hdlpath.stem).to_json()
+            except HdlError as e:
+                report[hdlpath.stem] = {'error': str(e)}
+    return report
+
+
+def regressions(report, baseline):
+    """[(chip, measure, before, after)] of what grew since baseline"""
+    found = []
+    for name, stats in report.items():
+        before = baseline.get(name)
+        if not before or 'error' in stats or 'error' in before:
+            continue
+        for measure in TRACKED:
+            if stats[measure] > before.get(measure, stats[measure]):
+                found.append((name, measure, before[measure], stats[measure]))
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Report chip costs.')
+    parser.add_argument('dirs', nargs='*', default=PROJECT_DIRS,
+                        help='directories of .hdl files')
+    parser.add_argument('-o', '--output', help='write the report here')
+    parser.add_argument('--baseline',
+                        help='a previous report: fail if any chip grew')
+    args = parser.parse_args()
+
+    report = analyze(args.dirs)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as out:
+            print(text, file=out)
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(report, json.load(f))
+        for name, measure, before, after in found:
+            print(f'REGRESSION {name}: {measure} {before} -> {after}',
+                  file=sys.stderr)
+        if found:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/python3
+"""
+Nand2Tetris hardware simulator, headless.
+
+input: Chip.tst: runs the test script against its compare file
+       Chip.hdl: flattens and optimizes the chip, and prints its netlist
+output: the test result, or the netlist's size before and after
+        optimization, checked equivalent by random simulation
+        --event: simulates event-driven, and reports the gate evaluations
+        saved against levelized sweeps
+
+USAGE:
+./HardwareSimulator.py [--write-out] [--gate-level] [--event] Chip.tst
+./HardwareSimulator.py [--cycles N] Chip.hdl
+"""
+
+import sys
+import time
+import argparse
+from tst import TestScript, TstError, run_script, PASS
+from hdl import load_chip, flatten, HdlError
+from optimize import optimize, equivalent
+
+
+def summary(netlist):
+    return (f'{len(netlist.nands)} Nand, {len(netlist.dffs)} DFF, '
+            f'depth {max(netlist.levels, default=0)}')
+
+
+def describe(hdlfname, cycles):
+    start = time.perf_counter()
+    chip, library = load_chip(hdlfname)
+    netlist = flatten(chip, library)
+    flattened = time.perf_counter()
+    optimized, stats = optimize(netlist)
+    done = time.perf_counter()
+    print(f'{netlist.name}: {summary(netlist)}, {netlist.nnets} nets')
+    for builtin in netlist.builtins:
+        print(f'  builtin {builtin.name}')
+    print(f'flattened in {flattened - start:.2f}s')
+    print(f'optimized: {summary(optimized)} in {done - flattened:.2f}s')
+    for rewrite, n in stats.items():
+        print(f'  {rewrite}: {n}')
+
+    difference = equivalent(netlist, optimized, cycles)
+    if difference:
+        sys.exit(f'optimized netlist differs: {difference}')
+    print(f'equivalent on {cycles} random steps')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulate a chip.')
+    parser.add_argument('file', help='.tst script or .hdl chip')
+    parser.add_argument('--write-out', action='store_true',
+                        help='write the .out file of the test')
+    parser.add_argument('--gate-level', action='store_true',
+                        help='simulate every sub-chip at gate level, even '
+                        'those with verified behavioral models, and chips '
+                        'of any size')
+    parser.add_argument('--cycles', type=int, default=200,
+                        help='random steps checking the optimized netlist')
+    parser.add_argument('--event', action='store_true',
+                        help='simulate event-driven, and report the gate '
+                        'evaluations saved')
+    args = parser.parse_args()
+
+    if args.file.endswith('.hdl'):
+        try:
+            describe(args.file, args.cycles)
+        except HdlError as e:
+            sys.exit(str(e))
+        return
+
+    try:
+        script = TestScript(args.file, args.write_out,
+                            gate_level=args.gate_level,
+                            event_driven=args.event)
+    except (TstError, OSError) as e:
+        sys.exit(str(e))
+    status, msg = run_script(script)
+    print(f'{status}: {msg}')
+    if args.event and hasattr(script.backend, 'sim'):
+        report = script.backend.sim.report()
+        print(f'{report["evaluations"]} gate evaluations in '
+              f'{report["sweeps"]} passes over {report["nodes"]} nodes; '
+              f'levelized sweeps: {report["sweep_evaluations"]} '
+              f'({report["saved"]:.1%} saved)')
+    if status != PASS:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+#!/usr/bin/python3
+"""
+Nand2Tetris test runner. Runs .tst scripts and compares their output
+with the .cmp files, without the Java simulators.
+
+Chip tests run after the tests of the chips they are built from, so
+sub-chips are verified once and their behavioral models reused (see
+tst.verified); independent tests run in parallel. Passing results are
+cached, keyed by the hashes of every file the test used (.tst, .cmp,
+the .hdl of the chip and all its sub-chips, the program) and of the
+tools themselves: an unchanged test is not run again.
+
+input: .tst files, or directories to search for them
+output: PASS/FAIL/SKIP per script
+
+USAGE:
+./RunTests.py [-j JOBS] [-v] [--write-out] [--gate-level] [--no-cache]
+              [path ...]
+"""
+
+import os
+import sys
+import time
+import hashlib
+import argparse
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import cache
+from tst import TestScript, TstError, parse, run_script, FAIL, PASS
+from hdl import ChipLibrary, ChipDef, HdlError, PROJECT_DIRS
+
+TOOLS = Path(__file__).resolve().parent
+
+# bump when what a cached pass means changes
+VERSION = 1
+
+
+def discover(paths):
+    """the .tst files named by paths, searching directories recursively"""
+    tests = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            tests += sorted(path.rglob('*.tst'))
+        else:
+            tests.append(path)
+    return tests
+
+
+def tested_chip(tstpath):
+    """the .hdl file a test script loads, or None"""
+    try:
+        with open(tstpath) as tstfile:
+            commands = parse(tstfile.read())
+    except (OSError, TstError):
+        return None
+    for cmd in commands:
+        if cmd.words[0] == 'load' and len(cmd.words) == 2 and \
+                cmd.words[1].endswith('.hdl'):
+            return (tstpath.parent / cmd.words[1]).resolve()
+    return None
+
+
+def sub_chips(hdlpath, libraries):
+    """
+    the .hdl files of every chip hdlpath is built from, following the
+    PARTS sections
+    """
+    dirs = (hdlpath.parent, *PROJECT_DIRS)
+    library = libraries.setdefault(dirs, ChipLibrary(dirs))
+    found = set()
+    try:
+        todo = [library.parse(hdlpath)]
+        while todo:
+            for part in todo.pop().parts:
+                chip = library.get(part.chip)
+                if isinstance(chip, ChipDef) and \
+                        Path(chip.fname).resolve() not in found:
+                    found.add(Path(chip.fname).resolve())
+                    todo.append(chip)
+    except (OSError, HdlError):
+        pass  # the test itself will report it
+    return found
+
+
+def dependencies(tests):
+    """
+    {test: tests of the chips its chip is built from}: the chip
+    dependency graph, as test ordering constraints
+    """
+    libraries = {}
+    chips = {test: tested_chip(test) for test in tests}
+    tests_of = {}
+    for test, chip in chips.items():
+        tests_of.setdefault(chip, []).append(test)
+    deps = {}
+    for test, chip in chips.items():
+        deps[test] = set()
+        if chip:
+            for sub in sub_chips(chip, libraries):
+                deps[test].update(tests_of.get(sub, ()))
+    return deps
+
+
+def tools_digest():
+    """hash of the tools' own source: a new runner invalidates results"""
+    digest = hashlib.sha256()
+    for fname in sorted([*TOOLS.glob('*.py'), TOOLS.parent / '06' /
+                         'HackAssembler.py']):
+        digest.update(cache.file_hash(fname).encode())
+    return digest.hexdigest()
+
+
+def cache_key(tstpath, gate_level, digest):
+    return f'{Path(tstpath).resolve()}:{gate_level}:{digest}'
+
+
+def timed_run(tstpath, write_out, gate_level):
+    """returns: (status, message, seconds, deps of the run)"""
+    start = time.perf_counter()
+    try:
+        script = TestScript(tstpath, write_out, gate_level=gate_level)
+    except (TstError, OSError) as e:
+        return FAIL, str(e), time.perf_counter() - start, None
+    status, msg = run_script(script)
+    return status, msg, time.perf_counter() - start, script.deps
+
+
+def run_all(tests, args):
+    """
+    run tests, each after the tests it depends on.
+    returns {test: (status, message, seconds or None if cached)}
+    """
+    deps = dependencies(tests)
+    digest = tools_digest()
+    use_cache = not (args.no_cache or args.write_out)
+    results = {}
+    for test in tests:
+        entry = use_cache and cache.lookup(
+            'tests', cache_key(test, args.gate_level, digest), VERSION)
+        if entry:
+            results[test] = (PASS, entry['msg'], None)
+
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        running = {}
+        while len(results) < len(tests):
+            for test in tests:
+                if test not in results and test not in running.values() \
+                        and all(d in results for d in deps[test]):
+                    future = pool.submit(timed_run, test, args.write_out,
+                                         args.gate_level)
+                    running[future] = test
+            if not running:
+                for test in tests:
+                    results.setdefault(test, (FAIL, 'chip dependency cycle',
+                                              0.0))
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                test = running.pop(future)
+                status, msg, secs, run_deps = future.result()
+                results[test] = (status, msg, secs)
+                if status == PASS and use_cache:
+                    cache.store('tests', cache_key(test, args.gate_level,
+                                                   digest),
+                                VERSION, run_deps, msg=msg)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run nand2tetris tests.')
+    parser.add_argument('paths', nargs='*',
+                        default=[Path(__file__).resolve().parent.parent],
+                        help='.tst files or directories (default: the repo)')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(),
+                        help='number of tests to run in parallel')
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help='show why tests were skipped')
+    parser.add_argument('--write-out', action='store_true',
+                        help='write the .out file of each test (runs every '
+                        'test, cached or not)')
+    parser.add_argument('--gate-level', action='store_true',
+                        help='simulate chips at gate level, without the '
+                        'behavioral models of verified sub-chips, and run '
+                        'chips too large to by default')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='run every test, even those passed before')
+    args = parser.parse_args()
+
+    tests = discover(args.paths)
+    start = time.perf_counter()
+    results = run_all(tests, args)
+    elapsed = time.perf_counter() - start
+
+    counts = {}
+    for tstpath in tests:
+        status, msg, secs = results[tstpath]
+        counts[status] = counts.get(status, 0) + 1
+        print(f'{status} {tstpath} '
+              f'({"cached" if secs is None else f"{secs:.2f}s"})')
+        if status == FAIL or status != PASS and args.verbose:
+            print(f'  {msg}')
+
+    summary = ', '.join(f'{n} {status}'
+                        for status, n in sorted(counts.items()))
+    print(f'{len(tests)} tests in {elapsed:.2f}s: {summary}')
+    if counts.get(FAIL):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
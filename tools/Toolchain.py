@@ -0,0 +1,88 @@
+#!/usr/bin/python3
+"""
+Nand2Tetris toolchain client. Runs a tool in the toolchain daemon (see
+daemon.py), which keeps the tools loaded and their caches warm, so a
+small build costs a few milliseconds past starting this script instead
+of hundreds. Without a daemon the tool runs on its own, as usual.
+
+The client imports nothing of the toolchain: it sends the tool, its
+argv and the working directory over the socket, and writes out the
+tool's stdout and stderr and exits with its status.
+
+input: a tool (HackAssembler, VMTranslator, JackAnalyzer, JackCompiler,
+       tokenizer) and its arguments
+output: the tool's
+
+USAGE:
+./Toolchain.py serve          start the daemon (in the foreground)
+./Toolchain.py stop           stop it
+./Toolchain.py stats          report its cache hits
+./Toolchain.py TOOL [args]    ie: ./Toolchain.py HackAssembler.py a.asm a.hack
+"""
+
+import os
+import sys
+import json
+import socket
+from pathlib import Path
+
+REPO = Path(__file__).resolve().parent.parent
+SOCKET = Path(os.environ.get('TOOLCHAIN_SOCKET',
+                             REPO / '.cache' / 'toolchain.sock'))
+
+# where each tool lives, to run it without a daemon
+TOOLS = {
+    'HackAssembler': REPO / '06' / 'HackAssembler.py',
+    'VMTranslator': REPO / '08' / 'VMTranslator.py',
+    'JackAnalyzer': REPO / '10' / 'JackAnalyzer.py',
+    'JackCompiler': REPO / '10' / 'JackCompiler.py',
+    'tokenizer': REPO / '10' / 'tokenizer.py',
+}
+
+
+def request(message):
+    """send message to the daemon -> its reply, or None if none runs"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(str(SOCKET))
+        except (FileNotFoundError, ConnectionRefusedError):
+            return None
+        sock.sendall(json.dumps(message).encode())
+        sock.shutdown(socket.SHUT_WR)
+        chunks = []
+        while chunk := sock.recv(1 << 16):
+            chunks.append(chunk)
+    return json.loads(b''.join(chunks))
+
+
+def main():
+    if len(sys.argv) < 2:
+        sys.exit(__doc__.split('USAGE:')[1].strip())
+    command, argv = sys.argv[1], sys.argv[2:]
+
+    if command == 'serve':
+        if request({'stats': True}) is not None:
+            sys.exit(f'a daemon is already serving on {SOCKET}')
+        import daemon
+        daemon.serve(SOCKET)
+        return
+    if command in ('stop', 'stats'):
+        reply = request({command: True})
+        if reply is None:
+            sys.exit('no daemon running')
+    else:
+        name = Path(command).stem
+        if name not in TOOLS:
+            sys.exit(f'unknown tool: {command}')
+        reply = request({'tool': command, 'argv': argv, 'cwd': os.getcwd()})
+        if reply is None:
+            tool = str(TOOLS[name])
+            os.execv(sys.executable, [sys.executable, tool, *argv])
+
+    sys.stdout.write(reply['stdout'])
+    sys.stderr.write(reply['stderr'])
+    sys.exit(reply['status'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/python3
+"""
+Nand2Tetris chip verifier. Checks a combinational chip against its
+reference model on every input, or on many random inputs when there are
+too many to try them all. 64 inputs are simulated per machine word (see
+bitslice.py).
+
+input: Chip.hdl
+output: the first input the chip gets wrong, or OK
+
+USAGE:
+./VerifyChip.py [-n VECTORS] [--seed SEED] [--batch SIZE] Chip.hdl
+"""
+
+import sys
+import time
+import argparse
+import numpy as np
+from hdl import load_chip, flatten, HdlError
+from bitslice import BitSliceSimulator
+from reference import MODELS
+
+# chips with at most this many input bits are checked exhaustively
+MAX_EXHAUSTIVE_BITS = 24
+
+
+def vectors(inputs, start, n, rng):
+    """
+    {pin: n ints}: inputs start..start+n of the exhaustive enumeration
+    (pins concatenated in order), or n random inputs if rng is given
+    """
+    if rng is not None:
+        return {pin: rng.integers(0, 1 << width, n, dtype=np.uint64)
+                for pin, width in inputs.items()}
+    index = np.arange(start, start + n, dtype=np.uint64)
+    result = {}
+    for pin, width in inputs.items():
+        result[pin] = index & np.uint64((1 << width) - 1)
+        index = index >> np.uint64(width)
+    return result
+
+
+def verify(netlist, model, total, batch, rng):
+    """
+    returns: None, or (inputs, expected, actual) of the first mismatch
+    """
+    sim = BitSliceSimulator(netlist)
+    inputs = {pin: len(nets) for pin, nets in netlist.inputs.items()}
+    for start in range(0, total, batch):
+        n = min(batch, total - start)
+        vecs = vectors(inputs, start, n, rng)
+        actual = sim.evaluate(vecs, n)
+        expected = model(vecs)
+        for pin in netlist.outputs:
+            bad = np.flatnonzero(actual[pin] != expected[pin])
+            if len(bad):
+                i = bad[0]
+                return ({p: int(v[i]) for p, v in vecs.items()},
+                        {p: int(v[i]) for p, v in expected.items()},
+                        {p: int(v[i]) for p, v in actual.items()})
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Verify a chip against its reference model.')
+    parser.add_argument('hdl', help='the .hdl file of the chip')
+    parser.add_argument('-n', '--vectors', type=int, default=1 << 20,
+                        help='random vectors to try when the chip has too '
+                        'many inputs to try them all')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--batch', type=int, default=1 << 16,
+                        help='vectors simulated per sweep')
+    args = parser.parse_args()
+
+    try:
+        chip, library = load_chip(args.hdl)
+        if chip.name not in MODELS:
+            sys.exit(f'no reference model for {chip.name}')
+        netlist = flatten(chip, library)
+        bits = sum(chip.inputs.values())
+        if bits <= MAX_EXHAUSTIVE_BITS:
+            total, rng, how = 1 << bits, None, 'all'
+        else:
+            total, rng = args.vectors, np.random.default_rng(args.seed)
+            how = 'random'
+        start = time.perf_counter()
+        failure = verify(netlist, MODELS[chip.name], total, args.batch, rng)
+        elapsed = time.perf_counter() - start
+    except HdlError as e:
+        sys.exit(str(e))
+
+    if failure:
+        inputs, expected, actual = failure
+        print(f'FAIL {chip.name}: inputs {inputs}')
+        print(f'  expected: {expected}')
+        print(f'  actual:   {actual}')
+        sys.exit(1)
+    print(f'OK {chip.name}: {total} {how} vectors, {len(netlist.nands)} '
+          f'Nands, in {elapsed:.2f}s ({total / elapsed:.0f} vectors/s)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""
+Lockstep batch emulation of many Hack computers with NumPy.
+
+Every machine runs the same ROM against its own RAM and registers:
+    ram:      N x 32K words
+    a, d, pc: N words each
+
+On each cycle the machines are grouped by PC. Each group executes its
+instruction with vectorized ALU operations over just the machines in
+that group. Machines running the same program on different inputs
+rarely diverge by more than a few PCs, so a cycle costs a handful of
+array operations no matter how large the batch is.
+
+    batch = BatchComputer(load_rom('Max.hack'), 1000)
+    batch.ram[:, 0] = xs
+    batch.ram[:, 1] = ys
+    batch.run(20)
+    batch.ram[:, 2]  # max(xs, ys)
+"""
+
+import numpy as np
+from emulator import (
+    ROM_SIZE, RAM_SIZE, ADDR, NEG, DEST_A, DEST_D, DEST_M, EmulatorError,
+    decode
+)
+
+
+def alu(x, y, c):
+    """The Hack ALU over uint16 arrays. c: zx nx zy ny f no"""
+    if c & 0b100000:
+        x = np.zeros_like(x)
+    if c & 0b010000:
+        x = ~x
+    if c & 0b001000:
+        y = np.zeros_like(y)
+    if c & 0b000100:
+        y = ~y
+    out = x + y if c & 0b000010 else x & y
+    if c & 0b000001:
+        out = ~out
+    return out
+
+
+def jumps(value, jmp):
+    """boolean array: which machines jump on their value"""
+    signed = value.view(np.int16)
+    cond = np.zeros(value.shape, dtype=bool)
+    if jmp & 0b001:
+        cond |= signed > 0
+    if jmp & 0b010:
+        cond |= signed == 0
+    if jmp & 0b100:
+        cond |= signed < 0
+    return cond
+
+
+class BatchComputer:
+    """
+    n Hack computers running rom in lockstep.
+    """
+    def __init__(self, rom, n):
+        if len(rom) > ROM_SIZE:
+            raise EmulatorError(f'program too large: {len(rom)} words')
+        self.n = n
+        self.rom = list(rom) + [0] * (ROM_SIZE - len(rom))
+        self.ram = np.zeros((n, RAM_SIZE), dtype=np.uint16)
+        self.a = np.zeros(n, dtype=np.uint16)
+        self.d = np.zeros(n, dtype=np.uint16)
+        self.pc = np.zeros(n, dtype=np.int64)
+        self.time = 0
+        self.rows = np.arange(n)
+
+    def reset(self):
+        """restart every machine. RAM is left as is"""
+        self.pc[:] = 0
+
+    def execute(self, instr, rows):
+        """
+        execute instr on the machines in rows.
+
+        rows: an index array, or self.rows when every machine is at the
+        same pc.
+        """
+        if not instr & NEG:
+            self.a[rows] = instr
+            self.pc[rows] = (self.pc[rows] + 1) & ADDR
+            return
+
+        abit, comp, dest, jmp = decode(instr)
+        a = self.a[rows]
+        addr = a & ADDR
+        y = self.ram[rows, addr] if abit else a
+        value = alu(self.d[rows], y, comp)
+
+        if dest & DEST_M:
+            self.ram[rows, addr] = value
+        if dest & DEST_D:
+            self.d[rows] = value
+        if dest & DEST_A:
+            self.a[rows] = value
+
+        pc = self.pc[rows] + 1
+        if jmp:
+            # jump to A as it was before this instruction wrote it
+            pc = np.where(jumps(value, jmp), addr, pc)
+        self.pc[rows] = pc & ADDR
+
+    def step(self):
+        """execute one instruction on every machine"""
+        pc = self.pc
+        first = pc[0]
+        if (pc == first).all():
+            self.execute(self.rom[first], self.rows)
+        else:
+            # diverged: run each pc group on its own masked subset
+            order = np.argsort(pc, kind='stable')
+            pcs, starts = np.unique(pc[order], return_index=True)
+            for group, rows in zip(pcs, np.split(order, starts[1:])):
+                self.execute(self.rom[group], rows)
+        self.time += 1
+
+    def run(self, cycles):
+        """execute cycles instructions on every machine"""
+        for _ in range(cycles):
+            self.step()
@@ -0,0 +1,65 @@
+"""
+Bit-sliced evaluation of combinational chips.
+
+Each net holds an array of uint64 words instead of a single bit: bit j of
+word i is the net's value in test vector 64 * i + j. One sweep over the
+netlist then evaluates every vector at once, and the Nands of a level
+are evaluated together as one NumPy operation.
+"""
+
+import numpy as np
+from hdl import HdlError, TRUE
+
+ONES = np.uint64(0xFFFFFFFFFFFFFFFF)
+
+
+def pack(values, width):
+    """
+    n ints -> width rows of uint64 words, one row per bit of the values
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    nwords = (len(values) + 63) // 64
+    rows = np.zeros((width, nwords * 64), dtype=np.uint8)
+    for i in range(width):
+        rows[i, :len(values)] = (values >> np.uint64(i)) & np.uint64(1)
+    return np.packbits(rows, axis=1, bitorder='little').view(np.uint64)
+
+
+def unpack(rows, n):
+    """width rows of uint64 words -> n ints"""
+    bits = np.unpackbits(rows.view(np.uint8), axis=1, bitorder='little')
+    values = np.zeros(n, dtype=np.uint64)
+    for i in range(len(rows)):
+        values |= bits[i, :n].astype(np.uint64) << np.uint64(i)
+    return values
+
+
+class BitSliceSimulator:
+    """
+    Evaluates a combinational Netlist on many input vectors at once.
+    """
+    def __init__(self, netlist):
+        if netlist.dffs or netlist.builtins:
+            raise HdlError(f'{netlist.name} is not combinational', 0)
+        self.netlist = netlist
+        nands = np.array(netlist.nands, dtype=np.int64).reshape(-1, 3)
+        # the nands are sorted by level: split them where the level changes
+        cuts = np.flatnonzero(np.diff(netlist.levels)) + 1
+        self.levels = [(g[:, 0], g[:, 1], g[:, 2])
+                       for g in np.split(nands, cuts) if len(g)]
+
+    def evaluate(self, inputs, n):
+        """
+        inputs: {pin: n ints}
+        returns: {output pin: n ints}
+        """
+        netlist = self.netlist
+        nwords = (n + 63) // 64
+        v = np.zeros((netlist.nnets, nwords), dtype=np.uint64)
+        v[TRUE] = ONES
+        for pin, nets in netlist.inputs.items():
+            v[nets] = pack(inputs[pin], len(nets))
+        for a, b, o in self.levels:
+            v[o] = ~(v[a] & v[b])
+        return {pin: unpack(v[nets], n)
+                for pin, nets in netlist.outputs.items()}
@@ -0,0 +1,247 @@
+"""
+Builtin chips: the chips the course supplies as Java classes rather than
+HDL. They are simulated behaviourally, on the same nets as the gates.
+
+A builtin has:
+    IN, OUT: {pin: width}
+    COMB: the input pins its outputs follow combinationally (a memory's
+          address). Everything else only matters on the clock.
+    pins: {pin: [net per bit]}, filled in by the flattener
+
+    evaluate(values): write the outputs into the net values
+    tick(values): sample the inputs (the clock rises)
+    tock(): commit the sampled state (the clock falls)
+    get(index), set(index, value): state, for test scripts (Name[index])
+"""
+
+from emulator import load_rom
+
+
+def read_bus(values, nets):
+    """net values -> int. nets are least significant bit first"""
+    value = 0
+    for i, n in enumerate(nets):
+        value |= values[n] << i
+    return value
+
+
+def write_bus(values, nets, value):
+    for i, n in enumerate(nets):
+        values[n] = (value >> i) & 1
+
+
+class Builtin:
+    IN = {}
+    OUT = {}
+    COMB = ()
+
+    def __init__(self, pins):
+        self.pins = pins
+
+    @property
+    def name(self):
+        return type(self).__name__
+
+    def evaluate(self, values):
+        pass
+
+    def tick(self, values):
+        pass
+
+    def tock(self):
+        pass
+
+
+class Register(Builtin):
+    """16-bit register: if load(t) then out(t+1) = in(t)"""
+    IN = {'in': 16, 'load': 1}
+    OUT = {'out': 16}
+
+    def __init__(self, pins):
+        super().__init__(pins)
+        self.value = self.next = 0
+
+    def evaluate(self, values):
+        write_bus(values, self.pins['out'], self.value)
+
+    def tick(self, values):
+        pins = self.pins
+        if values[pins['load'][0]]:
+            self.next = read_bus(values, pins['in'])
+        else:
+            self.next = self.value
+
+    def tock(self):
+        self.value = self.next
+
+    def get(self, index):
+        # the state shown between tick and tock is the sampled input,
+        # as in the course's simulator
+        return self.next
+
+    def set(self, index, value):
+        self.value = self.next = value
+
+
+class ARegister(Register):
+    pass
+
+
+class DRegister(Register):
+    pass
+
+
+class Memory(Builtin):
+    """
+    RAM of SIZE words:
+        out(t) = mem[address(t)]
+        if load(t) then mem[address(t)](t+1) = in(t)
+    """
+    SIZE = 0
+    COMB = ('address',)
+
+    def __init__(self, pins):
+        super().__init__(pins)
+        self.mem = [0] * self.SIZE
+        self.pending = None
+
+    def evaluate(self, values):
+        address = read_bus(values, self.pins['address'])
+        write_bus(values, self.pins['out'], self.mem[address])
+
+    def tick(self, values):
+        pins = self.pins
+        self.pending = None
+        if values[pins['load'][0]]:
+            self.pending = (read_bus(values, pins['address']),
+                            read_bus(values, pins['in']))
+
+    def tock(self):
+        if self.pending:
+            address, value = self.pending
+            self.mem[address] = value
+            self.pending = None
+
+    def get(self, index):
+        return self.mem[index]
+
+    def set(self, index, value):
+        self.mem[index] = value
+
+
+class Screen(Memory):
+    """the 8K screen memory map"""
+    IN = {'in': 16, 'load': 1, 'address': 13}
+    OUT = {'out': 16}
+    SIZE = 8192
+
+
+class ROM32K(Memory):
+    """program memory. Loaded by test scripts: ROM32K load Prog.hack"""
+    IN = {'address': 15}
+    OUT = {'out': 16}
+    SIZE = 32768
+
+    def tick(self, values):
+        pass
+
+    def load(self, fname):
+        rom = load_rom(fname)
+        self.mem = rom + [0] * (self.SIZE - len(rom))
+
+
+class Keyboard(Builtin):
+    """the keyboard memory map: the code of the key held down"""
+    OUT = {'out': 16}
+
+    def __init__(self, pins):
+        super().__init__(pins)
+        self.key = 0
+
+    def evaluate(self, values):
+        write_bus(values, self.pins['out'], self.key)
+
+    def get(self, index):
+        return self.key
+
+    def set(self, index, value):
+        self.key = value
+
+
+BUILTINS = {
+    cls.__name__: cls
+    for cls in (ARegister, DRegister, Screen, ROM32K, Keyboard)
+}
+
+
+# Behavioral models of the course's own chips. Once a chip passes its
+# test script, the chips built from it may use its model instead of its
+# gates (see tst.verified).
+
+class Bit(Register):
+    """1-bit register"""
+    IN = {'in': 1, 'load': 1}
+    OUT = {'out': 1}
+
+
+class PC(Register):
+    """
+    program counter:
+        if reset(t) out(t+1) = 0
+        else if load(t) out(t+1) = in(t)
+        else if inc(t) out(t+1) = out(t) + 1
+        else out(t+1) = out(t)
+    """
+    IN = {'in': 16, 'load': 1, 'inc': 1, 'reset': 1}
+
+    def tick(self, values):
+        pins = self.pins
+        if values[pins['reset'][0]]:
+            self.next = 0
+        elif values[pins['load'][0]]:
+            self.next = read_bus(values, pins['in'])
+        elif values[pins['inc'][0]]:
+            self.next = (self.value + 1) & 0xFFFF
+        else:
+            self.next = self.value
+
+
+class RAM8(Memory):
+    IN = {'in': 16, 'load': 1, 'address': 3}
+    OUT = {'out': 16}
+    SIZE = 8
+
+
+class RAM64(Memory):
+    IN = {'in': 16, 'load': 1, 'address': 6}
+    OUT = {'out': 16}
+    SIZE = 64
+
+
+class RAM512(Memory):
+    IN = {'in': 16, 'load': 1, 'address': 9}
+    OUT = {'out': 16}
+    SIZE = 512
+
+
+class RAM4K(Memory):
+    IN = {'in': 16, 'load': 1, 'address': 12}
+    OUT = {'out': 16}
+    SIZE = 4096
+
+
+class RAM16K(Memory):
+    IN = {'in': 16, 'load': 1, 'address': 14}
+    OUT = {'out': 16}
+    SIZE = 16384
+
+
+BEHAVIORAL = {
+    cls.__name__: cls
+    for cls in (Bit, Register, PC, RAM8, RAM64, RAM512, RAM4K, RAM16K)
+}
+
+
+def builtin_class(name):
+    """the class simulating a builtin chip or behavioral model"""
+    return BUILTINS.get(name) or BEHAVIORAL[name]
@@ -0,0 +1,102 @@
+"""
+On-disk cache for the tools, in .cache at the top of the repo.
+
+An entry records the files it was computed from and their hashes
+('deps'); it is only returned while all of them are unchanged.
+Entries are written atomically, so processes may share the cache.
+Using an entry marks it recently used: evict() drops the least recently
+used entries of a kind beyond a size.
+
+A long-running process (see daemon.py) sets memory to an OrderedDict,
+and entries are kept in it too, so a hit costs no unpickling.
+"""
+
+import os
+import sys
+import pickle
+import hashlib
+from pathlib import Path
+
+REPO = Path(__file__).resolve().parent.parent
+CACHE_DIR = REPO / '.cache'
+
+# None, or the entries in memory by (kind, key), least recently used first
+memory = None
+MEMORY_ENTRIES = 4096
+
+
+def file_hash(fname):
+    with open(fname, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def deps_hashes(fnames):
+    """fnames -> {absolute fname: hash}"""
+    return {str(Path(fname).resolve()): file_hash(fname) for fname in fnames}
+
+
+def entry_path(kind, key):
+    key = f'{key}:{sys.implementation.cache_tag}'
+    return CACHE_DIR / kind / (hashlib.sha256(key.encode()).hexdigest() +
+                               '.pickle')
+
+
+def remember(kind, key, entry):
+    if memory is not None:
+        memory[kind, key] = entry
+        memory.move_to_end((kind, key))
+        if len(memory) > MEMORY_ENTRIES:
+            memory.popitem(last=False)
+
+
+def lookup(kind, key, version):
+    """the entry stored under kind/key, or None if missing or stale"""
+    entry = memory.get((kind, key)) if memory is not None else None
+    try:
+        if entry is None:
+            with open(entry_path(kind, key), 'rb') as f:
+                entry = pickle.load(f)
+            os.utime(entry_path(kind, key))
+        if entry['version'] != version:
+            return None
+        for fname, digest in entry['deps'].items():
+            if file_hash(fname) != digest:
+                return None
+    except (OSError, pickle.PickleError, EOFError, KeyError):
+        return None
+    remember(kind, key, entry)
+    return entry
+
+
+def store(kind, key, version, deps, **entry):
+    """store entry under kind/key. deps: {fname: hash} it depends on"""
+    path = entry_path(kind, key)
+    entry = {'version': version, 'deps': deps, **entry}
+    remember(kind, key, entry)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f'.{os.getpid()}.tmp')
+        with open(tmp, 'wb') as f:
+            pickle.dump(entry, f, pickle.HIGHEST_PROTOCOL)
+        tmp.replace(path)
+    except OSError:
+        pass  # a read-only tree still runs, just uncached
+
+
+def evict(kind, max_bytes):
+    """drop the least recently used entries of kind beyond max_bytes"""
+    try:
+        entries = [(st.st_mtime, st.st_size, path)
+                   for path in (CACHE_DIR / kind).glob('*.pickle')
+                   for st in [path.stat()]]
+    except OSError:
+        return
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            path.unlink()
+        except OSError:
+            pass
+        total -= size
@@ -0,0 +1,160 @@
+"""
+Compiles a flattened chip into a straight-line Python function.
+
+The generated evaluate(v, b) does the work of one Simulator.evaluate
+sweep with one assignment per gate and no per-gate dispatch:
+
+    def evaluate(v, b):
+        x2 = v[2]
+        x3 = v[3]
+        x7 = 1 ^ (x2 & x3)
+        ...
+        v[5] = x7
+
+Gates with constant inputs are folded away, and gates computing the
+same function of the same nets are computed once.
+
+Compiled chips are cached on disk (see cache.py), keyed by the files
+they were built from and by the source of the tools that built them, so
+a cached chip is loaded without parsing or flattening.
+"""
+
+import hashlib
+import marshal
+from pathlib import Path
+import cache
+from hdl import FALSE, TRUE
+from simulator import Simulator
+
+# bump when the generated code or the cached netlist changes
+VERSION = 2
+
+HERE = Path(__file__).resolve().parent
+
+# the source of the modules that parse, flatten, optimize and compile a
+# chip: cached chips are only valid for the code that built them
+COMPILER = hashlib.sha256(''.join(
+    cache.file_hash(HERE / module) for module in (
+        'chip_compiler.py', 'optimize.py', 'hdl.py', 'builtin_chips.py')
+).encode()).hexdigest()
+
+
+class CodeGen:
+    """
+    Generates the evaluate function of a levelized Netlist.
+
+    expr[net] is what the generated code reads for net: 0, 1 or the
+    name of a local holding it.
+    """
+    def __init__(self, netlist):
+        self.netlist = netlist
+        self.lines = []
+        self.expr = {FALSE: 0, TRUE: 1}
+        self.common = {}  # (op, operands) -> local name
+
+    def read(self, net):
+        """the expression of net, loading it from v on first use"""
+        if net not in self.expr:
+            self.expr[net] = f'x{net}'
+            self.lines.append(f'x{net} = v[{net}]')
+        return self.expr[net]
+
+    def assign(self, net, key, code):
+        """net = code, unless an equal gate was already computed"""
+        if key in self.common:
+            self.expr[net] = self.common[key]
+            return
+        self.expr[net] = self.common[key] = f'x{net}'
+        self.lines.append(f'x{net} = {code}')
+
+    def nand(self, a, b, o):
+        ea, eb = self.read(a), self.read(b)
+        if ea == 0 or eb == 0:
+            self.expr[o] = 1
+        elif ea == 1 and eb == 1:
+            self.expr[o] = 0
+        elif ea == 1 or eb == 1 or ea == eb:
+            e = eb if ea == 1 else ea
+            self.assign(o, ('not', e), f'1 ^ {e}')
+        else:
+            ea, eb = sorted((ea, eb))
+            self.assign(o, ('nand', ea, eb), f'1 ^ ({ea} & {eb})')
+
+    def store(self, nets):
+        for n in nets:
+            self.lines.append(f'v[{n}] = {self.read(n)}')
+
+    def generate(self):
+        netlist = self.netlist
+        for nands, builtin in netlist.order:
+            for a, b, o in nands:
+                self.nand(a, b, o)
+            if builtin:
+                self.store(n for pin in builtin.COMB
+                           for n in builtin.pins[pin])
+                i = netlist.builtins.index(builtin)
+                self.lines.append(f'b[{i}].evaluate(v)')
+
+        # the nets read from outside: pins, clocked inputs, probes
+        stored = set()
+        for nets in [*netlist.outputs.values(), *netlist.probes.values(),
+                     [d for d, _ in netlist.dffs],
+                     *(nets for builtin in netlist.builtins
+                       for nets in builtin.pins.values())]:
+            for n in nets:
+                if n not in stored and n > TRUE:
+                    stored.add(n)
+                    self.store([n])
+
+        body = '\n'.join('    ' + line for line in self.lines) or '    pass'
+        return f'def evaluate(v, b):\n{body}\n'
+
+
+def compile_netlist(netlist):
+    """Netlist -> code object defining evaluate"""
+    return compile(CodeGen(netlist).generate(),
+                   f'<chip {netlist.name}>', 'exec')
+
+
+class CompiledSimulator(Simulator):
+    """
+    A Simulator whose evaluate sweep is the chip's generated function.
+    """
+    def __init__(self, netlist, code):
+        namespace = {}
+        exec(code, namespace)
+        self.compiled = namespace['evaluate']
+        super().__init__(netlist)
+
+    def evaluate(self):
+        self.compiled(self.values, self.netlist.builtins)
+
+
+def chip_key(hdlpath, mode):
+    return f'{Path(hdlpath).resolve()}:{mode}:{COMPILER}'
+
+
+def cached_chip(hdlpath, mode):
+    """
+    (netlist, code, deps) of hdlpath from the cache, or None if it is not
+    cached or any file it was built from has changed
+
+    mode: how the chip was flattened, ie: 'gates' or 'behavioral'
+    """
+    entry = cache.lookup('chips', chip_key(hdlpath, mode), VERSION)
+    if entry is None:
+        return None
+    return entry['netlist'], marshal.loads(entry['code']), entry['deps']
+
+
+def compile_chip(hdlpath, mode, netlist, deps):
+    """
+    compile netlist, flattened from hdlpath, and cache it.
+
+    deps: {fname: hash} of every file the netlist was built from
+    returns (netlist, code, deps)
+    """
+    code = compile_netlist(netlist)
+    cache.store('chips', chip_key(hdlpath, mode), VERSION, deps,
+                netlist=netlist, code=marshal.dumps(code))
+    return netlist, code, deps
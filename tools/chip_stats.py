@@ -0,0 +1,221 @@
+"""
+Cost analysis of chips: Nand and DFF counts, logic depth and fan-out,
+computed from each chip's parts without flattening it.
+
+Every chip type is analyzed once, into a summary of what it looks like
+from outside: its gate counts, the delay from each input bit to each
+output bit, and the load each input bit puts on whatever drives it. A
+parent chip is analyzed from the summaries of its parts, so RAM16K
+costs about as much to analyze as RAM8.
+
+Delays are in Nand gates. A DFF or builtin cuts a path: its output is
+a state source with delay 0, and paths into its inputs end at state.
+"""
+
+from collections import Counter
+from hdl import ChipFlattener, ChipDef, PRIMITIVES, FALSE, TRUE
+from builtin_chips import builtin_class
+
+# hot spots reported per chip
+HOTSPOTS = 5
+
+
+class ChipStats:
+    """
+    A chip's analysis. Bits are (pin, index) pairs.
+
+    delay: {out bit: {in bit: longest path in gates}}
+    from_state: {out bit: longest path from a DFF/builtin output}
+    to_state: {in bit: longest path to a DFF/builtin input}
+    internal: longest path from state to state inside the chip, or -1
+    load: {in bit: number of gate inputs it drives, once flattened}
+    hotspots: [(signal, fan-out)] of the chip's own signals
+    """
+    def __init__(self, name, inputs, outputs):
+        self.name = name
+        self.inputs = inputs
+        self.outputs = outputs
+        self.nands = 0
+        self.dffs = 0
+        self.builtins = Counter()
+        self.delay = {}
+        self.from_state = {}
+        self.to_state = {}
+        self.internal = -1
+        self.load = {}
+        self.hotspots = []
+
+    def depth(self):
+        """the critical path of the chip, in gates"""
+        return max([self.internal, *self.from_state.values(),
+                    *self.to_state.values(),
+                    *(d for ins in self.delay.values() for d in ins.values())],
+                   default=0)
+
+    def to_json(self):
+        return {
+            'nands': self.nands,
+            'dffs': self.dffs,
+            'builtins': dict(self.builtins),
+            'depth': self.depth(),
+            'hotspots': [{'signal': s, 'fanout': n}
+                         for s, n in self.hotspots],
+        }
+
+
+def bits(pins):
+    return [(pin, i) for pin, width in pins.items() for i in range(width)]
+
+
+class WiringFlattener(ChipFlattener):
+    """
+    Resolves a chip's wiring like ChipFlattener, but gives each part
+    only its pins, not its gates. instances: [(ChipStats, {pin: nets})]
+    """
+    def __init__(self, analyzer, chip):
+        super().__init__(analyzer, chip)
+        self.instances = []
+        self.internal = {}
+
+    def internal_signals(self):
+        self.internal = super().internal_signals()
+        return self.internal
+
+    def stamp(self, sub):
+        subpins = {pin: self.new(width)
+                   for pin, width in {**sub.inputs, **sub.outputs}.items()}
+        self.instances.append((sub, subpins))
+        return subpins
+
+    def number(self, pins):
+        return pins
+
+
+class Analyzer:
+    """
+    Analyzes chips by name, memoized per chip type.
+    """
+    def __init__(self, library):
+        self.library = library
+        self.stats = {}
+
+    def template(self, name, lineno=0, fname=None):
+        """chip name -> ChipStats (named for WiringFlattener)"""
+        if name not in self.stats:
+            chip = self.library.get(name, lineno, fname)
+            if isinstance(chip, ChipDef):
+                self.stats[name] = self.composite(chip)
+            else:
+                self.stats[name] = self.primitive(chip)
+        return self.stats[name]
+
+    def primitive(self, name):
+        inputs, outputs = self.library.interface(name)
+        stats = ChipStats(name, inputs, outputs)
+        stats.load = {bit: 1 for bit in bits(inputs)}
+        if name == 'Nand':
+            stats.nands = 1
+            stats.delay = {('out', 0): {('a', 0): 1, ('b', 0): 1}}
+            return stats
+        if name == 'DFF':
+            stats.dffs = 1
+        else:
+            stats.builtins[name] = 1
+        comb = () if name in PRIMITIVES else builtin_class(name).COMB
+        stats.to_state = {bit: 0 for bit in bits(inputs)
+                          if bit[0] not in comb}
+        stats.from_state = {bit: 0 for bit in bits(outputs)}
+        stats.delay = {out: {bit: 0 for bit in bits(inputs)
+                             if bit[0] in comb}
+                       for out in bits(outputs)}
+        return stats
+
+    def composite(self, chip):
+        wiring = WiringFlattener(self, chip)
+        pins = wiring.flatten()
+        find = wiring.find
+        stats = ChipStats(chip.name, chip.inputs, chip.outputs)
+
+        # the graph of delays between nets, through the parts. State
+        # outputs and inputs are two extra nodes
+        STATE_OUT, STATE_IN = -1, -2
+        edges = {}  # net -> {net: weight}
+        fanout = Counter()
+
+        def edge(a, b, weight):
+            if FALSE <= a <= TRUE:
+                return  # constants are not on any path
+            targets = edges.setdefault(a, {})
+            targets[b] = max(targets.get(b, -1), weight)
+
+        for sub, subpins in wiring.instances:
+            stats.nands += sub.nands
+            stats.dffs += sub.dffs
+            stats.builtins += sub.builtins
+            stats.internal = max(stats.internal, sub.internal)
+            for (pin, i), n in sub.load.items():
+                fanout[find(subpins[pin][i])] += n
+            for (opin, oi), ins in sub.delay.items():
+                for (ipin, ii), d in ins.items():
+                    edge(find(subpins[ipin][ii]), find(subpins[opin][oi]), d)
+            for (opin, oi), d in sub.from_state.items():
+                edge(STATE_OUT, find(subpins[opin][oi]), d)
+            for (ipin, ii), d in sub.to_state.items():
+                edge(find(subpins[ipin][ii]), STATE_IN, d)
+
+        order = topological(edges)
+        for bit in bits(chip.inputs):
+            dist = longest(edges, order, find(pins[bit[0]][bit[1]]))
+            for out in bits(chip.outputs):
+                net = find(pins[out[0]][out[1]])
+                if net in dist:
+                    stats.delay.setdefault(out, {})[bit] = dist[net]
+            if STATE_IN in dist:
+                stats.to_state[bit] = dist[STATE_IN]
+            stats.load[bit] = fanout[find(pins[bit[0]][bit[1]])]
+
+        dist = longest(edges, order, STATE_OUT)
+        for out in bits(chip.outputs):
+            net = find(pins[out[0]][out[1]])
+            if net in dist:
+                stats.from_state[out] = dist[net]
+        stats.internal = max(stats.internal, dist.get(STATE_IN, -1))
+
+        signals = {**pins, **wiring.internal}
+        named = [(signal if len(nets) == 1 else f'{signal}[{i}]',
+                  fanout[find(n)])
+                 for signal, nets in signals.items()
+                 for i, n in enumerate(nets)]
+        named.sort(key=lambda s: -s[1])
+        stats.hotspots = [s for s in named[:HOTSPOTS] if s[1]]
+        return stats
+
+
+def topological(edges):
+    """the nodes of the graph edges in topological order"""
+    indegree = Counter()
+    for targets in edges.values():
+        for b in targets:
+            indegree[b] += 1
+    ready = [n for n in edges if not indegree[n]]
+    order = []
+    while ready:
+        n = ready.pop()
+        order.append(n)
+        for b in edges.get(n, ()):
+            indegree[b] -= 1
+            if not indegree[b]:
+                ready.append(b)
+    return order
+
+
+def longest(edges, order, source):
+    """{node: longest path from source} over the DAG edges"""
+    dist = {source: 0}
+    for n in order:
+        if n not in dist:
+            continue
+        for b, weight in edges.get(n, {}).items():
+            if dist[n] + weight > dist.get(b, -1):
+                dist[b] = dist[n] + weight
+    return dist
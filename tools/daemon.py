@@ -0,0 +1,198 @@
+"""
+The toolchain daemon: the assembler, VM translator, Jack analyzer and
+tokenizer (and compiler), loaded once and kept running, serving builds
+over a Unix socket (see Toolchain.py for the client).
+
+A build request is the tool's argv and the client's working directory.
+The tool's main() runs in the daemon as it would on its own: its stdout
+and stderr are captured and sent back with its exit status. Requests
+are served one at a time, since a tool's run owns the process's working
+directory, argv and streams.
+
+Past the modules, tables and compiled regexes staying loaded, the
+daemon keeps warm caches of what the tools compute, by the hash of the
+source file:
+    parsed:     the Jack parse trees and signatures in tools/cache.py,
+                held in memory as well as on disk
+    translated: the hack assembly of each .vm file, and the translator
+                state it leaves (label and return counters)
+    assembled:  the binary of each .asm file
+Each is dropped least recently used first beyond MEMO_ENTRIES.
+
+The tools keep state in module globals; it is reset before each run, so
+a build's output is the same as the tool's run on its own.
+"""
+
+import io
+import os
+import sys
+import json
+import traceback
+import socketserver
+from pathlib import Path
+from collections import OrderedDict
+from contextlib import redirect_stdout, redirect_stderr
+import cache
+
+REPO = Path(__file__).resolve().parent.parent
+SOCKET = REPO / '.cache' / 'toolchain.sock'
+
+for week in ('06', '08', '10'):
+    sys.path.insert(0, str(REPO / week))
+import HackAssembler  # noqa: E402
+import VMTranslator  # noqa: E402
+import JackAnalyzer  # noqa: E402
+import JackCompiler  # noqa: E402
+import tokenizer  # noqa: E402
+
+# tool name -> (module, the errors its __main__ reports as Error: ...)
+TOOLS = {
+    'HackAssembler': (HackAssembler, (HackAssembler.AssemblyError,)),
+    'VMTranslator': (VMTranslator, ()),
+    'JackAnalyzer': (JackAnalyzer, ()),
+    'JackCompiler': (JackCompiler, ()),
+    'tokenizer': (tokenizer, (tokenizer.JackError,)),
+}
+
+MEMO_ENTRIES = 1024
+
+VM_STATE = dict(VMTranslator.state)
+
+
+class Memo:
+    """results by key, the least recently used dropped beyond size"""
+    def __init__(self, size=MEMO_ENTRIES):
+        self.size = size
+        self.results = OrderedDict()
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        result = self.results.get(key)
+        if result is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.results.move_to_end(key)
+        return result
+
+    def put(self, key, result):
+        self.results[key] = result
+        if len(self.results) > self.size:
+            self.results.popitem(last=False)
+
+
+translated = Memo()
+assembled = Memo()
+
+translate_file = VMTranslator.translate_file
+assemble = HackAssembler.assemble
+
+
+def warm_translate_file(vmfile):
+    """VMTranslator.translate_file, by the file's hash and the state"""
+    state = VMTranslator.state
+    key = (cache.file_hash(vmfile), vmfile.stem,
+           tuple(sorted(state.items())))
+    result = translated.get(key)
+    if result is None:
+        asm = translate_file(vmfile)
+        result = (asm, dict(state))
+        translated.put(key, result)
+    state.update(result[1])
+    return result[0]
+
+
+def warm_assemble(asmfname):
+    """HackAssembler.assemble, by the file's hash"""
+    key = cache.file_hash(asmfname)
+    words = assembled.get(key)
+    if words is None:
+        words = list(assemble(asmfname))
+        assembled.put(key, words)
+    return iter(words)
+
+
+def reset():
+    """the tools' module globals, as a fresh process has them"""
+    VMTranslator.state.clear()
+    VMTranslator.state.update(VM_STATE)
+    JackAnalyzer.trees.clear()
+    JackAnalyzer.classes = {}
+
+
+def run(tool, argv, cwd):
+    """run a tool's main() -> (stdout, stderr, exit status)"""
+    name = Path(tool).stem
+    if name not in TOOLS:
+        return '', f'unknown tool: {tool}\n', 2
+    module, errors = TOOLS[name]
+    out, err = io.StringIO(), io.StringIO()
+    status = 0
+    saved_argv, saved_cwd = sys.argv, os.getcwd()
+    reset()
+    try:
+        sys.argv = [tool, *argv]
+        os.chdir(cwd)
+        with redirect_stdout(out), redirect_stderr(err):
+            try:
+                module.main()
+            except errors as e:
+                sys.exit(e)
+    except SystemExit as e:
+        # as the interpreter reports it
+        if e.code is None:
+            status = 0
+        elif isinstance(e.code, int):
+            status = e.code
+        else:
+            print(e.code, file=err)
+            status = 1
+    except Exception:
+        err.write(traceback.format_exc())
+        status = 1
+    finally:
+        sys.argv = saved_argv
+        os.chdir(saved_cwd)
+    return out.getvalue(), err.getvalue(), status
+
+
+class Handler(socketserver.StreamRequestHandler):
+    """one request: a JSON object, answered with one"""
+    def handle(self):
+        request = json.loads(self.rfile.read())
+        if request.get('stop'):
+            reply = {'stdout': '', 'stderr': '', 'status': 0}
+            self.server.stopping = True
+        elif request.get('stats'):
+            stats = (f'translated: {translated.hits} hits, '
+                     f'{translated.misses} misses\n'
+                     f'assembled: {assembled.hits} hits, '
+                     f'{assembled.misses} misses\n'
+                     f'parsed: {len(cache.memory)} entries in memory\n')
+            reply = {'stdout': stats, 'stderr': '', 'status': 0}
+        else:
+            stdout, stderr, status = run(request['tool'], request['argv'],
+                                         request['cwd'])
+            reply = {'stdout': stdout, 'stderr': stderr, 'status': status}
+        self.wfile.write(json.dumps(reply).encode())
+
+
+class Server(socketserver.UnixStreamServer):
+    stopping = False
+
+
+def serve(path=SOCKET):
+    """serve builds on the Unix socket at path until asked to stop"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if path.exists():
+        path.unlink()  # left by a daemon that died; Toolchain.py checks
+    VMTranslator.translate_file = warm_translate_file
+    HackAssembler.assemble = warm_assemble
+    cache.memory = OrderedDict()
+    with Server(str(path), Handler) as server:
+        try:
+            while not server.stopping:
+                server.handle_request()
+        finally:
+            path.unlink(missing_ok=True)
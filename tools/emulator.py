@@ -0,0 +1,613 @@
+"""
+Nand2Tetris Hack CPU emulator.
+
+A software model of the Hack computer: 32K words of ROM, 32K words of
+RAM (including the SCREEN and KBD memory maps) and the A, D and PC
+registers.
+
+There are two ways to execute a program:
+    step(): fetch, decode and execute a single instruction.
+    run():  translate the ROM into blocks, each one a python function
+            with the registers held in locals. A block is a trace: it
+            follows jumps to constant addresses and leaves only where a
+            conditional jump is taken. Blocks are compiled on first use
+            and cached by ROM hash, for the BLOCK_CACHE_ROMS programs
+            used last.
+
+ROM is read only on Hack, so a translated block can never go stale.
+
+run() also fast-forwards through idle loops: a block that comes back to
+its start, writes no memory and leaves A and D as they were will repeat
+exactly until something outside the CPU (the keyboard) changes RAM. The
+rest of the run is skipped a whole iteration at a time, so the final
+state and cycle count are the same as running it.
+
+Counting loops (Sys.wait) are skipped too: when an iteration moves the
+registers and the words it writes by the same amount every time (a
+counter and the stack slots it is pushed to), counter_loop() finds how
+many iterations take the same path, and they are done in one step.
+"""
+
+import sys
+import math
+import hashlib
+from pathlib import Path
+from collections import OrderedDict
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / '06'))
+from HackAssembler import assemble, AssemblyError  # noqa: E402
+
+
+ROM_SIZE = 32768
+RAM_SIZE = 32768
+SCREEN = 16384
+KBD = 24576
+
+WORD = 0xFFFF
+ADDR = 0x7FFF
+NEG = 0x8000
+
+
+class EmulatorError(Exception):
+    """
+    Represents an error loading or running a Hack program.
+    """
+    pass
+
+
+def load_rom(fname):
+    """
+    Load a program into a list of instructions (ints).
+
+    .hack files are read as text binary. .asm files are assembled first.
+    """
+    path = Path(fname)
+    if path.suffix == '.asm':
+        lines = assemble(path)
+    else:
+        with open(path) as hackfile:
+            lines = [line.strip() for line in hackfile]
+    try:
+        rom = [int(line, 2) for line in lines if line]
+    except ValueError as e:
+        raise EmulatorError(f'{fname}: not a hack binary: {e}')
+    except AssemblyError as e:
+        raise EmulatorError(f'{fname}: {e}')
+    if len(rom) > ROM_SIZE:
+        raise EmulatorError(f'{fname}: program too large: {len(rom)} words')
+    return rom
+
+
+def rom_hash(rom):
+    """Hash identifying a program. Used as the key for translated code"""
+    return hashlib.sha1(
+        b''.join(instr.to_bytes(2, 'big') for instr in rom)).hexdigest()
+
+
+def alu(x, y, c):
+    """
+    The Hack ALU.
+
+    c: the 6 control bits: zx nx zy ny f no
+    """
+    if c & 0b100000:
+        x = 0
+    if c & 0b010000:
+        x ^= WORD
+    if c & 0b001000:
+        y = 0
+    if c & 0b000100:
+        y ^= WORD
+    out = (x + y) & WORD if c & 0b000010 else x & y
+    if c & 0b000001:
+        out ^= WORD
+    return out
+
+
+def jumps(value, jmp):
+    """returns true if the jmp bits jump on value"""
+    if value == 0:
+        return jmp & 0b010
+    elif value & NEG:
+        return jmp & 0b100
+    else:
+        return jmp & 0b001
+
+
+def decode(instr):
+    """
+    C-instruction -> (abit, comp, dest, jmp)
+
+    111a cccc ccdd djjj
+    """
+    return (instr >> 12) & 1, (instr >> 6) & 0x3F, (instr >> 3) & 7, instr & 7
+
+
+# dest bits
+DEST_M = 0b001
+DEST_D = 0b010
+DEST_A = 0b100
+
+# comp bits -> python expression.
+# x is the D register, y is A or M. Anything else goes through alu()
+COMP_EXPR = {
+    0b101010: '0',
+    0b111111: '1',
+    0b111010: '65535',
+    0b001100: '{x}',
+    0b110000: '{y}',
+    0b001101: '{x} ^ 65535',
+    0b110001: '{y} ^ 65535',
+    0b001111: '-{x} & 65535',
+    0b110011: '-{y} & 65535',
+    0b011111: '({x} + 1) & 65535',
+    0b110111: '({y} + 1) & 65535',
+    0b001110: '({x} - 1) & 65535',
+    0b110010: '({y} - 1) & 65535',
+    0b000010: '({x} + {y}) & 65535',
+    0b010011: '({x} - {y}) & 65535',
+    0b000111: '({y} - {x}) & 65535',
+    0b000000: '{x} & {y}',
+    0b010101: '{x} | {y}',
+}
+
+# jmp bits -> python condition on the computed value v
+JMP_EXPR = {
+    0b001: '0 < v < 32768',
+    0b010: 'v == 0',
+    0b011: 'v < 32768',
+    0b100: 'v >= 32768',
+    0b101: 'v != 0',
+    0b110: 'v == 0 or v >= 32768',
+}
+
+# comp bits -> (x, y, constant): the computations that are affine,
+# x * D + y * (A or M) + constant
+AFFINE = {
+    0b101010: (0, 0, 0),
+    0b111111: (0, 0, 1),
+    0b111010: (0, 0, -1),
+    0b001100: (1, 0, 0),
+    0b110000: (0, 1, 0),
+    0b001101: (-1, 0, -1),
+    0b110001: (0, -1, -1),
+    0b001111: (-1, 0, 0),
+    0b110011: (0, -1, 0),
+    0b011111: (1, 0, 1),
+    0b110111: (0, 1, 1),
+    0b001110: (1, 0, -1),
+    0b110010: (0, 1, -1),
+    0b000010: (1, 1, 0),
+    0b010011: (1, -1, 0),
+    0b000111: (-1, 1, 0),
+}
+
+# Most instructions translated into a single block
+MAX_BLOCK = 256
+
+# Times the code at an address is single stepped before it is translated:
+# most code runs once (initialization), and translating costs about as
+# much as stepping through it twenty times
+HOT = 2
+
+# Self loops run before a counting loop that could not be skipped is
+# looked at again
+LOOP_RETRY = 64
+
+# Programs whose blocks are kept, the least recently used dropped beyond
+BLOCK_CACHE_ROMS = 16
+
+
+def mark_screen(aconst):
+    """
+    Lines recording a write to M in the dirty set, if M is in the SCREEN
+    memory map
+    """
+    if aconst is None:
+        return ['if 16384 <= (a & 32767) < 24576:',
+                '    dirty.add(a & 32767)']
+    elif SCREEN <= aconst < KBD:
+        return [f'dirty.add({aconst})']
+    return []
+
+
+def translate_block(rom, start, track_screen=False):
+    """
+    Translate the code starting at start into python source.
+
+    The block is a trace: it follows jumps to a constant address, and
+    a conditional jump leaves it only when taken, the trace going on
+    with the next instruction. It ends at a jump to a computed address,
+    at code it already holds (a loop) or after MAX_BLOCK instructions.
+    The generated function takes the registers and returns them with
+    the number of instructions executed, which depends on the exit:
+        def block(ram, a, d, dirty): ... return a, d, pc, n
+
+    track_screen: add every SCREEN word written to the dirty set
+
+    returns: (src, length, idle)
+        length: the instructions executed by the longest path
+        idle: n of an exit back to start, by a jump taken or falling
+        through (a KBD poll: @KBD D=M @LOOP D;JEQ), that writes no
+        memory on the way; 0 if there is none. Such a loop is a
+        candidate for fast-forwarding.
+    """
+    body = []
+    writes = False
+    aconst = None   # value of A if known at translation time
+    pc = start
+    n = 0           # instructions translated
+    seen = set()    # their addresses
+    idle = 0
+    ret = None
+
+    def leave(anext, target):
+        """the return statement of an exit to target"""
+        nonlocal idle
+        if target == str(start) and not writes and not idle:
+            idle = n
+        return f'return {anext}, d, {target}, {n}'
+
+    def ends(pc):
+        """true if the trace cannot go on at pc"""
+        return pc in seen or n >= MAX_BLOCK or pc == 0
+
+    while ret is None:
+        seen.add(pc)
+        instr = rom[pc]
+        pc = (pc + 1) & ADDR
+        n += 1
+        if not instr & NEG:
+            aconst = instr
+            if ends(pc):
+                ret = leave(aconst, pc)
+            continue
+
+        # materialize A: a known constant or the local variable
+        addr = 'a' if aconst is None else str(aconst)
+        abit, comp, dest, jmp = decode(instr)
+        if abit:
+            y = f'ram[{aconst}]' if aconst is not None else 'ram[a & 32767]'
+        else:
+            y = addr
+        expr = COMP_EXPR.get(comp, 'alu({x}, {y}, %d)' % comp)
+        expr = expr.format(x='d', y=y)
+
+        writes = writes or dest & DEST_M
+        if jmp == 0b111 and not dest:
+            pass    # a plain jump: the value is not used
+        elif dest in (DEST_D, DEST_A, DEST_M) and not jmp:
+            # single destination: no need for a temporary
+            v = 'd'
+            if dest == DEST_A:
+                v = 'a'
+                aconst = None
+            elif dest == DEST_M:
+                v = (f'ram[{aconst}]' if aconst is not None
+                     else 'ram[a & 32767]')
+            body.append(f'{v} = {expr}')
+            if dest == DEST_M and track_screen:
+                body += mark_screen(aconst)
+        else:
+            body.append(f'v = {expr}')
+            if dest & DEST_M:
+                if aconst is not None:
+                    body.append(f'ram[{aconst}] = v')
+                else:
+                    body.append('ram[a & 32767] = v')
+                if track_screen:
+                    body += mark_screen(aconst)
+            if dest & DEST_D:
+                body.append('d = v')
+        if jmp:
+            # the jump target is A *before* this instruction's write to A
+            target = str(aconst) if aconst is not None else 'a & 32767'
+            if dest & DEST_A and aconst is None:
+                body.append('t = a & 32767')
+                target = 't'
+            anext = 'v' if dest & DEST_A else addr
+            if jmp == 0b111:
+                if aconst is None or ends(aconst):
+                    ret = leave(anext, target)
+                    continue
+                pc = aconst     # follow the jump
+            else:
+                body.append(f'if {JMP_EXPR[jmp]}:')
+                body.append(f'    {leave(anext, target)}')
+                if ends(pc):
+                    ret = leave(anext, pc)
+                    continue
+            if dest & DEST_A:
+                body.append('a = v')
+                aconst = None
+        else:
+            if dest & DEST_A and dest != DEST_A:
+                body.append('a = v')
+                aconst = None
+            if ends(pc):
+                ret = leave('a' if aconst is None else aconst, pc)
+
+    body.append(ret)
+    src = f'def block_{start}(ram, a, d, dirty):\n'
+    src += ''.join(f'    {line}\n' for line in body)
+    return src, n, idle
+
+
+# (ROM hash, track_screen) -> [block fn or None per pc], [length per pc],
+#   [idle exit per pc], [times stepped from pc],
+#   [self loops to let go by before the next counter_loop(), per pc: -1
+#    for never]
+# Blocks depend on nothing but the ROM, so every Computer running the
+# same program shares them, BLOCK_CACHE_ROMS programs at most.
+_block_cache = OrderedDict()
+
+
+def block_tables(key):
+    """the block tables of a program, by (ROM hash, track_screen)"""
+    tables = _block_cache.get(key)
+    if tables is None:
+        tables = ([None] * ROM_SIZE, [0] * ROM_SIZE, [0] * ROM_SIZE,
+                  [0] * ROM_SIZE, [0] * ROM_SIZE)
+        _block_cache[key] = tables
+        if len(_block_cache) > BLOCK_CACHE_ROMS:
+            _block_cache.popitem(last=False)
+    else:
+        _block_cache.move_to_end(key)
+    return tables
+
+
+def unchanged(value, step):
+    """
+    number of iterations t from 0 for which value + step * t (mod 2**16)
+    stays zero, positive or negative as it is at t = 0
+    """
+    step = step - 65536 if step & NEG else step
+    if not step:
+        return math.inf
+    if not value:
+        return 1
+    if step > 0:
+        bound = 32768 if value < 32768 else 65536
+        return -((value - bound) // step)
+    bound = 1 if value < 32768 else 32768
+    return (value - bound) // -step + 1
+
+
+def affine_iteration(rom, ram, start, n, a, d, mem):
+    """
+    Execute n instructions from start on values affine in the iteration
+    number t: each one is (its value at t = 0, its change per iteration).
+
+    mem: address -> value, for the words the loop writes. Other words
+    are read from ram and do not change.
+
+    returns (pc, a, d, mem, same), same being the number of iterations
+    that take the path of t = 0, or None if a value that changes is
+    used in a way that is not affine, or as an address.
+    """
+    mem = dict(mem)
+    pc = start
+    same = math.inf
+    for _ in range(n):
+        instr = rom[pc]
+        pc = (pc + 1) & ADDR
+        if not instr & NEG:
+            a = (instr, 0)
+            continue
+        abit, comp, dest, jmp = decode(instr)
+        if a[1] and (abit or dest & DEST_M):
+            return None
+        addr = a[0] & ADDR
+        y = mem.get(addr, (ram[addr], 0)) if abit else a
+        if comp in AFFINE:
+            cx, cy, c = AFFINE[comp]
+            v = ((cx * d[0] + cy * y[0] + c) & WORD,
+                 (cx * d[1] + cy * y[1]) & WORD)
+        elif d[1] or y[1]:
+            return None
+        else:
+            v = (alu(d[0], y[0], comp), 0)
+        if dest & DEST_M:
+            mem[addr] = v
+        if dest & DEST_D:
+            d = v
+        target = a
+        if dest & DEST_A:
+            a = v
+        if jmp and jmp != 0b111:
+            same = min(same, unchanged(*v))
+        if jmp and jumps(v[0], jmp):
+            if target[1]:
+                return None
+            pc = target[0] & ADDR
+    return pc, a, d, mem, same
+
+
+def counter_loop(rom, ram, start, n, a, d):
+    """
+    Look at the loop of n instructions from start, which has just come
+    back to start once.
+
+    returns (iterations, da, dd, dmem) if the next iterations each add
+    da to A, dd to D and dmem[address] to the words they write (mod
+    2**16), taking the same path: they can be done in one step. There
+    are none if the next iteration leaves the loop. None if the loop is
+    not like that.
+    """
+    pc, a1, d1, mem, _ = affine_iteration(
+        rom, ram, start, n, (a, 0), (d, 0), {})
+    if pc != start:
+        return 0, 0, 0, {}
+    da, dd = (a1[0] - a) & WORD, (d1[0] - d) & WORD
+    dmem = {x: (v - ram[x]) & WORD for x, (v, _) in mem.items()}
+    ahead = affine_iteration(
+        rom, ram, start, n, (a, da), (d, dd),
+        {x: (ram[x], dx) for x, dx in dmem.items()})
+    if ahead is None:
+        return None
+    pc, a2, d2, mem, same = ahead
+    # the iteration from t must end where the one from t + 1 starts
+    if a2 != ((a + da) & WORD, da) or d2 != ((d + dd) & WORD, dd):
+        return None
+    if any(mem[x] != ((ram[x] + dx) & WORD, dx) for x, dx in dmem.items()):
+        return None
+    return same, da, dd, dmem
+
+
+def compile_block(rom, start, track_screen=False):
+    """translate the block at start and compile it into a function"""
+    src, length, idle = translate_block(rom, start, track_screen)
+    code = compile(src, f'<hack block {start}>', 'exec')
+    namespace = {'alu': alu}
+    exec(code, namespace)
+    return namespace[f'block_{start}'], length, idle
+
+
+class Computer:
+    """
+    The Hack computer.
+
+    rom: list of instructions
+    track_screen: record the SCREEN words written in self.dirty
+    """
+    def __init__(self, rom, track_screen=False):
+        if len(rom) > ROM_SIZE:
+            raise EmulatorError(f'program too large: {len(rom)} words')
+        self.program = list(rom)
+        self.rom = self.program + [0] * (ROM_SIZE - len(rom))
+        self.ram = [0] * RAM_SIZE
+        self.a = self.d = self.pc = 0
+        self.time = 0  # cycles executed
+        self.skipped = 0  # cycles fast-forwarded through idle loops
+
+        # SCREEN words written since the owner last cleared the set
+        self.dirty = set() if track_screen else None
+        self.track_screen = track_screen
+
+        (self.blocks, self.lengths, self.idle, self.entries,
+         self.waits) = block_tables((rom_hash(self.program), track_screen))
+
+    @classmethod
+    def load(cls, fname, track_screen=False):
+        return cls(load_rom(fname), track_screen)
+
+    def reset(self):
+        """restart the program. RAM is left as is"""
+        self.pc = 0
+
+    def step(self):
+        """execute a single instruction"""
+        instr = self.rom[self.pc]
+        self.pc = (self.pc + 1) & ADDR
+        self.time += 1
+        if not instr & NEG:
+            self.a = instr
+            return
+
+        a = self.a
+        abit, comp, dest, jmp = decode(instr)
+        value = alu(self.d, self.ram[a & ADDR] if abit else a, comp)
+        if dest & DEST_M:
+            self.ram[a & ADDR] = value
+            if self.dirty is not None and SCREEN <= a & ADDR < KBD:
+                self.dirty.add(a & ADDR)
+        if dest & DEST_D:
+            self.d = value
+        if dest & DEST_A:
+            self.a = value
+        if jmp and jumps(value, jmp):
+            self.pc = a & ADDR
+
+    def step_block(self, limit):
+        """
+        single step up to limit instructions, stopping after the first
+        jump taken. returns the number executed
+        """
+        for n in range(1, limit + 1):
+            pc = self.pc
+            self.step()
+            if self.pc != pc + 1:
+                break
+        return n
+
+    def run(self, cycles, fast_forward=True):
+        """
+        execute cycles instructions using the translated blocks
+
+        fast_forward: skip the rest of the run once it is stuck in an
+        idle loop, and skip counting loops to their exit. RAM must not
+        change behind the emulator's back during the run, which holds
+        for a single call.
+        """
+        blocks, lengths, idle = self.blocks, self.lengths, self.idle
+        entries, waits = self.entries, self.waits
+        ram, dirty = self.ram, self.dirty
+        a, d, pc = self.a, self.d, self.pc
+        left = cycles
+        stepped = 0     # already counted in self.time by step()
+        while left > 0:
+            fn = blocks[pc]
+            if fn is None and entries[pc] < HOT:
+                entries[pc] += 1
+                self.a, self.d, self.pc = a, d, pc
+                n = self.step_block(left)
+                a, d, pc = self.a, self.d, self.pc
+                left -= n
+                stepped += n
+                continue
+            if fn is None:
+                fn, lengths[pc], idle[pc] = compile_block(
+                    self.rom, pc, self.track_screen)
+                blocks[pc] = fn
+            if lengths[pc] > left:
+                break
+            start, a0, d0 = pc, a, d
+            a, d, pc, n = fn(ram, a, d, dirty)
+            left -= n
+            if pc != start or not fast_forward:
+                continue
+            if n == idle[pc] and a == a0 and d == d0:
+                # a fixed point: every further iteration is the same
+                skip = left - left % n
+                left -= skip
+                self.skipped += skip
+            elif waits[pc] > 0:
+                waits[pc] -= 1
+            elif not waits[pc]:
+                a, d, skip = self.skip_counting(pc, n, a, d, left)
+                left -= skip
+        self.a, self.d, self.pc = a, d, pc
+        self.time += cycles - left - stepped
+
+        # not enough cycles left for a whole block: single step the rest
+        for _ in range(left):
+            self.step()
+
+    def skip_counting(self, pc, n, a, d, left):
+        """
+        do the iterations of the loop of n instructions at pc that
+        counter_loop() finds can be, as many as fit in left cycles.
+        returns the new A and D and the cycles skipped
+        """
+        waits = self.waits
+        loop = counter_loop(self.rom, self.ram, pc, n, a, d)
+        if loop is None:
+            waits[pc] = -1
+            return a, d, 0
+        same, da, dd, dmem = loop
+        times = min(same, left // n)
+        if times < 2:
+            waits[pc] = LOOP_RETRY
+            return a, d, 0
+        ram = self.ram
+        for x, dx in dmem.items():
+            ram[x] = (ram[x] + times * dx) & WORD
+            if self.dirty is not None and SCREEN <= x < KBD:
+                self.dirty.add(x)
+        self.skipped += times * n
+        return (a + times * da) & WORD, (d + times * dd) & WORD, times * n
+
+    def run_interpreted(self, cycles):
+        """execute cycles instructions one at a time"""
+        for _ in range(cycles):
+            self.step()
@@ -0,0 +1,727 @@
+"""
+Nand2Tetris HDL front end.
+
+Parses .hdl chips and flattens a chip's hierarchy into a netlist of
+primitives:
+    Nand:     out = !(a & b)
+    DFF:      out(t) = in(t-1)
+    builtins: the chips the course supplies without HDL (ARegister,
+              DRegister, ROM32K, Screen, Keyboard), and the behavioral
+              models that may stand in for verified chips (RAM16K, PC..),
+              see builtin_chips.py
+
+Every single-bit wire in the flattened chip is a net, numbered from 0.
+Net 0 is always false and net 1 always true.
+
+The netlist is then levelized: the Nand gates (and builtin reads) are
+put in topological order, so one linear sweep over them evaluates the
+whole chip.
+"""
+
+import re
+from pathlib import Path
+from builtin_chips import BUILTINS, BEHAVIORAL, builtin_class
+
+
+# the course's project directories, searched for sub-chips
+REPO = Path(__file__).resolve().parent.parent
+PROJECT_DIRS = [
+    REPO / '01', REPO / '02', REPO / '03' / 'a', REPO / '03' / 'b',
+    REPO / '05',
+]
+
+FALSE = 0
+TRUE = 1
+
+
+class HdlError(Exception):
+    """
+    Represents an error in the HDL code.
+    """
+    def __init__(self, msg, lineno, fname=None):
+        super().__init__(msg)
+        self.lineno = lineno
+        self.fname = fname
+
+    def __str__(self):
+        where = f'{self.fname}: ' if self.fname else ''
+        return f'Error: {where}line {self.lineno}: {super().__str__()}'
+
+
+class PinRef:
+    """
+    A pin as written in a part's connection list: name, name[i] or
+    name[i..j]. lo/hi are None when there is no subscript.
+    """
+    def __init__(self, name, lo=None, hi=None):
+        self.name = name
+        self.lo = lo
+        self.hi = hi
+
+    def bits(self, width):
+        """the bit indexes this ref selects out of a pin of width"""
+        if self.lo is None:
+            return range(width)
+        return range(self.lo, self.hi + 1)
+
+    def __repr__(self):
+        if self.lo is None:
+            return self.name
+        elif self.lo == self.hi:
+            return f'{self.name}[{self.lo}]'
+        return f'{self.name}[{self.lo}..{self.hi}]'
+
+
+class Part:
+    """
+    A part in a chip's PARTS section: chip(inner=outer, ...)
+    """
+    def __init__(self, chip, conns, lineno):
+        self.chip = chip
+        self.conns = conns  # [(inner PinRef, outer PinRef)]
+        self.lineno = lineno
+
+
+class ChipDef:
+    """
+    A parsed .hdl chip.
+
+    inputs, outputs: {pin name: width}
+    """
+    def __init__(self, name, inputs, outputs, parts, fname):
+        self.name = name
+        self.inputs = inputs
+        self.outputs = outputs
+        self.parts = parts
+        self.fname = fname
+
+    def pins(self):
+        return {**self.inputs, **self.outputs}
+
+
+RE_TOKEN = re.compile(r'''
+    (?P<comment>//[^\n]*|/\*.*?\*/)
+    | (?P<name>[A-Za-z_][\w.]*)
+    | (?P<number>\d+)
+    | (?P<range>\.\.)
+    | (?P<symbol>[{}()\[\],;=:])
+    | (?P<newline>\n)
+    | (?P<space>[ \t\r\f\v]+)
+    | (?P<error>.)
+''', re.VERBOSE | re.DOTALL)
+
+
+class Parser:
+    """
+    Recursive descent parser for the HDL grammar:
+
+        CHIP name { IN pins; OUT pins; PARTS: part* }
+        pins: pin (',' pin)*    pin: name ('[' width ']')?
+        part: name '(' conn (',' conn)* ')' ';'
+        conn: ref '=' ref       ref: name ('[' i ('..' j)? ']')?
+    """
+    def __init__(self, text, fname=None):
+        self.fname = fname
+        self.tokens = []
+        lineno = 1
+        for m in RE_TOKEN.finditer(text):
+            kind = m.lastgroup
+            if kind == 'error':
+                raise HdlError(f'unexpected character {m.group()!r}',
+                               lineno, fname)
+            if kind in ('name', 'number', 'range', 'symbol'):
+                self.tokens.append((m.group(), lineno))
+            lineno += m.group().count('\n')
+        self.pos = 0
+
+    def error(self, msg):
+        lineno = self.tokens[min(self.pos, len(self.tokens) - 1)][1] \
+            if self.tokens else 1
+        return HdlError(msg, lineno, self.fname)
+
+    def peek(self):
+        return self.tokens[self.pos][0] if self.pos < len(self.tokens) \
+            else None
+
+    def lineno(self):
+        return self.tokens[min(self.pos, len(self.tokens) - 1)][1]
+
+    def next(self):
+        if self.pos >= len(self.tokens):
+            raise self.error('unexpected end of file')
+        tok = self.tokens[self.pos][0]
+        self.pos += 1
+        return tok
+
+    def expect(self, s):
+        tok = self.next()
+        if tok != s:
+            self.pos -= 1
+            raise self.error(f'syntax error: found {tok} expected: {s}')
+        return tok
+
+    def number(self):
+        tok = self.next()
+        if not tok.isdigit():
+            self.pos -= 1
+            raise self.error(f'syntax error: found {tok} expected a number')
+        return int(tok)
+
+    def identifier(self):
+        tok = self.next()
+        if not re.match(r'^[A-Za-z_]', tok):
+            self.pos -= 1
+            raise self.error(f'syntax error: found {tok} expected a name')
+        return tok
+
+    def chip(self):
+        self.expect('CHIP')
+        name = self.identifier()
+        self.expect('{')
+        inputs = self.pins('IN') if self.peek() == 'IN' else {}
+        outputs = self.pins('OUT') if self.peek() == 'OUT' else {}
+        if self.peek() == 'BUILTIN':
+            raise self.error(f'{name} is a builtin chip')
+        self.expect('PARTS')
+        self.expect(':')
+        parts = []
+        while self.peek() != '}':
+            parts.append(self.part())
+        self.expect('}')
+        return ChipDef(name, inputs, outputs, parts, self.fname)
+
+    def pins(self, kind):
+        self.expect(kind)
+        pins = {}
+        while True:
+            name = self.identifier()
+            width = 1
+            if self.peek() == '[':
+                self.next()
+                width = self.number()
+                self.expect(']')
+            pins[name] = width
+            if self.next() == ';':
+                return pins
+            self.pos -= 1
+            self.expect(',')
+
+    def part(self):
+        lineno = self.lineno()
+        chip = self.identifier()
+        self.expect('(')
+        conns = []
+        while True:
+            inner = self.ref()
+            self.expect('=')
+            outer = self.ref()
+            conns.append((inner, outer))
+            if self.next() == ')':
+                break
+            self.pos -= 1
+            self.expect(',')
+        self.expect(';')
+        return Part(chip, conns, lineno)
+
+    def ref(self):
+        name = self.identifier()
+        if self.peek() != '[':
+            return PinRef(name)
+        self.next()
+        lo = hi = self.number()
+        if self.peek() == '..':
+            self.next()
+            hi = self.number()
+        self.expect(']')
+        if hi < lo:
+            raise self.error(f'bad sub bus: {name}[{lo}..{hi}]')
+        return PinRef(name, lo, hi)
+
+
+def parse_hdl(text, fname=None):
+    """hdl text -> ChipDef"""
+    return Parser(text, fname).chip()
+
+
+# primitives: name -> (inputs, outputs)
+PRIMITIVES = {
+    'Nand': ({'a': 1, 'b': 1}, {'out': 1}),
+    'DFF': ({'in': 1}, {'out': 1}),
+}
+
+
+class ChipLibrary:
+    """
+    Finds and parses chips by name. Each chip is parsed once.
+
+    dirs: searched in order for Name.hdl
+    substitute(name, library): whether to simulate the chip name with
+        its behavioral model rather than its HDL (see BEHAVIORAL)
+    """
+    def __init__(self, dirs=None, substitute=None):
+        self.dirs = [Path(d) for d in (dirs or PROJECT_DIRS)]
+        self.substitute = substitute
+        self.chips = {}
+        self.sizes = {}
+
+    def path(self, name):
+        """the .hdl file of name, or None for primitives and builtins"""
+        for d in self.dirs:
+            path = d / f'{name}.hdl'
+            if path.exists():
+                return path
+        return None
+
+    def get(self, name, lineno=0, fname=None):
+        """
+        name -> ChipDef, or the name itself for a primitive, a builtin or
+        a chip simulated by its behavioral model
+        """
+        if name in PRIMITIVES:
+            return name
+        if name not in self.chips:
+            if name in BEHAVIORAL and self.substitute and \
+                    self.substitute(name, self):
+                self.chips[name] = name
+                return name
+            path = self.path(name)
+            if path is None:
+                if name in BUILTINS:
+                    return name
+                raise HdlError(f'chip {name} not found', lineno, fname)
+            self.parse(path)
+        return self.chips[name]
+
+    def parse(self, path):
+        with open(path) as hdlfile:
+            chip = parse_hdl(hdlfile.read(), str(path))
+        self.chips[Path(path).stem] = chip
+        return chip
+
+    def interface(self, name, lineno=0, fname=None):
+        """name -> (inputs, outputs)"""
+        chip = self.get(name, lineno, fname)
+        if isinstance(chip, ChipDef):
+            return chip.inputs, chip.outputs
+        elif chip in PRIMITIVES:
+            return PRIMITIVES[chip]
+        cls = builtin_class(chip)
+        return cls.IN, cls.OUT
+
+    def size(self, name, lineno=0, fname=None):
+        """
+        the number of Nands and DFFs name flattens to, counted without
+        flattening it
+        """
+        if name not in self.sizes:
+            chip = self.get(name, lineno, fname)
+            if isinstance(chip, ChipDef):
+                self.sizes[name] = sum(self.size(part.chip, part.lineno,
+                                                 chip.fname)
+                                       for part in chip.parts)
+            else:
+                self.sizes[name] = int(chip in PRIMITIVES)
+        return self.sizes[name]
+
+
+def load_chip(fname, substitute=None):
+    """
+    Parse the chip in fname. Its sub-chips are looked up in its own
+    directory first, then in the project directories.
+
+    substitute: see ChipLibrary. The chip itself is never substituted.
+    """
+    path = Path(fname)
+    library = ChipLibrary([path.parent, *PROJECT_DIRS], substitute)
+    return library.parse(path), library
+
+
+class Template:
+    """
+    A chip flattened on its own, with nets numbered from 0. Instances of
+    the chip are stamped out of it by offsetting the net numbers, so each
+    chip type is flattened once however many times it is used.
+
+    pins: {pin name: [net per bit]}, least significant first
+    nands: [(a, b, out)]
+    dffs: [(in, out)]
+    builtins: [(chip name, {pin: [nets]})]
+    probes: {chip name: [out nets]} of the first instance of each chip
+    """
+    def __init__(self, name):
+        self.name = name
+        self.nnets = 2
+        self.pins = {}
+        self.nands = []
+        self.dffs = []
+        self.builtins = []
+        self.probes = {}
+
+
+class Netlist:
+    """
+    A flattened, levelized chip.
+
+    inputs, outputs: {pin name: [net per bit]}, least significant first
+    nands: [(a, b, out)] in evaluation order
+    levels: logic level of each nand (1 + the deepest level it reads)
+    dffs: [(in, out)]
+    builtins: [Builtin]
+    order: [(nands, builtin)] segments: evaluate the nands, then the
+        builtin's combinational read (builtin may be None)
+    probes: {chip name: [out nets]} of the first instance of each chip
+    """
+    def __init__(self, chip, template):
+        self.name = chip.name
+        self.nnets = template.nnets
+        self.inputs = {k: template.pins[k] for k in chip.inputs}
+        self.outputs = {k: template.pins[k] for k in chip.outputs}
+        self.nands = template.nands
+        self.levels = []
+        self.dffs = template.dffs
+        self.builtins = [builtin_class(name)(pins)
+                         for name, pins in template.builtins]
+        self.order = []
+        self.probes = template.probes
+
+    def by_chip(self, name):
+        """the builtin instances of a chip"""
+        return [b for b in self.builtins if b.name == name]
+
+
+class Flattener:
+    """
+    Flattens chips into Templates, memoized per chip name.
+
+    Within a chip, wires are joined with union-find: a part output may
+    drive several signals, and a chip's output pin is the same wire as
+    whatever part drives it. The joined nets are then renumbered.
+    """
+    def __init__(self, library):
+        self.library = library
+        self.templates = {}
+
+    def template(self, name, lineno=0, fname=None):
+        """chip name -> Template"""
+        if name not in self.templates:
+            chip = self.library.get(name, lineno, fname)
+            if isinstance(chip, str):
+                self.templates[name] = self.primitive(chip)
+            else:
+                self.templates[name] = ChipFlattener(self, chip).flatten()
+        return self.templates[name]
+
+    def primitive(self, name):
+        inputs, outputs = self.library.interface(name)
+        template = Template(name)
+        for pin, width in {**inputs, **outputs}.items():
+            template.pins[pin] = list(range(
+                template.nnets, template.nnets + width))
+            template.nnets += width
+        pins = template.pins
+        if name == 'Nand':
+            template.nands.append((pins['a'][0], pins['b'][0],
+                                   pins['out'][0]))
+        elif name == 'DFF':
+            template.dffs.append((pins['in'][0], pins['out'][0]))
+        else:
+            template.builtins.append((name, pins))
+            template.probes[name] = pins.get('out')
+        return template
+
+
+class ChipFlattener:
+    """
+    Flattens one chip, stamping out its parts' templates.
+    """
+    def __init__(self, flattener, chip):
+        self.flattener = flattener
+        self.library = flattener.library
+        self.chip = chip
+        self.parent = [FALSE, TRUE]
+        self.drivers = []
+        self.nands = []
+        self.dffs = []
+        self.builtins = []
+        self.probes = {}
+
+    def error(self, msg, lineno):
+        return HdlError(msg, lineno, self.chip.fname)
+
+    def new(self, width):
+        start = len(self.parent)
+        self.parent.extend(range(start, start + width))
+        return list(range(start, start + width))
+
+    def find(self, n):
+        parent = self.parent
+        while parent[n] != n:
+            parent[n] = parent[parent[n]]
+            n = parent[n]
+        return n
+
+    def union(self, a, b):
+        a, b = self.find(a), self.find(b)
+        if a == b:
+            return
+        # constants stay the representative of their class
+        if b <= TRUE:
+            a, b = b, a
+        self.parent[b] = a
+
+    def flatten(self):
+        chip = self.chip
+        pins = {}
+        for name, width in chip.inputs.items():
+            pins[name] = self.new(width)
+            self.drivers += pins[name]
+        for name, width in chip.outputs.items():
+            pins[name] = self.new(width)
+        internal = self.internal_signals()
+
+        for part in chip.parts:
+            sub = self.flattener.template(part.chip, part.lineno, chip.fname)
+            sub_in, sub_out = self.library.interface(part.chip)
+            subpins = self.stamp(sub)
+            connected = set()
+
+            for inner, outer in part.conns:
+                if inner.name in sub_in:
+                    width = sub_in[inner.name]
+                elif inner.name in sub_out:
+                    width = sub_out[inner.name]
+                else:
+                    raise self.error(
+                        f'{part.chip} has no pin {inner.name}', part.lineno)
+                bits = inner.bits(width)
+                if bits.stop > width:
+                    raise self.error(f'{inner} out of range', part.lineno)
+                inner_nets = [subpins[inner.name][i] for i in bits]
+
+                if inner.name in sub_in:
+                    outer_nets = self.source(pins, internal, outer,
+                                             len(inner_nets), part.lineno)
+                    connected.update((inner.name, i) for i in bits)
+                else:
+                    outer_nets = self.sink(pins, internal, outer,
+                                           len(inner_nets), part.lineno)
+                for a, b in zip(inner_nets, outer_nets):
+                    self.union(a, b)
+
+            # unconnected inputs are false
+            for name, width in sub_in.items():
+                for i in range(width):
+                    if (name, i) not in connected:
+                        self.union(subpins[name][i], FALSE)
+            # a part's output pins may share a wire (ALU: ng is out[15])
+            self.drivers += {n for name in sub_out for n in subpins[name]}
+            self.probes.setdefault(part.chip, subpins.get('out'))
+
+        return self.number(pins)
+
+    def stamp(self, sub):
+        """
+        add an instance of the template sub. returns its pins' nets
+        """
+        offset = len(self.parent) - 2
+        self.parent.extend(range(offset + 2, offset + sub.nnets))
+
+        def net(n):
+            return n if n <= TRUE else n + offset
+
+        self.nands += [(net(a), net(b), net(o)) for a, b, o in sub.nands]
+        self.dffs += [(net(d), net(q)) for d, q in sub.dffs]
+        self.builtins += [
+            (name, {k: [net(n) for n in v] for k, v in pins.items()})
+            for name, pins in sub.builtins]
+        for name, nets in sub.probes.items():
+            if name not in self.probes and nets:
+                self.probes[name] = [net(n) for n in nets]
+        return {k: [net(n) for n in v] for k, v in sub.pins.items()}
+
+    def internal_signals(self):
+        """
+        allocate the nets of the chip's internal signals: the names
+        part outputs are connected to that are not pins of the chip
+        """
+        chip = self.chip
+        internal = {}
+        chip_pins = chip.pins()
+        for part in chip.parts:
+            sub_in, sub_out = self.library.interface(
+                part.chip, part.lineno, chip.fname)
+            for inner, outer in part.conns:
+                if inner.name not in sub_out or outer.name in chip_pins:
+                    continue
+                if outer.lo is not None:
+                    raise self.error(f'sub bus of internal pin {outer}',
+                                     part.lineno)
+                if outer.name in ('true', 'false'):
+                    raise self.error(f'cannot drive {outer.name}',
+                                     part.lineno)
+                width = len(inner.bits(sub_out[inner.name]))
+                if outer.name in internal:
+                    if len(internal[outer.name]) != width:
+                        raise self.error(f'{outer.name}: width mismatch',
+                                         part.lineno)
+                    continue
+                internal[outer.name] = self.new(width)
+        return internal
+
+    def source(self, pins, internal, outer, width, lineno):
+        """nets feeding a part input from outer"""
+        if outer.name == 'true':
+            return [TRUE] * width
+        elif outer.name == 'false':
+            return [FALSE] * width
+        elif outer.name in pins:
+            nets = pins[outer.name]
+            bits = outer.bits(len(nets))
+            if bits.stop > len(nets):
+                raise self.error(f'{outer} out of range', lineno)
+            nets = [nets[i] for i in bits]
+        elif outer.name in internal:
+            if outer.lo is not None:
+                raise self.error(f'sub bus of internal pin {outer}', lineno)
+            nets = internal[outer.name]
+        else:
+            raise self.error(f'{outer.name} is not driven by any part',
+                             lineno)
+        if len(nets) != width:
+            raise self.error(f'{outer}: width mismatch', lineno)
+        return nets
+
+    def sink(self, pins, internal, outer, width, lineno):
+        """nets a part output drives"""
+        if outer.name in self.chip.inputs:
+            raise self.error(f'cannot drive input pin {outer.name}', lineno)
+        elif outer.name in pins:
+            nets = pins[outer.name]
+            bits = outer.bits(len(nets))
+            if bits.stop > len(nets):
+                raise self.error(f'{outer} out of range', lineno)
+            nets = [nets[i] for i in bits]
+        else:
+            nets = internal[outer.name]
+        if len(nets) != width:
+            raise self.error(f'{outer}: width mismatch', lineno)
+        return nets
+
+    def number(self, pins):
+        """
+        renumber the joined nets into a Template. Checks that no net has
+        more than one driver.
+        """
+        find = self.find
+        driven = set()
+        for n in self.drivers:
+            root = find(n)
+            if root <= TRUE or root in driven:
+                raise self.error('pin driven by more than one part', 0)
+            driven.add(root)
+
+        # pins first, so they get the same numbers in every template
+        ids = [-1] * len(self.parent)
+        ids[FALSE], ids[TRUE] = FALSE, TRUE
+        count = 2
+        for nets in pins.values():
+            for n in nets:
+                root = find(n)
+                if ids[root] < 0:
+                    ids[root] = count
+                    count += 1
+        for n in range(2, len(self.parent)):
+            root = find(n)
+            if ids[root] < 0:
+                ids[root] = count
+                count += 1
+            ids[n] = ids[root]
+
+        template = Template(self.chip.name)
+        template.nnets = count
+        template.pins = {k: [ids[n] for n in v] for k, v in pins.items()}
+        template.nands = [(ids[a], ids[b], ids[o]) for a, b, o in self.nands]
+        template.dffs = [(ids[d], ids[q]) for d, q in self.dffs]
+        template.builtins = [
+            (name, {k: [ids[n] for n in v] for k, v in bpins.items()})
+            for name, bpins in self.builtins]
+        template.probes = {k: [ids[n] for n in v]
+                           for k, v in self.probes.items() if v}
+        return template
+
+
+def levelize(netlist):
+    """
+    Sort the combinational nodes (Nands and builtin reads) into
+    topological order, and group them into evaluation segments.
+
+    Sources are the constants, the chip inputs, the DFF outputs and the
+    builtins' state. Raises HdlError on a combinational loop.
+    """
+    nands = netlist.nands
+    builtins = netlist.builtins
+    nnodes = len(nands) + len(builtins)
+
+    # node -> input nets, node -> output nets
+    node_in = [(a, b) for a, b, _ in nands]
+    node_out = [(o,) for _, _, o in nands]
+    for builtin in builtins:
+        node_in.append([n for pin in builtin.COMB for n in builtin.pins[pin]])
+        node_out.append([n for pin in builtin.OUT for n in builtin.pins[pin]])
+
+    driver = {}
+    for node, outs in enumerate(node_out):
+        for n in outs:
+            driver[n] = node
+
+    fanout = [[] for _ in range(netlist.nnets)]
+    indegree = [0] * nnodes
+    for node, ins in enumerate(node_in):
+        for n in ins:
+            if n in driver:
+                indegree[node] += 1
+                fanout[n].append(node)
+
+    level = [0] * nnodes
+    ready = [node for node in range(nnodes) if not indegree[node]]
+    order = []
+    while ready:
+        node = ready.pop()
+        order.append(node)
+        for n in node_out[node]:
+            for consumer in fanout[n]:
+                level[consumer] = max(level[consumer], level[node] + 1)
+                indegree[consumer] -= 1
+                if not indegree[consumer]:
+                    ready.append(consumer)
+
+    if len(order) < nnodes:
+        raise HdlError(f'{netlist.name}: combinational loop', 0)
+
+    # by level, nands before builtins within a level
+    order.sort(key=lambda node: (level[node], node >= len(nands)))
+    netlist.nands = [nands[node] for node in order if node < len(nands)]
+    netlist.levels = [level[node] + 1 for node in order if node < len(nands)]
+
+    segments = []
+    run = []
+    for node in order:
+        if node < len(nands):
+            run.append(nands[node])
+        else:
+            segments.append((run, builtins[node - len(nands)]))
+            run = []
+    segments.append((run, None))
+    netlist.order = segments
+
+
+def flatten(chip, library, flattener=None):
+    """
+    ChipDef -> levelized Netlist
+
+    flattener: a Flattener to share sub-chip templates with
+    """
+    flattener = flattener or Flattener(library)
+    netlist = Netlist(chip, flattener.template(chip.name))
+    levelize(netlist)
+    return netlist
@@ -0,0 +1,88 @@
+"""
+Scripted keyboard input for headless runs.
+
+KBD is the Hack computer's only input. A keyboard script says which key
+is held down from which cycle on:
+
+    // cycle  key
+    0         #0       // nothing pressed
+    150000    RIGHT
+    400000    #0
+    500000    q
+    600000    5
+
+A key is a single character, one of the special key names below, or a
+Hack keycode written #n: 5 is the digit 5, and so is #53. Running the
+same script always produces the same run.
+"""
+
+from emulator import KBD, EmulatorError
+
+
+# special keys of the Hack character set
+KEYCODES = {
+    'NEWLINE': 128, 'BACKSPACE': 129, 'LEFT': 130, 'UP': 131,
+    'RIGHT': 132, 'DOWN': 133, 'HOME': 134, 'END': 135, 'PAGEUP': 136,
+    'PAGEDOWN': 137, 'INSERT': 138, 'DELETE': 139, 'ESC': 140,
+    **{f'F{i}': 140 + i for i in range(1, 13)},
+}
+
+
+def keycode(key, lineno):
+    """character, key name or #keycode -> keycode"""
+    if len(key) == 1:
+        return ord(key)
+    elif key.upper() in KEYCODES:
+        return KEYCODES[key.upper()]
+    elif key[0] == '#' and key[1:].isdigit():
+        return int(key[1:])
+    raise EmulatorError(f'keyboard script: line {lineno}: unknown key {key}')
+
+
+def parse_script(fname):
+    """keyboard script -> [(cycle, keycode)] ordered by cycle"""
+    events = []
+    with open(fname) as script:
+        for lineno, line in enumerate(script, 1):
+            line = line.split('//')[0].strip()
+            if not line:
+                continue
+            try:
+                cycle, key = line.split()
+                cycle = int(cycle)
+            except ValueError:
+                raise EmulatorError(
+                    f'keyboard script: line {lineno}: expected: cycle key')
+            events.append((cycle, keycode(key, lineno)))
+    return sorted(events, key=lambda event: event[0])
+
+
+class Keyboard:
+    """
+    Feeds a keyboard script to a Computer as it runs.
+    """
+    def __init__(self, events):
+        self.events = events
+        self.next = 0  # index of the next event to apply
+
+    @classmethod
+    def load(cls, fname):
+        return cls(parse_script(fname))
+
+    def run(self, computer, cycles):
+        """
+        run computer for cycles, pressing and releasing keys on time.
+
+        The run is split at each event, so the emulator may fast-forward
+        idle loops in between without missing a key.
+        """
+        end = computer.time + cycles
+        while computer.time < end:
+            while (self.next < len(self.events) and
+                   self.events[self.next][0] <= computer.time):
+                computer.ram[KBD] = self.events[self.next][1]
+                self.next += 1
+            until = end
+            if self.next < len(self.events):
+                until = min(end, self.events[self.next][0])
+            computer.run(until - computer.time)
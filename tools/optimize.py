@@ -0,0 +1,140 @@
+"""
+Optimization passes over a flattened, levelized Netlist.
+
+Flattening keeps every gate the chips were written with, so a Netlist
+is full of redundancy: Not(Not(x)), Nands with a constant input, two
+copies of the same gate, gates whose outputs nobody reads. In one sweep
+in evaluation order, each Nand(a, b) is rewritten:
+
+    constants:         Nand(false, x) = true, Nand(true, x) = Not(x)
+    double inversion:  Not(Not(x)) = x
+    complements:       Nand(x, Not(x)) = true
+    structural hashing: a Nand of the same inputs as an earlier one is
+                       that one
+
+then gates that no output, DFF, builtin or probe depends on are
+dropped, and the netlist is levelized again.
+
+Every rewrite is a Boolean identity; equivalent() checks the result by
+simulating both netlists on random inputs.
+"""
+
+import copy
+import random
+from collections import Counter
+from hdl import FALSE, TRUE, levelize
+from simulator import Simulator
+from builtin_chips import read_bus
+
+
+def optimize(netlist):
+    """
+    Netlist -> (optimized copy of it, Counter of rewrites by pass)
+    """
+    netlist = copy.deepcopy(netlist)
+    stats = Counter()
+    alias = {}      # net -> the net or constant it equals
+    inverse = {}    # net -> x, for nets that are Not(x)
+    hashed = {}     # (a, b) -> net of the Nand of a and b
+
+    def rep(n):
+        return alias.get(n, n)
+
+    nands = []
+    for segment, builtin in netlist.order:
+        for a, b, o in segment:
+            a, b = rep(a), rep(b)
+            if a == FALSE or b == FALSE:
+                alias[o] = TRUE
+                stats['constants'] += 1
+                continue
+            if a == TRUE:
+                a = b
+            elif b == TRUE:
+                b = a
+            if a == TRUE:
+                alias[o] = FALSE
+                stats['constants'] += 1
+                continue
+            if a == b and a in inverse:
+                alias[o] = inverse[a]
+                stats['double inversions'] += 1
+                continue
+            if inverse.get(a) == b or inverse.get(b) == a:
+                alias[o] = TRUE
+                stats['complements'] += 1
+                continue
+            key = (min(a, b), max(a, b))
+            if key in hashed:
+                alias[o] = hashed[key]
+                stats['merged'] += 1
+                continue
+            hashed[key] = o
+            if a == b:
+                inverse[o] = a
+            nands.append((a, b, o))
+        if builtin:
+            for pin in builtin.COMB:
+                builtin.pins[pin] = [rep(n) for n in builtin.pins[pin]]
+
+    for builtin in netlist.builtins:
+        for pin in builtin.IN:
+            builtin.pins[pin] = [rep(n) for n in builtin.pins[pin]]
+    netlist.dffs = [(rep(d), q) for d, q in netlist.dffs]
+    netlist.outputs = {pin: [rep(n) for n in nets]
+                       for pin, nets in netlist.outputs.items()}
+    netlist.probes = {chip: [rep(n) for n in nets]
+                      for chip, nets in netlist.probes.items()}
+
+    # dead gates: walk back from everything read from outside the logic
+    live = set()
+    for nets in netlist.outputs.values():
+        live.update(nets)
+    for nets in netlist.probes.values():
+        live.update(nets)
+    live.update(d for d, _ in netlist.dffs)
+    for builtin in netlist.builtins:
+        for pin in builtin.IN:
+            live.update(builtin.pins[pin])
+    kept = []
+    for a, b, o in reversed(nands):
+        if o in live:
+            live.update((a, b))
+            kept.append((a, b, o))
+        else:
+            stats['dead'] += 1
+    netlist.nands = kept[::-1]
+
+    levelize(netlist)
+    return netlist, stats
+
+
+def equivalent(original, optimized, cycles=1000, seed=0):
+    """
+    Simulate both netlists on the same random inputs, clocking them
+    for sequential chips, and compare their outputs after every step.
+
+    returns: None, or a description of the first difference
+    """
+    rng = random.Random(seed)
+    sims = Simulator(original), Simulator(optimized)
+    for step in range(cycles):
+        for pin, nets in original.inputs.items():
+            value = rng.getrandbits(len(nets))
+            for sim in sims:
+                sim.set(pin, value)
+        for phase, run in (('eval', Simulator.evaluate),
+                           ('tick', Simulator.tick),
+                           ('tock', Simulator.tock)):
+            for sim in sims:
+                run(sim)
+            outs = [{pin: sim.get(pin) for pin in original.outputs}
+                    for sim in sims]
+            if outs[0] != outs[1]:
+                return (f'step {step} after {phase}: expected {outs[0]}, '
+                        f'got {outs[1]}')
+            probes = [{chip: read_bus(sim.values, sim.netlist.probes[chip])
+                       for chip in original.probes} for sim in sims]
+            if probes[0] != probes[1]:
+                return f'step {step} after {phase}: probes differ'
+    return None
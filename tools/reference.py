@@ -0,0 +1,60 @@
+"""
+Reference models of the combinational chips of projects 01 and 02,
+written directly in NumPy. Each takes {input pin: array of ints} and
+returns {output pin: array of ints}.
+"""
+
+import numpy as np
+
+WORD = 0xFFFF
+
+
+def mux(sel, *choices):
+    """choices[sel], element-wise"""
+    return np.choose(sel.astype(np.int64), choices)
+
+
+def dmux(inp, sel, outs):
+    return {out: np.where(sel == i, inp, 0) for i, out in enumerate(outs)}
+
+
+def alu(x, y, zx, nx, zy, ny, f, no):
+    x = np.where(zx == 1, 0, x)
+    x = np.where(nx == 1, ~x & WORD, x)
+    y = np.where(zy == 1, 0, y)
+    y = np.where(ny == 1, ~y & WORD, y)
+    out = np.where(f == 1, (x + y) & WORD, x & y)
+    out = np.where(no == 1, ~out & WORD, out)
+    return {'out': out, 'zr': (out == 0).astype(np.uint64),
+            'ng': out >> np.uint64(15)}
+
+
+def or8way(inp):
+    return (inp != 0).astype(np.uint64)
+
+
+MODELS = {
+    'Not': lambda p: {'out': p['in'] ^ 1},
+    'And': lambda p: {'out': p['a'] & p['b']},
+    'Or': lambda p: {'out': p['a'] | p['b']},
+    'Xor': lambda p: {'out': p['a'] ^ p['b']},
+    'Mux': lambda p: {'out': mux(p['sel'], p['a'], p['b'])},
+    'DMux': lambda p: dmux(p['in'], p['sel'], 'ab'),
+    'Not16': lambda p: {'out': ~p['in'] & WORD},
+    'And16': lambda p: {'out': p['a'] & p['b']},
+    'Or16': lambda p: {'out': p['a'] | p['b']},
+    'Mux16': lambda p: {'out': mux(p['sel'], p['a'], p['b'])},
+    'Or8Way': lambda p: {'out': or8way(p['in'])},
+    'Mux4Way16': lambda p: {'out': mux(p['sel'], *(p[c] for c in 'abcd'))},
+    'Mux8Way16': lambda p: {'out': mux(p['sel'],
+                                       *(p[c] for c in 'abcdefgh'))},
+    'DMux4Way': lambda p: dmux(p['in'], p['sel'], 'abcd'),
+    'DMux8Way': lambda p: dmux(p['in'], p['sel'], 'abcdefgh'),
+    'HalfAdder': lambda p: {'sum': p['a'] ^ p['b'], 'carry': p['a'] & p['b']},
+    'FullAdder': lambda p: {
+        'sum': p['a'] ^ p['b'] ^ p['c'],
+        'carry': (p['a'] + p['b'] + p['c']) >> np.uint64(1)},
+    'Add16': lambda p: {'out': (p['a'] + p['b']) & WORD},
+    'Inc16': lambda p: {'out': (p['in'] + 1) & WORD},
+    'ALU': lambda p: alu(**p),
+}
@@ -0,0 +1,103 @@
+"""
+Headless Hack screen.
+
+The screen is a 512x256 black and white memory map: 8K words starting at
+SCREEN. Each row is 32 words, and the least significant bit of each
+word is the leftmost of its 16 pixels.
+
+The emulator records the SCREEN words written (Computer.dirty). update()
+unpacks just the rows holding those words into the bitmap, so an idle or
+mostly static screen costs next to nothing per frame.
+"""
+
+import zlib
+import struct
+import numpy as np
+from emulator import SCREEN
+
+
+WIDTH = 512
+HEIGHT = 256
+ROW_WORDS = WIDTH // 16
+
+# bit i of a word is pixel i
+BITS = np.arange(16, dtype=np.uint16)
+
+
+class Screen:
+    """
+    1 is a black pixel, 0 white.
+    """
+    def __init__(self):
+        self.bitmap = np.zeros((HEIGHT, WIDTH), dtype=np.uint8)
+
+    def update(self, ram, dirty):
+        """
+        Unpack the rows holding the dirty words from ram into the bitmap.
+        Clears dirty.
+
+        returns: the rows updated
+        """
+        rows = sorted({(word - SCREEN) // ROW_WORDS for word in dirty})
+        dirty.clear()
+        if not rows:
+            return rows
+
+        words = np.array(
+            [ram[SCREEN + row * ROW_WORDS:SCREEN + (row + 1) * ROW_WORDS]
+             for row in rows],
+            dtype=np.uint16)
+        pixels = (words[:, :, None] >> BITS) & 1
+        self.bitmap[rows] = pixels.reshape(len(rows), WIDTH)
+        return rows
+
+    def refresh(self, ram):
+        """unpack the whole screen"""
+        self.update(ram, set(range(SCREEN, SCREEN + HEIGHT * ROW_WORDS)))
+
+    def to_pbm(self):
+        """binary PBM (P4). 1 is black in PBM as well"""
+        header = f'P4\n{WIDTH} {HEIGHT}\n'.encode()
+        return header + np.packbits(self.bitmap, axis=1).tobytes()
+
+    def to_png(self):
+        """1 bit grayscale PNG"""
+        # grayscale 0 is black: invert, then prefix each row with filter 0
+        rows = np.packbits(1 - self.bitmap, axis=1)
+        raw = np.hstack([np.zeros((HEIGHT, 1), dtype=np.uint8), rows])
+
+        def chunk(kind, data):
+            return (struct.pack('>I', len(data)) + kind + data +
+                    struct.pack('>I', zlib.crc32(kind + data)))
+
+        ihdr = struct.pack('>IIBBBBB', WIDTH, HEIGHT, 1, 0, 0, 0, 0)
+        return (b'\x89PNG\r\n\x1a\n' +
+                chunk(b'IHDR', ihdr) +
+                chunk(b'IDAT', zlib.compress(raw.tobytes())) +
+                chunk(b'IEND', b''))
+
+    def to_text(self, scale=4):
+        """
+        Render for a terminal. Each scale x scale block of pixels becomes
+        half a character cell; any black pixel makes the block black.
+        """
+        blocks = self.bitmap.reshape(
+            HEIGHT // scale, scale, WIDTH // scale, scale).max(axis=(1, 3))
+        chars = {(0, 0): ' ', (1, 0): '▀', (0, 1): '▄',
+                 (1, 1): '█'}
+        lines = []
+        for top, bottom in zip(blocks[0::2], blocks[1::2]):
+            lines.append(''.join(
+                chars[t, b] for t, b in zip(top.tolist(), bottom.tolist())))
+        return '\n'.join(lines)
+
+    def save(self, fname):
+        """save as .pbm, .png or .txt, depending on the suffix"""
+        if fname.endswith('.png'):
+            data = self.to_png()
+        elif fname.endswith('.pbm'):
+            data = self.to_pbm()
+        else:
+            data = (self.to_text() + '\n').encode()
+        with open(fname, 'wb') as out:
+            out.write(data)
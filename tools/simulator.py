@@ -0,0 +1,176 @@
+"""
+Gate-level simulation of a flattened chip.
+
+The netlist is levelized, so evaluating the chip is one sweep over its
+Nand gates in order. The clock is two-phase, like the course's hardware
+simulator:
+    tick: the clock rises. DFFs and builtins sample their inputs
+    tock: the clock falls. DFF outputs change, and the chip is evaluated
+
+EventSimulator evaluates only what changed instead of sweeping.
+"""
+
+import heapq
+from hdl import TRUE
+from builtin_chips import read_bus, write_bus
+
+
+class Simulator:
+    """
+    Simulates a Netlist. values holds the value of every net.
+    """
+    def __init__(self, netlist):
+        self.netlist = netlist
+        self.values = [0] * netlist.nnets
+        self.values[TRUE] = 1
+        self.latched = []
+        self.evaluate()
+
+    def evaluate(self):
+        """propagate the inputs and state through the combinational logic"""
+        v = self.values
+        for nands, builtin in self.netlist.order:
+            for a, b, o in nands:
+                v[o] = 1 ^ (v[a] & v[b])
+            if builtin:
+                builtin.evaluate(v)
+
+    def tick(self):
+        self.evaluate()
+        v = self.values
+        self.latched = [v[d] for d, _ in self.netlist.dffs]
+        for builtin in self.netlist.builtins:
+            builtin.tick(v)
+
+    def tock(self):
+        v = self.values
+        for (_, q), value in zip(self.netlist.dffs, self.latched):
+            v[q] = value
+        for builtin in self.netlist.builtins:
+            builtin.tock()
+        self.evaluate()
+
+    def width(self, pin):
+        nets = self.netlist.inputs.get(pin) or self.netlist.outputs.get(pin)
+        return len(nets)
+
+    def get(self, pin):
+        """the value of an input or output pin, unsigned"""
+        nets = self.netlist.inputs.get(pin) or self.netlist.outputs[pin]
+        return read_bus(self.values, nets)
+
+    def set(self, pin, value):
+        """set an input pin. Takes effect on the next evaluate"""
+        write_bus(self.values, self.netlist.inputs[pin], value)
+
+    def touch(self, builtin):
+        """builtin's state was changed from outside, ie: by a test script"""
+        pass
+
+
+class EventSimulator(Simulator):
+    """
+    Event-driven simulation: only the gates whose inputs changed are
+    evaluated.
+
+    A changed net queues the nodes (Nands and builtin reads) it fans out
+    to. The queue is ordered by the levelized position of the nodes, so
+    each node is evaluated at most once per evaluate, after all of its
+    inputs have settled.
+
+    evaluations: nodes evaluated so far
+    sweeps: evaluate calls so far. A levelized Simulator evaluates every
+        node on each of them
+    """
+    def __init__(self, netlist):
+        # nodes: a Nand (a, b, out) or a Builtin, in evaluation order
+        self.nodes = []
+        for nands, builtin in netlist.order:
+            self.nodes += nands
+            if builtin:
+                self.nodes.append(builtin)
+        self.position = {}
+        self.outputs = {}
+        self.fanout = [[] for _ in range(netlist.nnets)]
+        for i, node in enumerate(self.nodes):
+            if isinstance(node, tuple):
+                ins = {node[0], node[1]}
+            else:
+                self.position[node] = i
+                self.outputs[i] = [n for pin in node.OUT
+                                   for n in node.pins[pin]]
+                ins = {n for pin in node.COMB for n in node.pins[pin]}
+            for n in ins:
+                self.fanout[n].append(i)
+
+        # everything is evaluated once to settle the initial state
+        self.queue = list(range(len(self.nodes)))
+        self.queued = bytearray([1]) * len(self.nodes)
+        self.evaluations = 0
+        self.sweeps = 0
+        super().__init__(netlist)
+
+    def schedule(self, i):
+        if not self.queued[i]:
+            self.queued[i] = 1
+            heapq.heappush(self.queue, i)
+
+    def changed(self, nets):
+        for n in nets:
+            for i in self.fanout[n]:
+                self.schedule(i)
+
+    def evaluate(self):
+        self.sweeps += 1
+        v = self.values
+        nodes = self.nodes
+        queue = self.queue
+        queued = self.queued
+        while queue:
+            i = heapq.heappop(queue)
+            queued[i] = 0
+            self.evaluations += 1
+            node = nodes[i]
+            if type(node) is tuple:
+                a, b, o = node
+                value = 1 ^ (v[a] & v[b])
+                if v[o] == value:
+                    continue
+                v[o] = value
+                self.changed((o,))
+            else:
+                outs = self.outputs[i]
+                old = [v[n] for n in outs]
+                node.evaluate(v)
+                self.changed([n for n, x in zip(outs, old) if v[n] != x])
+
+    def tock(self):
+        v = self.values
+        for (_, q), value in zip(self.netlist.dffs, self.latched):
+            if v[q] != value:
+                v[q] = value
+                self.changed((q,))
+        for builtin in self.netlist.builtins:
+            builtin.tock()
+            self.touch(builtin)
+        self.evaluate()
+
+    def set(self, pin, value):
+        nets = self.netlist.inputs[pin]
+        old = [self.values[n] for n in nets]
+        super().set(pin, value)
+        self.changed([n for n, x in zip(nets, old) if self.values[n] != x])
+
+    def touch(self, builtin):
+        self.schedule(self.position[builtin])
+
+    def report(self):
+        """gate evaluations done, against levelized sweeps"""
+        swept = self.sweeps * len(self.nodes)
+        return {
+            'nodes': len(self.nodes),
+            'sweeps': self.sweeps,
+            'evaluations': self.evaluations,
+            'sweep_evaluations': swept,
+            'saved': 1 - self.evaluations / swept if swept else 0,
+        }
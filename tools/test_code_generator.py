@@ -0,0 +1,103 @@
+import sys
+from pathlib import Path
+from emulator import Computer
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / '10'))
+from tokenizer import Tokenizer  # noqa: E402
+from compilation_engine import CompilationEngine  # noqa: E402
+from code_generator import compile_class  # noqa: E402
+from vm_writer import translate  # noqa: E402
+
+# where Main stores the value of each expression, and then DONE
+OUT = 8000
+DONE = 12345
+
+# a = 7, b = -13, c = 1234: folding, strength reduction, and the
+# overflows the fold must wrap like the VM does
+EXPRESSIONS = [
+    'a*2', 'a*3', 'a*10', 'a*-5', 'b*7', 'a*0', 'a*1', 'b/1', 'b/-1',
+    '3*a', '(a+1)*255', 'b*1000', 'c*-16384', 'c*16384', '2+3*4',
+    '-5/2', '7/-2', '(-32767-1)<1', '30000>-30000', '~5', '-(3)',
+    '(1+2)*a', 'a*(1+2)', 'a*3*5', 'b*b*3', 'a*(b*3)', 'a*(b*(a*3))',
+    '32767+1', 'a*7+(b*9)', 'c*(-1)', 'c*-1', '-a*6', 'b*13', 'a*-7',
+    '100/a', 'a/2', '20000+20000', '-20000-20000', '(20000+20000)>0',
+    '30000<-30000', '1000*1000', '-1*c', '~(a*4)', '(c*3)&255',
+    '(a|8)*12', 'c*31', 'c*32767', '5=5', '(2*3)=6', 'a*4=28',
+]
+
+SYS = '''
+class Sys {
+    function void init() {
+        do Main.main();
+        while (true) {}
+        return;
+    }
+}
+'''
+
+# shift and add, and long division: enough of the OS for * and /
+MATH = '''
+class Math {
+    function int multiply(int x, int y) {
+        var int sum, mask, i;
+        let sum = 0; let mask = 1; let i = 0;
+        while (i < 16) {
+            if (~((y & mask) = 0)) { let sum = sum + x; }
+            let x = x + x; let mask = mask + mask; let i = i + 1;
+        }
+        return sum;
+    }
+    function int divide(int x, int y) {
+        var boolean neg; var int q;
+        let neg = false;
+        if (x < 0) { let x = -x; let neg = ~neg; }
+        if (y < 0) { let y = -y; let neg = ~neg; }
+        let q = Math.div(x, y);
+        if (neg) { return -q; }
+        return q;
+    }
+    function int div(int x, int y) {
+        var int q;
+        if ((y > x) | (y < 0)) { return 0; }
+        let q = Math.div(x, y + y);
+        if ((x - Math.multiply(q + q, y)) < y) { return q + q; }
+        return q + q + 1;
+    }
+}
+'''
+
+
+def main_class(expressions):
+    lets = ''.join(f'        let out[{i}] = {expression};\n'
+                   for i, expression in enumerate(expressions))
+    return f'''
+class Main {{
+    function void main() {{
+        var int a, b, c; var Array out;
+        let a = 7; let b = -13; let c = 1234; let out = {OUT};
+{lets}        let out[{len(expressions)}] = {DONE};
+        return;
+    }}
+}}
+'''
+
+
+def run(sources, optimize, asmpath):
+    """compile the classes, run the program, return what Main stored"""
+    classes = [compile_class(CompilationEngine(Tokenizer(source)).start(),
+                             optimize)[:2]
+               for source in sources]
+    asmpath.write_text(translate(classes))
+    computer = Computer.load(asmpath)
+    computer.run(2_000_000)
+    n = len(EXPRESSIONS)
+    assert computer.ram[OUT + n] == DONE, 'Main.main did not finish'
+    return computer.ram[OUT:OUT + n]
+
+
+def test_optimized_expressions_compute_the_same(tmp_path):
+    sources = [SYS, MATH, main_class(EXPRESSIONS)]
+    plain = run(sources, False, tmp_path / 'plain.asm')
+    optimized = run(sources, True, tmp_path / 'optimized.asm')
+    for expression, x, y in zip(EXPRESSIONS, plain, optimized):
+        assert x == y, f'{expression}: {x} without -O, {y} with'
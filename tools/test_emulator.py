@@ -0,0 +1,61 @@
+from emulator import Computer
+
+# (LOOP) @KBD D=M @LOOP D;JEQ, then a halt loop
+KBD_POLL = [
+    0b0110000000000000,     # @KBD
+    0b1111110000010000,     # D=M
+    0b0000000000000000,     # @LOOP
+    0b1110001100000010,     # D;JEQ
+    0b0000000000000100,     # (END) @END
+    0b1110101010000111,     # 0;JMP
+]
+
+
+def test_kbd_poll_is_fast_forwarded():
+    computer = Computer(KBD_POLL)
+    computer.run(5_000_000)
+    assert computer.skipped > 0
+    assert computer.time == 5_000_000
+    assert computer.pc == 0
+
+    computer.ram[24576] = 75   # a key: the poll ends
+    computer.run(100)
+    assert computer.pc in (4, 5)
+
+
+# RAM[16] = 1000, (LOOP) MD=M-1 while > 0, then a halt loop
+RAM_COUNTER = [
+    0b0000001111101000,     # @1000
+    0b1110110000010000,     # D=A
+    0b0000000000010000,     # @16
+    0b1110001100001000,     # M=D
+    0b0000000000010000,     # (LOOP) @16
+    0b1111110010011000,     # MD=M-1
+    0b0000000000000100,     # @LOOP
+    0b1110001100000001,     # D;JGT
+    0b0000000000001000,     # (END) @END
+    0b1110101010000111,     # 0;JMP
+]
+
+# D = 500, (LOOP) D=D-1 while > 0, then a halt loop
+D_COUNTER = [
+    0b0000000111110100,     # @500
+    0b1110110000010000,     # D=A
+    0b1110001110010000,     # (LOOP) D=D-1
+    0b0000000000000010,     # @LOOP
+    0b1110001100000001,     # D;JGT
+    0b0000000000000101,     # (END) @END
+    0b1110101010000111,     # 0;JMP
+]
+
+
+def test_counting_loops_are_skipped_to_their_exit():
+    for program in RAM_COUNTER, D_COUNTER:
+        for cycles in 1001, 5000:
+            computer, reference = Computer(program), Computer(program)
+            computer.run(cycles)
+            reference.run_interpreted(cycles)
+            assert computer.skipped > 0
+            assert (computer.a, computer.d, computer.pc, computer.time) == \
+                (reference.a, reference.d, reference.pc, reference.time)
+            assert computer.ram == reference.ram
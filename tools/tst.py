@@ -0,0 +1,667 @@
+"""
+Nand2Tetris test scripts (.tst) and their compare files (.cmp).
+
+A test script drives a chip or a Hack program through a list of
+commands:
+
+    load Mult.asm,
+    compare-to Mult.cmp,
+    output-list RAM[0]%D2.6.2 RAM[2]%D2.6.2;
+    set RAM[0] 3,
+    repeat 120 {
+      ticktock;
+    }
+    output;
+
+Each output line is compared with the next line of the compare file as
+soon as it is produced, so a test stops at its first wrong line.
+
+What the script drives is a backend: anything with get/set/eval/tick/tock
+(see EmulatorBackend, ChipBackend). The backend is picked by the suffix
+of the file named by 'load'.
+"""
+
+import re
+import hashlib
+from pathlib import Path
+from emulator import Computer, load_rom, RAM_SIZE, EmulatorError
+import cache
+from hdl import load_chip, flatten, ChipDef, HdlError
+from chip_compiler import (CompiledSimulator, cached_chip, compile_chip,
+                           COMPILER)
+from simulator import EventSimulator
+from optimize import optimize
+from builtin_chips import read_bus
+
+
+class TstError(Exception):
+    """
+    Represents an error running a test script.
+    """
+    def __init__(self, msg, lineno):
+        super().__init__(msg)
+        self.lineno = lineno
+
+    def __str__(self):
+        return f'Error: line {self.lineno}: {super().__str__()}'
+
+
+class CompareError(TstError):
+    """
+    An output line did not match the compare file.
+    """
+    pass
+
+
+class Unsupported(TstError):
+    """
+    The script needs something a headless runner cannot give it: an
+    interactive user, or a backend that does not exist.
+    """
+    pass
+
+
+# Longest a while loop may spin before the script is deemed interactive.
+# Loops that stop changing the backend's state are given up on at once
+MAX_WHILE = 1000000
+
+# Largest chip (in Nands and DFFs) simulated gate by gate, unless
+# gate_level asks for it whatever the size
+MAX_GATES = 100000
+
+
+RE_TOKEN = re.compile(r'''
+    (?P<comment>//[^\n]*|/\*.*?\*/)
+    | (?P<string>"[^"]*")
+    | (?P<punct>[,;!{}])
+    | (?P<newline>\n)
+    | (?P<word>[^\s,;!{}"]+)
+    | \s+
+''', re.VERBOSE | re.DOTALL)
+
+
+def tokenize(text):
+    """generates (token, lineno). comments and whitespace are dropped"""
+    lineno = 1
+    for m in RE_TOKEN.finditer(text):
+        kind = m.lastgroup
+        if kind in ('word', 'string', 'punct'):
+            yield m.group(), lineno
+        lineno += m.group().count('\n')
+
+
+class Command:
+    """
+    A single script command, ie: set RAM[0] 3
+
+    For repeat and while, body holds the commands inside the braces.
+    """
+    def __init__(self, words, lineno, body=None):
+        self.words = words
+        self.lineno = lineno
+        self.body = body
+
+    def __repr__(self):
+        return ' '.join(self.words)
+
+
+def parse(text):
+    """test script text -> list of Commands"""
+    return parse_block(tokenize(text), None)
+
+
+def parse_block(tokens, opener):
+    """
+    parse commands up to the '}' closing opener (or the end of the file)
+    """
+    commands = []
+    words = []
+    lineno = None
+    for tok, tok_lineno in tokens:
+        if lineno is None:
+            lineno = tok_lineno
+        if tok == '{':
+            body = parse_block(tokens, words)
+            commands.append(Command(words, lineno, body))
+            words, lineno = [], None
+        elif tok == '}':
+            if words:
+                commands.append(Command(words, lineno))
+            if opener is None:
+                raise TstError("unexpected '}'", tok_lineno)
+            return commands
+        elif tok in (',', ';', '!'):
+            if words:
+                commands.append(Command(words, lineno))
+            words, lineno = [], None
+        else:
+            words.append(tok)
+    if opener is not None:
+        raise TstError(f"missing '}}' for {' '.join(opener)}", lineno)
+    if words:
+        commands.append(Command(words, lineno))
+    return commands
+
+
+RE_VAR = re.compile(r'^(?P<name>[^\[\]]+)(\[(?P<index>\d*)\])?$')
+
+
+def parse_var(var, lineno):
+    """RAM[3] -> ('RAM', 3). PC -> ('PC', None). PC[] -> ('PC', None)"""
+    m = RE_VAR.match(var)
+    if not m:
+        raise TstError(f'bad variable: {var}', lineno)
+    index = m.group('index')
+    return m.group('name'), int(index) if index else None
+
+
+def parse_value(txt, lineno):
+    """%B0101, %XFF, %D-3 or -3 -> int"""
+    try:
+        if txt.startswith('%B'):
+            return int(txt[2:], 2)
+        elif txt.startswith('%X'):
+            return int(txt[2:], 16)
+        elif txt.startswith('%D'):
+            return int(txt[2:])
+        return int(txt)
+    except ValueError:
+        raise TstError(f'bad value: {txt}', lineno)
+
+
+RE_FORMAT = re.compile(
+    r'^(?P<var>[^%]+)%(?P<fmt>[BDXS])'
+    r'(?P<lpad>\d+)\.(?P<len>\d+)\.(?P<rpad>\d+)$')
+
+
+class Column:
+    """
+    One output-list entry: var%Fl.n.r
+
+    F: B(inary) D(ecimal) X(hex) S(tring)
+    l, r: spaces of padding to the left and right
+    n: width of the value itself
+    """
+    def __init__(self, spec, lineno):
+        m = RE_FORMAT.match(spec)
+        if not m:
+            raise TstError(f'bad output format: {spec}', lineno)
+        self.var = m.group('var')
+        self.name, self.index = parse_var(self.var, lineno)
+        self.fmt = m.group('fmt')
+        self.lpad = int(m.group('lpad'))
+        self.len = int(m.group('len'))
+        self.rpad = int(m.group('rpad'))
+        self.width = self.lpad + self.len + self.rpad
+
+    def header(self):
+        """the var name, centered, or cut down to the column width"""
+        if len(self.var) >= self.width:
+            return self.var[:self.width]
+        left = (self.width - len(self.var)) // 2
+        return ' ' * left + self.var.ljust(self.width - left)
+
+    def format(self, value):
+        if self.fmt == 'S':
+            txt = str(value).ljust(self.len)
+        elif self.fmt == 'B':
+            txt = format(value & ((1 << self.len) - 1), f'0{self.len}b')
+        elif self.fmt == 'X':
+            txt = format(value & ((1 << (4 * self.len)) - 1),
+                         f'0{self.len}X')
+        else:
+            txt = str(value).rjust(self.len)
+        return ' ' * self.lpad + txt + ' ' * self.rpad
+
+
+def signed(value):
+    """16 bit word -> python int"""
+    return value - 0x10000 if value & 0x8000 else value
+
+
+class EmulatorBackend:
+    """
+    Runs CPU emulator scripts: load Prog.asm / Prog.hack
+
+    variables: RAM[i], A, D, PC
+    deps: {fname: hash} of the loaded program
+    """
+    def __init__(self, rom):
+        self.computer = Computer(rom)
+        self.deps = {}
+
+    @classmethod
+    def load(cls, path, **options):
+        """options: for chip backends, the CPU emulator has none"""
+        backend = cls(load_rom(path))
+        backend.deps = cache.deps_hashes([path])
+        return backend
+
+    def get(self, name, index, lineno):
+        computer = self.computer
+        if name == 'RAM' and index is not None and index < RAM_SIZE:
+            return signed(computer.ram[index])
+        elif name == 'A':
+            return signed(computer.a)
+        elif name == 'D':
+            return signed(computer.d)
+        elif name == 'PC':
+            return computer.pc
+        raise TstError(f'unknown variable: {name}', lineno)
+
+    def set(self, name, index, value, lineno):
+        computer = self.computer
+        value &= 0xFFFF
+        if name == 'RAM' and index is not None and index < RAM_SIZE:
+            computer.ram[index] = value
+        elif name == 'A':
+            computer.a = value
+        elif name == 'D':
+            computer.d = value
+        elif name == 'PC':
+            computer.pc = value & 0x7FFF
+        else:
+            raise TstError(f'unknown variable: {name}', lineno)
+
+    def command(self, words, lineno):
+        raise TstError(f'unknown command: {" ".join(words)}', lineno)
+
+    def eval(self):
+        pass
+
+    def tick(self):
+        pass
+
+    def tock(self):
+        self.computer.step()
+
+    def ticktocks(self, n):
+        """n clock cycles at once: runs the translated blocks"""
+        self.computer.run(n)
+
+
+class ChipBackend:
+    """
+    Runs hardware simulator scripts: load Chip.hdl
+
+    variables: the chip's pins, Part[] / Part[i] for the state of a
+    builtin part (DRegister[], ROM32K[3], RAM16K[5]), Part[] for the
+    output of the first part of an HDL chip (PC[])
+
+    The chip is simulated optimized (see optimize.py). Sub-chips that
+    pass their own test scripts are simulated by their behavioral models
+    (see verified), and chips over MAX_GATES are skipped: gate_level
+    turns both off.
+    event_driven: use an EventSimulator rather than the compiled chip
+
+    deps: {fname: hash} of every file the simulated chip depends on
+    """
+    def __init__(self, path, gate_level=False, event_driven=False):
+        self.dir = path.parent
+        mode = 'gates' if gate_level else 'behavioral'
+        compiled = cached_chip(path, mode)
+        if compiled is None:
+            chip, library = load_chip(
+                path, substitute=None if gate_level else verified)
+            size = library.size(chip.name)
+            if size > MAX_GATES and not gate_level:
+                raise Unsupported(f'{chip.name} is {size} gates: too large '
+                                  'to simulate (--gate-level forces it)', 0)
+            deps = cache.deps_hashes(
+                c.fname for c in library.chips.values()
+                if isinstance(c, ChipDef))
+            for name, c in library.chips.items():
+                if isinstance(c, str):
+                    deps.update(VERIFIED[library.path(name)])
+            netlist, _ = optimize(flatten(chip, library))
+            compiled = compile_chip(path, mode, netlist, deps)
+        netlist, code, deps = compiled
+        self.deps = dict(deps)  # the compiled chip's are cached: not ours
+        if event_driven:
+            self.sim = EventSimulator(netlist)
+        else:
+            self.sim = CompiledSimulator(netlist, code)
+        self.netlist = netlist
+
+    def builtin(self, name):
+        parts = self.netlist.by_chip(name)
+        return parts[0] if parts else None
+
+    def get(self, name, index, lineno):
+        netlist = self.netlist
+        if name in netlist.inputs or name in netlist.outputs:
+            value = self.sim.get(name)
+            # 16 bit buses are numbers, narrower ones bit patterns
+            return signed(value) if self.sim.width(name) == 16 else value
+        builtin = self.builtin(name)
+        if builtin:
+            return signed(builtin.get(index or 0))
+        if name in netlist.probes and index is None:
+            return signed(read_bus(self.sim.values, netlist.probes[name]))
+        raise TstError(f'unknown variable: {name}', lineno)
+
+    def set(self, name, index, value, lineno):
+        if name in self.netlist.inputs:
+            self.sim.set(name, value & ((1 << self.sim.width(name)) - 1))
+            return
+        builtin = self.builtin(name)
+        if not builtin:
+            raise TstError(f'cannot set {name}', lineno)
+        builtin.set(index or 0, value & 0xFFFF)
+        self.sim.touch(builtin)
+
+    def command(self, words, lineno):
+        """Part load File: load a builtin memory (ROM32K load Prog.hack)"""
+        builtin = self.builtin(words[0])
+        if len(words) != 3 or words[1] != 'load' or not builtin:
+            raise TstError(f'unknown command: {" ".join(words)}', lineno)
+        builtin.load(self.dir / words[2])
+        self.deps.update(cache.deps_hashes([self.dir / words[2]]))
+        self.sim.touch(builtin)
+
+    def eval(self):
+        self.sim.evaluate()
+
+    def snapshot(self):
+        """the state of every net: a loop that keeps it unchanged is stuck"""
+        return tuple(self.sim.values)
+
+    def tick(self):
+        self.sim.tick()
+
+    def tock(self):
+        self.sim.tock()
+
+
+# .hdl path -> deps of its passing test script run, or None
+VERIFIED = {}
+
+# bump when what counts as verified changes
+VERIFY_VERSION = 1
+
+HERE = Path(__file__).resolve().parent
+
+# the source of the tools that run a test script on a chip: a cached
+# verification is only valid for the code that ran it
+TESTER = hashlib.sha256((COMPILER + ''.join(
+    cache.file_hash(HERE / module) for module in (
+        'tst.py', 'simulator.py', 'emulator.py'))
+).encode()).hexdigest()
+
+
+def verified(name, library):
+    """
+    Whether the chip name passes its own test script, so chips built
+    from it may be simulated with its behavioral model. The test itself
+    runs with the chip's own sub-chips substituted the same way, so
+    RAM16K is checked using RAM4K's model, and so on down to Bit.
+
+    Passing runs are cached on disk, keyed by the files they used and
+    the source of the tools that ran them.
+    """
+    path = library.path(name)
+    if path not in VERIFIED:
+        VERIFIED[path] = verify(path)
+    return VERIFIED[path] is not None
+
+
+def verify(hdlpath):
+    """run the test script next to hdlpath. returns its deps if it passes"""
+    if hdlpath is None or not hdlpath.with_suffix('.tst').exists():
+        return None
+    key = f'{hdlpath.resolve()}:{TESTER}'
+    entry = cache.lookup('verified', key, VERIFY_VERSION)
+    if entry:
+        return entry['deps']
+    script = TestScript(hdlpath.with_suffix('.tst'))
+    try:
+        script.run()
+    except (TstError, OSError):
+        return None
+    cache.store('verified', key, VERIFY_VERSION, script.deps)
+    return script.deps
+
+
+# load suffix -> backend factory(path, **options)
+BACKENDS = {
+    '.asm': EmulatorBackend.load,
+    '.hack': EmulatorBackend.load,
+    '.hdl': ChipBackend,
+}
+
+
+class TestScript:
+    """
+    Runs a test script, comparing its output against the compare file.
+
+    write_out: also write the output file named by output-file
+    options: passed to the backend, ie: gate_level, event_driven (see
+        ChipBackend)
+    deps: {fname: hash} of the files the run used, once it has run
+    """
+    def __init__(self, tstpath, write_out=False, **options):
+        self.path = Path(tstpath)
+        self.dir = self.path.parent
+        self.write_out = write_out
+        self.options = options
+        self.deps = cache.deps_hashes([self.path])
+        with open(self.path) as tstfile:
+            self.commands = parse(tstfile.read())
+
+        self.backend = None
+        self.columns = []
+        self.cmpfile = None
+        self.cmplineno = 0
+        self.outfile = None
+        self.time = 0
+        self.phase = ''  # '+' between tick and tock
+        self.lines = 0   # output lines compared
+
+    def run(self):
+        """run the script. raises TstError on the first failure"""
+        try:
+            self.execute(self.commands)
+        except EmulatorError as e:
+            raise TstError(str(e), 0)
+        finally:
+            if self.cmpfile:
+                self.cmpfile.close()
+            if self.outfile:
+                self.outfile.close()
+        return self.lines
+
+    def execute(self, commands):
+        for cmd in commands:
+            if cmd.body is not None:
+                self.loop(cmd)
+            else:
+                self.execute_one(cmd)
+
+    def loop(self, cmd):
+        kind, *args = cmd.words
+        if kind == 'repeat':
+            if not args:
+                raise Unsupported('repeat forever: interactive script',
+                                  cmd.lineno)
+            n = parse_value(args[0], cmd.lineno)
+            if self.only_ticktocks(cmd.body):
+                self.ticktocks(n * len(cmd.body))
+                return
+            for _ in range(n):
+                self.execute(cmd.body)
+        elif kind == 'while':
+            last = None
+            for _ in range(MAX_WHILE):
+                if not self.condition(args, cmd.lineno):
+                    return
+                self.execute(cmd.body)
+                state = self.snapshot()
+                if state is not None and state == last:
+                    break  # stuck waiting for input that never comes
+                last = state
+            raise Unsupported(f'while {" ".join(args)} never ended: '
+                              'interactive script', cmd.lineno)
+        else:
+            raise TstError(f'unknown block: {kind}', cmd.lineno)
+
+    def only_ticktocks(self, body):
+        """true if body is ticktocks only, and the backend batches them"""
+        return (body and all(cmd.words == ['ticktock'] for cmd in body) and
+                hasattr(self.get_backend(body[0].lineno), 'ticktocks'))
+
+    def ticktocks(self, n):
+        self.backend.ticktocks(n)
+        self.time += n
+
+    def condition(self, words, lineno):
+        try:
+            var, op, value = words
+        except ValueError:
+            raise TstError(f'bad condition: {" ".join(words)}', lineno)
+        lhs = self.get(var, lineno)
+        rhs = parse_value(value, lineno)
+        ops = {
+            '=': lhs == rhs, '<>': lhs != rhs,
+            '<': lhs < rhs, '>': lhs > rhs,
+            '<=': lhs <= rhs, '>=': lhs >= rhs,
+        }
+        if op not in ops:
+            raise TstError(f'bad condition operator: {op}', lineno)
+        return ops[op]
+
+    def snapshot(self):
+        snapshot = getattr(self.backend, 'snapshot', None)
+        return snapshot() if snapshot else None
+
+    def get_backend(self, lineno):
+        if self.backend is None:
+            # scripts with no load drive an empty CPU emulator
+            self.backend = EmulatorBackend([])
+        return self.backend
+
+    def get(self, var, lineno):
+        name, index = parse_var(var, lineno)
+        if name == 'time':
+            return f'{self.time}{self.phase}'
+        return self.get_backend(lineno).get(name, index, lineno)
+
+    def execute_one(self, cmd):
+        name, *args = cmd.words
+        lineno = cmd.lineno
+        if name == 'load':
+            self.load(args, lineno)
+        elif name == 'output-file':
+            if self.write_out:
+                self.outfile = open(self.dir / args[0], 'w')
+        elif name == 'compare-to':
+            self.cmpfile = open(self.dir / args[0])
+            self.deps.update(cache.deps_hashes([self.dir / args[0]]))
+        elif name == 'output-list':
+            self.columns = [Column(spec, lineno) for spec in args]
+            self.output('|' + '|'.join(c.header() for c in self.columns) +
+                        '|', lineno)
+        elif name == 'output':
+            values = (self.get(c.var, lineno) for c in self.columns)
+            self.output('|' + '|'.join(
+                c.format(v) for c, v in zip(self.columns, values)) + '|',
+                lineno)
+        elif name == 'set':
+            if len(args) != 2:
+                raise TstError('usage: set var value', lineno)
+            var, value = args
+            vname, index = parse_var(var, lineno)
+            self.get_backend(lineno).set(
+                vname, index, parse_value(value, lineno), lineno)
+        elif name == 'eval':
+            self.get_backend(lineno).eval()
+        elif name == 'tick':
+            self.get_backend(lineno).tick()
+            self.phase = '+'
+        elif name == 'tock':
+            self.get_backend(lineno).tock()
+            self.time += 1
+            self.phase = ''
+        elif name == 'ticktock':
+            self.get_backend(lineno).tick()
+            self.get_backend(lineno).tock()
+            self.time += 1
+        elif name in ('echo', 'clear-echo', 'breakpoint', 'clear-breakpoints'):
+            pass
+        else:
+            backend = self.get_backend(lineno)
+            backend.command(cmd.words, lineno)
+            # the command may have loaded a file (ROM32K load Prog.hack)
+            self.deps.update(getattr(backend, 'deps', {}))
+
+    def load(self, args, lineno):
+        if not args:
+            raise Unsupported('VM emulator scripts are not supported', lineno)
+        path = self.dir / args[0]
+        try:
+            factory = BACKENDS[path.suffix]
+        except KeyError:
+            raise Unsupported(f'no backend for {path.name}', lineno)
+        if not path.exists():
+            raise Unsupported(f'{path.name} not found: not built?', lineno)
+        try:
+            self.backend = factory(path, **self.options)
+            self.deps.update(getattr(self.backend, 'deps', {}))
+        except Unsupported as e:
+            raise Unsupported(e.args[0], lineno)
+        except (EmulatorError, HdlError) as e:
+            raise TstError(str(e), lineno)
+
+    def output(self, line, lineno):
+        """write line out, and compare it with the next line of the cmp"""
+        if self.outfile:
+            print(line, file=self.outfile)
+        if not self.cmpfile:
+            return
+        expected = self.cmpfile.readline().rstrip('\n').rstrip()
+        self.cmplineno += 1
+        if not matches(line.rstrip(), expected):
+            raise CompareError(
+                f'comparison failure at {self.path.stem}.cmp line '
+                f'{self.cmplineno}:\n  expected: {expected}\n'
+                f'  actual:   {line}', lineno)
+        self.lines += 1
+
+
+def matches(line, expected):
+    """compare an output line with a cmp line. * in the cmp matches anything"""
+    if len(line) != len(expected):
+        return False
+    return all(e == '*' or c == e for c, e in zip(line, expected))
+
+
+def run_test(tstpath, write_out=False, **options):
+    """
+    Run a test script. options: see TestScript
+
+    returns: (status, message) where status is one of PASS, FAIL, SKIP
+    """
+    try:
+        script = TestScript(tstpath, write_out, **options)
+    except TstError as e:
+        return FAIL, str(e)
+    except OSError as e:
+        return FAIL, str(e)
+    return run_script(script)
+
+
+def run_script(script):
+    """run a TestScript. returns (status, message) as run_test"""
+    try:
+        lines = script.run()
+    except Unsupported as e:
+        return SKIP, str(e)
+    except TstError as e:
+        return FAIL, str(e)
+    except OSError as e:
+        return FAIL, str(e)
+    return PASS, f'{lines} lines compared'
+
+
+PASS = 'PASS'
+FAIL = 'FAIL'
+SKIP = 'SKIP'
@@ -0,0 +1,125 @@
+"""
+Synthetic inputs for the benchmarks (see Benchmark.py), of any size
+from kilobytes to hundreds of megabytes. Each generator returns text of
+about size characters, the same text for the same arguments:
+    jack_docs:    a Jack class heavy on documentation comments
+                  (10/TokenizerBenchmark.py)
+    jack_nested:  a Jack class of deeply nested expressions
+    jack_square:  the classes of 09/Square, replicated: mostly code
+    vm_random:    a randomized VM program: functions of pushes, pops,
+                  arithmetic, branches and calls
+    asm_pong:     06/pong/Pong.asm, replicated
+"""
+
+import sys
+import random
+from pathlib import Path
+
+REPO = Path(__file__).resolve().parent.parent
+
+sys.path.insert(0, str(REPO / '10'))
+from TokenizerBenchmark import generate as jack_docs  # noqa: E402
+
+PONG = REPO / '06' / 'pong' / 'Pong.asm'
+SQUARE = REPO / '09' / 'Square'
+
+OPS = ('+', '-', '*', '/', '&', '|', '<', '>', '=')
+
+SEGMENTS = ('local', 'argument', 'this', 'that', 'static', 'temp',
+            'pointer')
+ARITHMETIC = ('add', 'sub', 'neg', 'eq', 'gt', 'lt', 'and', 'or', 'not')
+
+
+def nested(depth, rng):
+    """a Jack expression nested depth parentheses deep"""
+    expr = 'x'
+    for _ in range(depth):
+        term = rng.choice(('x', 'y', str(rng.randrange(32768)), 'a[x]',
+                           '-y', '~x'))
+        expr = f'({term} {rng.choice(OPS)} {expr})'
+    return expr
+
+
+def jack_nested(size, depth=64, seed=0):
+    """a Jack class of about size characters, of expressions depth deep"""
+    rng = random.Random(seed)
+    parts = ['class Nested {\n    static Array a;\n\n']
+    length = len(parts[0])
+    n = 0
+    while length < size:
+        function = (f'    function int f{n}(int x, int y) {{\n'
+                    f'        let y = {nested(depth, rng)};\n'
+                    f'        return {nested(depth, rng)};\n'
+                    '    }\n\n')
+        parts.append(function)
+        length += len(function)
+        n += 1
+    parts.append('}\n')
+    return ''.join(parts)
+
+
+def jack_square(size):
+    """
+    the classes of 09/Square, repeated to about size characters. Only
+    whole copies are made, so no comment is cut open
+    """
+    square = ''.join(f.read_text() for f in sorted(SQUARE.glob('*.jack')))
+    return square * max(1, round(size / len(square)))
+
+
+def vm_function(n, nfunctions, rng, ncommands=64):
+    """the VM code of function Bench.f{n}"""
+    lines = [f'function Bench.f{n} {rng.randrange(8)}']
+    labels = [f'L{n}.{i}' for i in range(4)]
+    for _ in range(ncommands):
+        kind = rng.random()
+        if kind < 0.35:
+            lines.append(f'push constant {rng.randrange(32768)}')
+        elif kind < 0.55:
+            segment = rng.choice(SEGMENTS)
+            index = rng.randrange(2 if segment == 'pointer' else 8)
+            lines.append(f'{rng.choice(("push", "pop"))} {segment} {index}')
+        elif kind < 0.8:
+            lines.append(rng.choice(ARITHMETIC))
+        elif kind < 0.9:
+            lines.append(f'{rng.choice(("label", "goto", "if-goto"))} '
+                         f'{rng.choice(labels)}')
+        else:
+            lines.append(f'call Bench.f{rng.randrange(nfunctions)} '
+                         f'{rng.randrange(4)}')
+    lines.append('return')
+    return '\n'.join(lines) + '\n'
+
+
+def vm_random(size, seed=0):
+    """a VM program of about size characters"""
+    rng = random.Random(seed)
+    # one function is about 1000 characters
+    nfunctions = max(1, size // 1000)
+    parts = []
+    length = n = 0
+    while length < size:
+        function = vm_function(n, nfunctions, rng)
+        parts.append(function)
+        length += len(function)
+        n += 1
+    return ''.join(parts)
+
+
+def asm_pong(size):
+    """
+    06/pong/Pong.asm, repeated to about size characters. The last copy
+    is cut at a line end, any labels it loses becoming variables
+    """
+    pong = PONG.read_text()
+    copies, rest = divmod(size, len(pong))
+    return pong * copies + pong[:pong.find('\n', rest) + 1]
+
+
+GENERATORS = {
+    'jack_docs': jack_docs,
+    'jack_nested': jack_nested,
+    'jack_square': jack_square,
+    'vm_random': vm_random,
+    'asm_pong': asm_pong,
+}